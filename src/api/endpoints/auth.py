@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.http import HttpResponse
 import jwt
 from ninja import Router
 from api.schemas.common_schemas import ErrorSchemaOut
@@ -7,14 +8,14 @@ from core.models import AuthTokenModel, DogUserModel
 from django.contrib.auth import authenticate
 from django.utils import timezone
 from common.auth.jwt_auth import create_jwt
-from api.logic.exceptions import get_error_response
-from api.logic.auth_logic import handle_get_token, handle_refresh_token, handle_get_jwt_token, handle_refresh_jwt_token
+from api.logic.exceptions import get_error_response, get_error_headers
+from api.logic.auth_logic import ahandle_get_token, handle_refresh_token, ahandle_get_jwt_token, handle_refresh_jwt_token
 
 router = Router()
 
 
-@router.post("/token/", response={200: TokenRequestSchemaOut, 401: ErrorSchemaOut}, auth=None)
-def get_token(request, credentials: TokenRequestSchemaIn):
+@router.post("/token/", response={200: TokenRequestSchemaOut, 401: ErrorSchemaOut, 503: ErrorSchemaOut}, auth=None)
+async def get_token(request, response: HttpResponse, credentials: TokenRequestSchemaIn):
     """
     Endpoint to get an authentication token.
     
@@ -27,10 +28,12 @@ def get_token(request, credentials: TokenRequestSchemaIn):
         or an error if the credentials are invalid.
     """
     try:
-        response = handle_get_token(credentials.username, credentials.password)
-        return 200, response
+        tokens = await ahandle_get_token(credentials.username, credentials.password)
+        return 200, tokens
     except Exception as e:
         status_code, error_response = get_error_response(e)
+        for header, value in get_error_headers(e).items():
+            response[header] = value
         return status_code, error_response
 
 @router.post("/token/refresh/", response={200: TokenRequestSchemaOut, 401: ErrorSchemaOut}, auth=None)
@@ -54,9 +57,11 @@ def refresh_token(request, refresh_token: RefreshTokenRequestSchemaIn):
         return status_code, error_response
 
 @router.post(
-    "/jwt-token/", response={200: TokenRequestSchemaOut, 401: ErrorSchemaOut}, auth=None
+    "/jwt-token/",
+    response={200: TokenRequestSchemaOut, 401: ErrorSchemaOut, 503: ErrorSchemaOut},
+    auth=None,
 )
-def get_jwt_token(request, credentials: TokenRequestSchemaIn):
+async def get_jwt_token(request, response: HttpResponse, credentials: TokenRequestSchemaIn):
     """
     Endpoint to get a JWT access token using username and password.
     
@@ -69,12 +74,14 @@ def get_jwt_token(request, credentials: TokenRequestSchemaIn):
         or an error if the credentials are invalid.
     """
     try:
-        data = handle_get_jwt_token(
+        data = await ahandle_get_jwt_token(
             username=credentials.username, password=credentials.password
         )
         return 200, data
     except Exception as e:
         status_code, error_response = get_error_response(e)
+        for header, value in get_error_headers(e).items():
+            response[header] = value
         return status_code, error_response
 
 @router.post(
@@ -1,7 +1,12 @@
+from functools import wraps
+from django.conf import settings
 from ninja import Router, Query
+from ninja.decorators import decorate_view
 from api.schemas.bark_schemas import (
     BarkSchemaOut,
     BarkCreateUpdateSchemaIn,
+    BarkColumnarSerializer,
+    BarkExportSchemaIn,
 )
 from api.schemas.common_schemas import ErrorSchemaOut
 from uuid import UUID
@@ -12,26 +17,76 @@ from api.logic.bark_logic import (
     handle_delete_bark,
     handle_update_bark,
     handle_export_top_barks_csv,
+    handle_export_barks,
 )
 from api.logic.exceptions import get_error_response
 from ninja.pagination import paginate
-from common.filters import BarksFilter
+from common.filters import BarksFilter, BARK_ORDERINGS
+from common.auth.dispatch import OptionalBearerAuth
+from common.columnar import columnar_response, json_response
+from common.pagination import KeysetPagination
+from common.page_cache import PARTITION_BARKS, PARTITION_SNIFFS, page_cache
+from common.query_budget import query_budget
+from common.trending import trending_index
 
 
 router = Router()
 
 
-@router.get("/", response=list[BarkSchemaOut], auth=None)
-@paginate
+def is_trending(request) -> bool:
+    return request.GET.get("trending", "").lower() in ("true", "1", "yes", "on")
+
+
+def trending_staleness(request) -> float:
+    """Seconds a trending page may lag behind new sniffs"""
+    if is_trending(request):
+        return settings.PAGE_CACHE_TRENDING_STALENESS_SECONDS
+    return 0
+
+
+def trending_limit_header(run):
+    """
+    Tell clients how many barks ?trending=true lists at most, in an
+    X-Trending-Limit header. Goes outside the page cache so cached pages
+    carry it too.
+    """
+    @wraps(run)
+    def wrapper(request, *args, **kwargs):
+        response = run(request, *args, **kwargs)
+        if settings.TRENDING_MATERIALIZED and is_trending(request):
+            response["X-Trending-Limit"] = str(trending_index.size)
+        return response
+
+    return wrapper
+
+
+@router.get("/", response=list[BarkSchemaOut], auth=OptionalBearerAuth())
+@decorate_view(
+    query_budget(4),
+    page_cache.cache_anonymous_get(
+        partitions=(PARTITION_BARKS, PARTITION_SNIFFS),
+        bounded_partitions=(PARTITION_SNIFFS,),
+        max_staleness=trending_staleness,
+    ),
+    trending_limit_header,
+)
+@columnar_response(BarkColumnarSerializer)
+@paginate(KeysetPagination, orderings=BARK_ORDERINGS, default="-created_at")
 def barks_list(request, filters: BarksFilter = Query(...)):
     """
     Bark list endpoint that returns a list of barks.
+    Authenticated callers also get sniffed_by_me on each bark.
+    trending=true lists at most TRENDING_SIZE barks, the most sniffed ones,
+    and says how many in the X-Trending-Limit header.
+    Pages are cursor based; follow next/previous to move through them.
+    Anonymous responses are served from the page cache.
     """
-    objs = handle_barks_list(filters=filters)
-    return objs
+    objs = handle_barks_list(filters=filters, viewer=request.auth)
+    return BarkColumnarSerializer.queryset(objs)
 
 
 @router.get("/top-export/")
+@decorate_view(query_budget(3))
 def export_top_barks_csv(request):
     """
     Endpoint for downloading a CSV of the user's top 10 most sniffed barks.
@@ -43,20 +98,31 @@ def export_top_barks_csv(request):
         status_code, error_response = get_error_response(e)
         return status_code, error_response
 
+
+@router.get("/export/")
+def export_barks(request, params: BarkExportSchemaIn = Query(...)):
+    """
+    Streams every bark of the current user as CSV or NDJSON, optionally gzipped.
+    """
+    return handle_export_barks(user=request.auth, format=params.format, compress=params.gzip)
+
+
 @router.get("/{bark_id}/", response={200: BarkSchemaOut, 404: ErrorSchemaOut}, auth=None)
+@decorate_view(query_budget(1))
 def get_bark(request, bark_id: UUID):
     """
     Bark detail endpoint that returns a single bark.
+    Served from the bark cache, so the response is rendered directly.
     """
     try:
-        bark_instance = handle_get_bark(bark_id)
-        return 200, bark_instance
+        return json_response(request, handle_get_bark(bark_id))
     except Exception as e:
         status_code, error_response = get_error_response(e)
         return status_code, error_response
 
 
 @router.delete("/{bark_id}/", response={204: None, 404: ErrorSchemaOut})
+@decorate_view(query_budget(5))
 def delete_bark(request, bark_id: UUID):
     """Delete a bark."""
     try:
@@ -68,6 +134,7 @@ def delete_bark(request, bark_id: UUID):
 
 
 @router.put("/{bark_id}/", response={200: BarkSchemaOut, 404: ErrorSchemaOut})
+@decorate_view(query_budget(4))
 def update_bark(request, bark_id: UUID, bark: BarkCreateUpdateSchemaIn):
     """Update an existing bark."""
     try:
@@ -79,6 +146,7 @@ def update_bark(request, bark_id: UUID, bark: BarkCreateUpdateSchemaIn):
 
 
 @router.post("/", response={201: BarkSchemaOut})
+@decorate_view(query_budget(3))
 def create_bark(request, bark: BarkCreateUpdateSchemaIn):
     """Create a new bark."""
     new_bark = handle_create_bark(user=request.auth, data=bark.dict())
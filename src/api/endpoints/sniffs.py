@@ -1,8 +1,15 @@
 from ninja import Router
-from api.schemas.sniff_schemas import SniffSchemaOut, SniffCreateSchemaIn
-from api.logic.sniff_logic import handle_create_sniff
+from ninja.decorators import decorate_view
+from api.schemas.sniff_schemas import (
+    SniffSchemaOut,
+    SniffCreateSchemaIn,
+    SniffBulkCreateSchemaIn,
+    SniffBulkSchemaOut,
+)
+from api.logic.sniff_logic import handle_create_sniff, handle_create_sniffs_bulk
 from api.logic.exceptions import get_error_response
 from api.schemas.common_schemas import ErrorSchemaOut
+from common.query_budget import query_budget
 
 router = Router()
 
@@ -10,6 +17,7 @@ router = Router()
 @router.post(
     "/", response={201: SniffSchemaOut, 409: ErrorSchemaOut, 404: ErrorSchemaOut}
 )
+@decorate_view(query_budget(5))
 def create_sniff(request, sniff: SniffCreateSchemaIn):
     """Sniff to a bark"""
     try:
@@ -18,3 +26,11 @@ def create_sniff(request, sniff: SniffCreateSchemaIn):
     except Exception as e:
         status_code, error_response = get_error_response(e)
         return status_code, error_response
+
+
+@router.post("/bulk/", response={200: SniffBulkSchemaOut})
+@decorate_view(query_budget(6))
+def create_sniffs_bulk(request, sniffs: SniffBulkCreateSchemaIn):
+    """Sniff several barks at once, reporting the outcome per bark"""
+    results = handle_create_sniffs_bulk(bark_ids=sniffs.bark_ids, user=request.auth)
+    return 200, {"results": results}
@@ -1,38 +1,59 @@
 from uuid import UUID
+from django.http import HttpResponse
 from ninja import Router, Query, File
+from ninja.decorators import decorate_view
 from ninja.files import UploadedFile
 from api.schemas.user_schemas import (
     DogUserSchemaOut,
     DogUserCreateSchemaIn,
     DogUserUpdateSchemaIn,
     DogUserWithTokenSchemaOut,
+    DogUserTypeaheadSchemaIn,
+    DogUserTypeaheadSchemaOut,
+    DogUserColumnarSerializer,
 )
 from api.schemas.common_schemas import ErrorSchemaOut
 from api.logic.user_logic import (
-    handle_create_dog_user,
+    ahandle_create_dog_user,
     handle_dog_users_list,
     handle_update_me,
     handle_get_dog_user,
     handle_get_current_user,
     handle_upload_profile_image,
+    handle_typeahead_users,
 )
-from api.logic.exceptions import get_error_response
+from api.logic.exceptions import get_error_response, get_error_headers
 from ninja.pagination import paginate
-from common.filters import UsersFilter
+from common.filters import UsersFilter, USER_ORDERINGS
+from common.columnar import columnar_response
+from common.pagination import KeysetPagination
+from common.query_budget import query_budget
 
 router = Router()
 
 
 @router.get("/", response=list[DogUserSchemaOut])
-@paginate
+@decorate_view(query_budget(3))
+@columnar_response(DogUserColumnarSerializer)
+@paginate(KeysetPagination, orderings=USER_ORDERINGS, default="created_at")
 def dog_users_list(request, filters: UsersFilter = Query(...)):
     """
     Endpoint that returns a list of dog users.
+    Pages are cursor based; follow next/previous to move through them.
     """
     users = handle_dog_users_list(filters=filters)
-    return users
+    return DogUserColumnarSerializer.queryset(users)
+
+@router.get("/typeahead/", response=list[DogUserTypeaheadSchemaOut])
+@decorate_view(query_budget(3))
+def typeahead_users(request, params: DogUserTypeaheadSchemaIn = Query(...)):
+    """
+    Username autocomplete: users whose username starts with q, ignoring case.
+    """
+    return handle_typeahead_users(prefix=params.q, limit=params.limit)
 
 @router.get("/me/", response={200: DogUserSchemaOut})
+@decorate_view(query_budget(2))
 def get_current_user(request):
     """
     Endpoint that returns the currently authenticated user.
@@ -41,17 +62,20 @@ def get_current_user(request):
     return 200, user
 
 
-@router.post("/", response={201: DogUserWithTokenSchemaOut, 409: ErrorSchemaOut}, auth=None)
-def create_user(request, user: DogUserCreateSchemaIn):
+@router.post("/", response={201: DogUserWithTokenSchemaOut, 409: ErrorSchemaOut, 503: ErrorSchemaOut}, auth=None)
+async def create_user(request, response: HttpResponse, user: DogUserCreateSchemaIn):
     """Create a new user."""
     try:
-        user_obj, token_obj = handle_create_dog_user(username=user.username, password=user.password)
+        user_obj, token_obj = await ahandle_create_dog_user(username=user.username, password=user.password)
     except Exception as e:
         status_code, error_response = get_error_response(e)
+        for header, value in get_error_headers(e).items():
+            response[header] = value
         return status_code, error_response
     return 201, {"user": user_obj, "token": token_obj.key}
 
 @router.get("/{user_id}/", response={200: DogUserSchemaOut, 404: ErrorSchemaOut})
+@decorate_view(query_budget(3))
 def get_user(request, user_id: UUID):
     """Get a user by ID."""
     try:
@@ -62,6 +86,7 @@ def get_user(request, user_id: UUID):
     return 200, user
 
 @router.patch("/me/", response={200: DogUserSchemaOut, 409: ErrorSchemaOut})
+@decorate_view(query_budget(4))
 def update_me(request, user: DogUserUpdateSchemaIn):
     """Update a user by ID."""
     try:
@@ -75,6 +100,7 @@ def update_me(request, user: DogUserUpdateSchemaIn):
 @router.post(
     "/me/profile-image/", response={200: DogUserSchemaOut, 400: ErrorSchemaOut}
 )
+@decorate_view(query_budget(3))
 def upload_profile_image(request, image: UploadedFile = File(...)):
     """
     Endpoint for uploading a profile image for the current user.
@@ -1,12 +1,91 @@
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from api.logic.exceptions import AuthenticationError, TokenExpiredError, TokenInvalidError
-from common.auth.jwt_auth import create_jwt
+from api.logic.exceptions import AuthenticationError, ServiceBusyError, TokenExpiredError, TokenInvalidError
+from common.auth.jwt_auth import create_jwt, user_claims
+from common.auth.passwords import PasswordPoolBusyError, password_needs_rehash, password_pool
+from common.auth.revocation import revocation_store
+from common.auth.token import invalidate_user_tokens
 from core.models import DogUserModel, AuthTokenModel
-from django.contrib.auth import authenticate
+from django.db import transaction
 from django.utils import timezone
+from datetime import datetime, timezone as dt_timezone
 import jwt
 
-def handle_get_token(username: str, password: str) -> dict:
+
+async def averify_credentials(username: str, password: str) -> DogUserModel:
+    """
+    Check a username and password, hashing in the password pool.
+
+    Mirrors Django's ModelBackend: unknown usernames still pay for one hash so
+    response times don't reveal which usernames exist, inactive users are
+    rejected, and hashes made with outdated parameters are upgraded. Hashing
+    is awaited, so under ASGI the event loop keeps serving other requests
+    while a login waits for the pool.
+
+    Args:
+        username: The username of the user
+        password: The password of the user
+
+    Returns:
+        The authenticated user, or raises AuthenticationError if the credentials
+        are invalid and ServiceBusyError if the password pool is saturated.
+    """
+    try:
+        try:
+            user = await DogUserModel.objects.aget_by_natural_key(username)
+        except DogUserModel.DoesNotExist:
+            await password_pool.amake_password(password)
+            raise AuthenticationError("Invalid credentials")
+
+        if not await password_pool.acheck_password(password, user.password) or not user.is_active:
+            raise AuthenticationError("Invalid credentials")
+
+        if password_needs_rehash(user.password):
+            user.password = await password_pool.amake_password(password)
+            await user.asave(update_fields=["password"])
+    except PasswordPoolBusyError as e:
+        raise ServiceBusyError(str(e), retry_after=e.retry_after)
+    return user
+
+
+def rotate_auth_tokens(user: DogUserModel) -> tuple[AuthTokenModel, AuthTokenModel]:
+    """
+    Replace the user's access and refresh tokens in a single statement.
+
+    Both rows are upserted on the (user, token_type) unique key, so there is
+    no delete-then-insert window for concurrent logins to race on. An upsert
+    that updates an existing row leaves the instance with the id generated
+    for it, not the row's, so the tokens are read back before returning.
+
+    Args:
+        user: The user to issue tokens for
+
+    Returns:
+        A tuple of the new (access_token, refresh_token) instances.
+    """
+    tokens = [
+        AuthTokenModel(
+            user=user,
+            token_type=token_type,
+            key=AuthTokenModel.generate_key(),
+            expires=AuthTokenModel.default_expires(token_type),
+            is_active=True,
+        )
+        for token_type in (AuthTokenModel.TOKEN_TYPE_ACCESS, AuthTokenModel.TOKEN_TYPE_REFRESH)
+    ]
+    with transaction.atomic():
+        AuthTokenModel.objects.bulk_create(
+            tokens,
+            update_conflicts=True,
+            unique_fields=["user", "token_type"],
+            update_fields=["key", "expires", "is_active", "created_at", "updated_at"],
+        )
+        tokens = {token.token_type: token for token in AuthTokenModel.objects.filter(user=user)}
+    invalidate_user_tokens(user.id)
+    return tokens[AuthTokenModel.TOKEN_TYPE_ACCESS], tokens[AuthTokenModel.TOKEN_TYPE_REFRESH]
+
+
+async def ahandle_get_token(username: str, password: str) -> dict:
     """
     Handle the logic for getting an authentication token.
 
@@ -17,13 +96,9 @@ def handle_get_token(username: str, password: str) -> dict:
     Returns:
         A dictionary containing access and refresh tokens, or raises an AuthenticationError if authentication fails.
     """
-    user = authenticate(username=username, password=password)
-    if user is None:
-        raise AuthenticationError("Invalid credentials")
+    user = await averify_credentials(username, password)
 
-    AuthTokenModel.objects.filter(user=user).delete()
-    access_token = AuthTokenModel.objects.create(user=user, token_type=AuthTokenModel.TOKEN_TYPE_ACCESS)
-    refresh_token = AuthTokenModel.objects.create(user=user, token_type=AuthTokenModel.TOKEN_TYPE_REFRESH)
+    access_token, refresh_token = await sync_to_async(rotate_auth_tokens)(user)
 
     return {
         "access_token": access_token.key,
@@ -42,19 +117,15 @@ def handle_refresh_token(refresh_token: str) -> dict:
         A dictionary containing a new access and refresh token, or raises TokenInvalidError or TokenExpiredError if the token is invalid or expired.
     """
     try:
-        refresh = AuthTokenModel.objects.get(key=refresh_token, token_type=AuthTokenModel.TOKEN_TYPE_REFRESH)
+        refresh = AuthTokenModel.objects.select_related("user").get(key=refresh_token, token_type=AuthTokenModel.TOKEN_TYPE_REFRESH)
     except AuthTokenModel.DoesNotExist:
         raise TokenInvalidError("Invalid refresh token")
 
     if not refresh.is_valid():
         raise TokenExpiredError("Expired refresh token")
 
-    # Delete existing tokens for the user
-    AuthTokenModel.objects.filter(user=refresh.user).delete()
-
-    # Create new access and refresh tokens
-    access_token = AuthTokenModel.objects.create(user=refresh.user, token_type=AuthTokenModel.TOKEN_TYPE_ACCESS)
-    new_refresh_token = AuthTokenModel.objects.create(user=refresh.user, token_type=AuthTokenModel.TOKEN_TYPE_REFRESH)
+    # Replace the user's access and refresh tokens
+    access_token, new_refresh_token = rotate_auth_tokens(refresh.user)
 
     return {
         "access_token": access_token.key,
@@ -62,7 +133,7 @@ def handle_refresh_token(refresh_token: str) -> dict:
         "expires_in": int((access_token.expires - timezone.now()).total_seconds())
     }
 
-def handle_get_jwt_token(username: str, password: str) -> dict:
+async def ahandle_get_jwt_token(username: str, password: str) -> dict:
     """
     Handle the logic for getting a JWT token.
 
@@ -73,14 +144,11 @@ def handle_get_jwt_token(username: str, password: str) -> dict:
     Returns:
         A dictionary containing a JWT token, or raises an AuthenticationError if authentication fails.
     """
-    user = authenticate(username=username, password=password)
-    if user is None:
-        raise AuthenticationError("Invalid credentials")
+    user = await averify_credentials(username, password)
 
-    
-    access_token = create_jwt(user.id, 'access')
+    access_token = create_jwt(user.id, 'access', claims=user_claims(user))
     refresh_token = create_jwt(user.id, 'refresh')
-    
+
     return {
         "access_token": access_token,
         "refresh_token": refresh_token,
@@ -105,7 +173,15 @@ def handle_refresh_jwt_token(refresh_token: str) -> dict:
     except (KeyError, AssertionError, DogUserModel.DoesNotExist):
         raise TokenInvalidError("Invalid refresh token")
 
-    access_token = create_jwt(user_id=user.id, token_type="access")
+    # Refresh tokens are single use: revoking the old one fails if it was already spent
+    if "jti" in payload:
+        expires_at = datetime.fromtimestamp(payload["exp"], tz=dt_timezone.utc)
+        if not revocation_store.revoke(payload["jti"], expires_at=expires_at):
+            raise TokenInvalidError("Invalid refresh token")
+
+    access_token = create_jwt(
+        user_id=user.id, token_type="access", claims=user_claims(user)
+    )
     refresh_token = create_jwt(user_id=user.id, token_type="refresh")
 
     return {
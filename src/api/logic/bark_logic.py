@@ -1,10 +1,21 @@
-from core.models import DogUserModel, BarkModel
+from core.models import DogUserModel, BarkModel, UserSniffModel
 from api.logic.exceptions import ResourceNotFoundError
-from common.filters import BarksFilter, apply_ordering
-from django.db.models import QuerySet
+from common.filters import BarksFilter, BARK_ORDERINGS, apply_ordering
+from django.db import transaction
+from django.db.models import Exists, OuterRef, QuerySet
+from common.page_cache import PARTITION_BARKS, page_cache
+from common.projection import ordering_fields, project
+from common.streaming import csv_chunks, gzip_chunks, ndjson_chunks
+from common.search import get_search_backend
+from common.trending import trending_index
 import csv
 from io import StringIO
-from django.http import HttpResponse
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from api.schemas.bark_schemas import BarkSchemaOut
+from api.schemas.user_schemas import DogUserSchemaOut
+from common.counters import sniff_count_buffer
+from common.object_cache import author_cache, bark_cache
 
 
 def handle_create_bark(user: DogUserModel, data: dict) -> BarkModel:
@@ -20,28 +31,74 @@ def handle_create_bark(user: DogUserModel, data: dict) -> BarkModel:
     """
     data["user_id"] = user.id
     bark = BarkModel.objects.create(user=user, **data)
+    transaction.on_commit(lambda: page_cache.bump(PARTITION_BARKS))
     return bark
 
 
 
-def handle_barks_list(filters: BarksFilter) -> QuerySet[BarkModel]:
+def handle_barks_list(filters: BarksFilter, viewer=None) -> QuerySet[BarkModel]:
     """
     Handle the logic for retrieving a list of barks.
     Returns a list of BarkModel instances.
+
+    Only the columns BarkSchemaOut renders (and the keyset ordering fields)
+    are loaded. When an authenticated viewer is given, each bark is annotated
+    with sniffed_by_me, an EXISTS lookup of the viewer's sniff on the
+    (user, bark) unique index, so the page needs no extra query. Model rows
+    and the columnar .values() rows both carry it.
     """
-    objs = BarkModel.objects.select_related("user").all()
+    objs = project(
+        BarkModel.objects.select_related("user"),
+        BarkSchemaOut,
+        also=ordering_fields(BarkModel, BARK_ORDERINGS),
+    )
+    if viewer is not None and viewer.is_authenticated:
+        objs = objs.annotate(
+            sniffed_by_me=Exists(UserSniffModel.objects.filter(user=viewer, bark=OuterRef("pk")))
+        )
     queryset = filters.filter(objs)
+    if filters.message:
+        queryset = get_search_backend().search(queryset, filters.message)
     if filters.trending:
         queryset = queryset.order_by("-sniff_count")
     elif filters.order_by:
         queryset = apply_ordering(
             queryset=queryset, order_by=filters.order_by, model_class=BarkModel
         )
+    elif filters.message:
+        # Most relevant first when searching without an explicit ordering
+        queryset = queryset.order_by("search_rank")
     return queryset
 
 
 
-def handle_get_bark(bark_id: str) -> BarkModel:
+def bark_cache_entry(bark: BarkModel) -> tuple:
+    """
+    The bark_cache entry for a bark: its author's id and its BarkSchemaOut
+    payload without the author. sniff_count is the committed count; readers
+    add unflushed increments.
+    """
+    payload = BarkSchemaOut.from_orm(bark).model_dump()
+    del payload["user"]
+    payload["sniff_count"] = bark.sniff_count
+    return bark.user_id, payload
+
+
+def _load_bark(bark_id, fetched: dict) -> tuple | None:
+    bark = project(BarkModel.objects.select_related("user"), BarkSchemaOut).filter(id=bark_id).first()
+    if not bark:
+        return None
+    # The author came with the bark, so it doesn't need a query of its own
+    fetched["author"] = DogUserSchemaOut.from_orm(bark.user).model_dump()
+    return bark_cache_entry(bark)
+
+
+def _load_author(user_id) -> dict:
+    author = project(DogUserModel.objects.all(), DogUserSchemaOut).get(id=user_id)
+    return DogUserSchemaOut.from_orm(author).model_dump()
+
+
+def handle_get_bark(bark_id: str) -> dict:
     """
     Handle the logic for retrieving a single bark by its ID.
     
@@ -49,15 +106,22 @@ def handle_get_bark(bark_id: str) -> BarkModel:
         bark_id: The ID of the bark to retrieve.
     
     Returns:
-        BarkModel: The requested bark object.
+        dict: The bark serialized as BarkSchemaOut, from the bark cache.
     
     Raises:
         ResourceNotFoundError: If the bark with the given ID does not exist.
     """
-    bark = BarkModel.objects.filter(id=bark_id).first()
-    if not bark:
+    fetched = {}
+    entry = bark_cache.get_or_load(bark_id, lambda: _load_bark(bark_id, fetched))
+    if entry is None:
         raise ResourceNotFoundError("Bark not found")
-    return bark
+    user_id, payload = entry
+    author = author_cache.get_or_load(user_id, lambda: fetched.get("author") or _load_author(user_id))
+    return {
+        "user": author,
+        **payload,
+        "sniff_count": payload["sniff_count"] + sniff_count_buffer.pending(payload["id"]),
+    }
 
 
 def handle_delete_bark(bark_id: str, user: DogUserModel) -> None:
@@ -76,7 +140,12 @@ def handle_delete_bark(bark_id: str, user: DogUserModel) -> None:
         raise ResourceNotFoundError("Bark not found")
     
     # Delete the bark instance
+    # delete() clears bark.id
+    deleted_id = bark.id
     bark.delete()
+    transaction.on_commit(lambda: bark_cache.delete(deleted_id))
+    transaction.on_commit(lambda: trending_index.discard(deleted_id))
+    transaction.on_commit(lambda: page_cache.bump(PARTITION_BARKS))
 
 
 def handle_update_bark(bark_id: str, user: DogUserModel, data: dict) -> BarkModel:
@@ -94,14 +163,18 @@ def handle_update_bark(bark_id: str, user: DogUserModel, data: dict) -> BarkMode
     Raises:
         ResourceNotFoundError: If the bark with the given ID does not exist or does not belong to the user.
     """
-    bark = BarkModel.objects.filter(id=bark_id, user=user).first()
+    bark = BarkModel.objects.select_related("user").filter(id=bark_id, user=user).first()
     if not bark:
         raise ResourceNotFoundError("Bark not found")
     
     # Update the bark instance with the new data
     for attr, value in data.items():
         setattr(bark, attr, value)
-    bark.save()
+    # Only the edited columns, so concurrent sniff_count increments aren't undone
+    bark.save(update_fields=["message", "updated_at"])
+    # The sniff_count read above may already be behind, so don't write it through
+    transaction.on_commit(lambda: bark_cache.delete(bark.id))
+    transaction.on_commit(lambda: page_cache.bump(PARTITION_BARKS))
     
     return bark
 
@@ -140,4 +213,48 @@ def handle_export_top_barks_csv(user: DogUserModel) -> HttpResponse:
     response = HttpResponse(output.getvalue(), content_type="text/csv")
     response["Content-Disposition"] = 'attachment; filename="top_barks.csv"'
 
-    return response
\ No newline at end of file
+    return response
+
+
+# Columns of the bark history export, as (CSV header, NDJSON key, model field)
+EXPORT_COLUMNS = (
+    ("ID", "id", "id"),
+    ("Message", "message", "message"),
+    ("Sniff Count", "sniff_count", "sniff_count"),
+    ("Created At", "created_at", "created_at"),
+    ("Updated At", "updated_at", "updated_at"),
+)
+
+
+def handle_export_barks(user: DogUserModel, format: str, compress: bool) -> StreamingHttpResponse:
+    """
+    Handle the logic for exporting every bark of a user, oldest first.
+
+    Rows are read with .iterator() and encoded (and optionally gzipped) a
+    chunk at a time while the response streams, so memory use doesn't grow
+    with the number of barks.
+
+    Args:
+        user: The user whose barks are exported.
+        format: "csv" or "ndjson".
+        compress: Whether to gzip the file.
+    """
+    rows = (
+        BarkModel.objects.filter(user=user)
+        .order_by("created_at", "id")
+        .values_list(*(field for _, _, field in EXPORT_COLUMNS))
+        .iterator(chunk_size=settings.BARK_EXPORT_CHUNK_SIZE)
+    )
+    if format == "ndjson":
+        chunks = ndjson_chunks([key for _, key, _ in EXPORT_COLUMNS], rows, settings.BARK_EXPORT_CHUNK_SIZE)
+        content_type, filename = "application/x-ndjson", "barks.ndjson"
+    else:
+        chunks = csv_chunks([header for header, _, _ in EXPORT_COLUMNS], rows, settings.BARK_EXPORT_CHUNK_SIZE)
+        content_type, filename = "text/csv", "barks.csv"
+    if compress:
+        chunks = gzip_chunks(chunks)
+        content_type, filename = "application/gzip", f"{filename}.gz"
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
@@ -30,6 +30,14 @@ class InvalidFileError(LogicError):
     pass
 
 
+class ServiceBusyError(LogicError):
+    """Raised when a request is shed because a worker pool is saturated"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
 EXCEPTION_TO_HTTP_STATUS = {
     DuplicateResourceError: 409,
     ResourceNotFoundError: 404,
@@ -37,6 +45,7 @@ EXCEPTION_TO_HTTP_STATUS = {
     TokenInvalidError: 401,
     TokenExpiredError: 401,
     InvalidFileError: 400,
+    ServiceBusyError: 503,
     LogicError: 500,
 }
 
@@ -58,3 +67,18 @@ def get_error_response(exception: Exception) -> tuple[int, dict]:
 
     # Default fallback for unexpected exceptions
     return 500, {"error": "An unexpected error occurred"}
+
+
+def get_error_headers(exception: Exception) -> dict:
+    """
+    Return any extra HTTP headers that belong with an error response.
+
+    Args:
+        exception: The exception that was raised
+
+    Returns:
+        dict: Header names mapped to values, empty when there are none
+    """
+    if isinstance(exception, ServiceBusyError):
+        return {"Retry-After": str(exception.retry_after)}
+    return {}
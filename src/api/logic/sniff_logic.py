@@ -1,22 +1,122 @@
+from uuid import UUID
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from common.counters import sniff_count_buffer
+from common.object_cache import bark_cache
+from common.page_cache import PARTITION_SNIFFS, page_cache
+from common.trending import trending_index
 from core.models import BarkModel, UserSniffModel
 from api.logic.exceptions import ResourceNotFoundError, DuplicateResourceError
 
 
 def handle_create_sniff(bark_id: str, user) -> BarkModel:
-    """Handle creating a sniff (like) on a bark"""
+    """
+    Handle creating a sniff (like) on a bark.
+
+    The sniff insert and the counter bump run in one transaction. Duplicates
+    are caught by the (user, bark) unique constraint rather than a separate
+    exists() check, and the count is incremented in the database so
+    concurrent sniffs can't overwrite each other.
+    """
+    if settings.SNIFF_COUNT_WRITE_BEHIND:
+        return _create_sniff_write_behind(bark_id, user)
+
     try:
-        bark = BarkModel.objects.get(id=bark_id)
-    except BarkModel.DoesNotExist:
+        with transaction.atomic():
+            UserSniffModel.objects.create(user=user, bark_id=bark_id)
+            updated = BarkModel.objects.filter(id=bark_id).update(
+                sniff_count=F("sniff_count") + 1
+            )
+            if not updated:
+                raise ResourceNotFoundError("Bark not found")
+    except IntegrityError:
+        raise DuplicateResourceError("You've already sniffed this bark")
+
+    bark = BarkModel.objects.select_related("user").filter(id=bark_id).first()
+    if not bark:
         raise ResourceNotFoundError("Bark not found")
+    # Racing sniffs' counts can commit out of order, so don't write this one through
+    transaction.on_commit(lambda: bark_cache.delete(bark.id))
+    transaction.on_commit(lambda: trending_index.record_sniffs({bark.id: bark.created_at}))
+    transaction.on_commit(lambda: page_cache.bump(PARTITION_SNIFFS))
+    return bark
 
-    # Check if the user has already sniffed this bark
-    if UserSniffModel.objects.filter(user=user, bark=bark).exists():
-        raise DuplicateResourceError("You've already sniffed this bark")
 
-    # Create the sniff
-    UserSniffModel.objects.create(user=user, bark=bark)
+def _create_sniff_write_behind(bark_id: str, user) -> BarkModel:
+    """
+    Create a sniff without touching the bark row.
 
-    # Increment the sniff count
-    bark.sniff_count += 1
-    bark.save()
+    The UserSniffModel insert stays authoritative for uniqueness; the count
+    increment goes to the write-behind buffer once the insert has committed.
+    """
+    try:
+        with transaction.atomic():
+            UserSniffModel.objects.create(user=user, bark_id=bark_id)
+            bark = BarkModel.objects.select_related("user").filter(id=bark_id).first()
+            if not bark:
+                raise ResourceNotFoundError("Bark not found")
+            # A base count read before a flush would stay cached after it
+            transaction.on_commit(lambda: bark_cache.delete(bark.id))
+            transaction.on_commit(lambda: sniff_count_buffer.add(bark.id))
+            transaction.on_commit(lambda: trending_index.record_sniffs({bark.id: bark.created_at}))
+            transaction.on_commit(lambda: page_cache.bump(PARTITION_SNIFFS))
+    except IntegrityError:
+        raise DuplicateResourceError("You've already sniffed this bark")
     return bark
+
+
+def handle_create_sniffs_bulk(bark_ids: list[UUID], user) -> list[dict]:
+    """
+    Handle sniffing a batch of barks in a constant number of queries.
+
+    Sniffs are inserted with ignore_conflicts so already-sniffed barks are
+    skipped by the (user, bark) unique constraint. Reading back the generated
+    sniff ids tells exactly which rows this call inserted, and only those
+    barks get their sniff_count incremented, in a single UPDATE.
+
+    Returns:
+        A list of {"bark_id", "status"} dicts in request order, where status is
+        "sniffed", "already_sniffed" or "not_found".
+    """
+    bark_ids = list(dict.fromkeys(bark_ids))
+
+    with transaction.atomic():
+        existing = dict(
+            BarkModel.objects.filter(id__in=bark_ids).values_list("id", "created_at")
+        )
+        sniffs = [
+            UserSniffModel(user=user, bark_id=bark_id)
+            for bark_id in bark_ids
+            if bark_id in existing
+        ]
+        UserSniffModel.objects.bulk_create(sniffs, ignore_conflicts=True)
+        inserted = set(
+            UserSniffModel.objects.filter(
+                id__in=[sniff.id for sniff in sniffs]
+            ).values_list("bark_id", flat=True)
+        )
+
+        if inserted and settings.SNIFF_COUNT_WRITE_BEHIND:
+            transaction.on_commit(
+                lambda: [sniff_count_buffer.add(bark_id) for bark_id in inserted]
+            )
+        elif inserted:
+            BarkModel.objects.filter(id__in=inserted).update(
+                sniff_count=F("sniff_count") + 1
+            )
+            transaction.on_commit(lambda: bark_cache.delete_many(inserted))
+        if inserted:
+            transaction.on_commit(
+                lambda: trending_index.record_sniffs({bark_id: existing[bark_id] for bark_id in inserted})
+            )
+            transaction.on_commit(lambda: page_cache.bump(PARTITION_SNIFFS))
+
+    def status(bark_id):
+        if bark_id in inserted:
+            return "sniffed"
+        if bark_id in existing:
+            return "already_sniffed"
+        return "not_found"
+
+    return [{"bark_id": bark_id, "status": status(bark_id)} for bark_id in bark_ids]
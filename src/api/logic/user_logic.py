@@ -1,36 +1,65 @@
-from common.filters import UsersFilter, apply_ordering
+from asgiref.sync import sync_to_async
+from common.filters import UsersFilter, USER_ORDERINGS, apply_ordering
 from core.models import DogUserModel, AuthTokenModel
-from api.logic.exceptions import DuplicateResourceError, ResourceNotFoundError, InvalidFileError
+from api.logic.exceptions import DuplicateResourceError, ResourceNotFoundError, InvalidFileError, ServiceBusyError
+from common.auth.passwords import PasswordPoolBusyError, password_pool
+from common.auth.jwt_auth import invalidate_user_version
+from common.auth.token import invalidate_user_tokens
+from common.object_cache import author_cache
+from common.page_cache import PARTITION_BARKS, page_cache
+from common.projection import ordering_fields, project
+from common.search import get_search_backend
+from common.typeahead import typeahead_index
+from django.db import transaction
 from django.db.models import QuerySet
 from ninja.files import UploadedFile
 from django.core.files.storage import default_storage
+from api.schemas.user_schemas import DogUserSchemaOut
 
 
 def handle_dog_users_list(filters: UsersFilter) -> QuerySet[DogUserModel]:
     """
     Handle the logic for listing dog users.
-    Returns a list of all dog users.
+    Returns a list of all dog users, loading only the columns DogUserSchemaOut renders.
     """
-    objs = DogUserModel.objects.all()
+    objs = project(DogUserModel.objects.all(), DogUserSchemaOut, also=ordering_fields(DogUserModel, USER_ORDERINGS))
     queryset = filters.filter(objs)
+    if filters.search:
+        queryset = get_search_backend().search(queryset, filters.search)
     if filters.order_by:
         queryset = apply_ordering(
             queryset=queryset, order_by=filters.order_by, model_class=DogUserModel
         )
+    elif filters.search:
+        # Most relevant first when searching without an explicit ordering
+        queryset = queryset.order_by("search_rank")
     return queryset
 
 
 
-def handle_create_dog_user(username: str, password: str) -> tuple[DogUserModel, AuthTokenModel]:
+async def ahandle_create_dog_user(username: str, password: str) -> tuple[DogUserModel, AuthTokenModel]:
     """
     Handle the logic for creating a new dog user.
     Returns the created user and their authentication token.
     """
-    if DogUserModel.objects.filter(username=username).exists():
+    if await DogUserModel.objects.filter(username=username).aexists():
         raise DuplicateResourceError("Username already exists")
     
-    user = DogUserModel.objects.create_user(username=username, password=password)
+    # Hash in the password pool rather than letting create_user() do it inline;
+    # awaiting it keeps the event loop free under ASGI
+    try:
+        encoded_password = await password_pool.amake_password(password)
+    except PasswordPoolBusyError as e:
+        raise ServiceBusyError(str(e), retry_after=e.retry_after)
+
+    return await sync_to_async(_create_dog_user)(username, encoded_password)
+
+
+def _create_dog_user(username: str, encoded_password: str) -> tuple[DogUserModel, AuthTokenModel]:
+    user = DogUserModel(username=DogUserModel.normalize_username(username), password=encoded_password)
+    user.save()
     token = AuthTokenModel.objects.create(user=user)
+    transaction.on_commit(lambda: typeahead_index.add(user.id, user.username))
     
     return user, token
 
@@ -38,6 +67,10 @@ def handle_update_me(user: DogUserModel, data: dict) -> DogUserModel:
     """
     Handle the logic for updating the currently authenticated user.
     Returns the updated user object.
+
+    Only the submitted fields are written: request.auth can be a cached or
+    claims-built copy, and saving every field would write its possibly
+    stale values back.
     """
     if 'username' in data and data['username'] != user.username:
         if DogUserModel.objects.filter(username=data['username']).exists():
@@ -46,9 +79,26 @@ def handle_update_me(user: DogUserModel, data: dict) -> DogUserModel:
     for attr, value in data.items():
         setattr(user, attr, value)
     
-    user.save()
+    user.save(update_fields=[*data, "updated_at"])
+    if 'username' in data:
+        transaction.on_commit(lambda: typeahead_index.add(user.id, user.username))
+    # Cached token lookups hold the old user
+    transaction.on_commit(lambda: invalidate_user_tokens(user.id))
+    transaction.on_commit(lambda: invalidate_user_version(user.id))
+    # Barks embed their author, so cached bark pages are out of date
+    transaction.on_commit(lambda: author_cache.delete(user.id))
+    transaction.on_commit(lambda: page_cache.bump(PARTITION_BARKS))
     return user
 
+def handle_typeahead_users(prefix: str, limit: int) -> list[dict]:
+    """
+    Handle the logic for username autocomplete.
+    Returns up to limit users whose username starts with prefix, ignoring case,
+    in username order.
+    """
+    return typeahead_index.search(prefix, limit)
+
+
 def handle_get_dog_user(user_id: int) -> DogUserModel:
     """
     Handle the logic for retrieving a dog user by ID.
@@ -92,5 +142,9 @@ def handle_upload_profile_image(
 
     # Save new image
     user.profile_image = image
-    user.save()
+    user.save(update_fields=["profile_image", "updated_at"])
+    transaction.on_commit(lambda: invalidate_user_tokens(user.id))
+    transaction.on_commit(lambda: invalidate_user_version(user.id))
+    transaction.on_commit(lambda: author_cache.delete(user.id))
+    transaction.on_commit(lambda: page_cache.bump(PARTITION_BARKS))
     return user
\ No newline at end of file
@@ -1,7 +1,11 @@
 from ninja import ModelSchema, Schema
 from core.models import BarkModel
-from api.schemas.user_schemas import DogUserSchemaOut
+from api.schemas.user_schemas import DogUserSchemaOut, DogUserColumnarSerializer
 from pydantic import field_validator
+from typing import Literal, Optional
+from common.columnar import ColumnarSerializer, DateTimeFormatter
+from common.projection import requires
+from common.counters import sniff_count_buffer
 
 class BarkSchemaOut(ModelSchema):
     """Schema for bark responses"""
@@ -12,32 +16,90 @@ class BarkSchemaOut(ModelSchema):
     updated_date: str
     updated_time: str
     sniff_count: int
+    sniffed_by_me: Optional[bool] = None
 
     class Meta:
         model = BarkModel
         fields = ["id", "message"]
 
     @staticmethod
+    @requires()
+    def resolve_sniffed_by_me(obj):
+        """Resolve whether the viewer sniffed this bark, None when not known"""
+        return getattr(obj, "sniffed_by_me", None)
+
+    @staticmethod
+    @requires("sniff_count")
+    def resolve_sniff_count(obj):
+        """Resolve the sniff count including increments not yet flushed"""
+        return obj.sniff_count + sniff_count_buffer.pending(obj.id)
+
+    @staticmethod
+    @requires("created_at")
     def resolve_created_time(obj):
         """Resolve created time in format 06:12pm from created_at field"""
         return obj.created_at.strftime("%I:%M %p")
     
     @staticmethod
+    @requires("created_at")
     def resolve_created_date(obj):
         """Resolve the created date in format 15Jan25 from the created_at field"""
         return obj.created_at.strftime("%d%b%y")
     
     @staticmethod
+    @requires("updated_at")
     def resolve_updated_date(obj):
         """Resolve the updated date in format 15Jan25 from the updated_at field"""
         return obj.updated_at.strftime("%d%b%y")
     
     @staticmethod
+    @requires("updated_at")
     def resolve_updated_time(obj):
         """Resolve updated time in format 06:12pm from updated_at field"""
         return obj.updated_at.strftime("%I:%M %p")
 
 
+class BarkColumnarSerializer(ColumnarSerializer):
+    """Columnar fast path producing BarkSchemaOut items"""
+
+    columns = (
+        "id",
+        "message",
+        "sniff_count",
+        "created_at",
+        "updated_at",
+        "user__id",
+        "user__username",
+        "user__favorite_toy",
+        "user__profile_image",
+    )
+
+    @classmethod
+    def serialize(cls, rows, request):
+        ids = [row["id"] for row in rows]
+        pending = sniff_count_buffer.pending_many(ids)
+
+        # Same formats as the BarkSchemaOut resolvers
+        formatter = DateTimeFormatter(date_format="%d%b%y", time_format="%I:%M %p")
+        return [
+            {
+                "user": DogUserColumnarSerializer.item(
+                    row["user__id"], row["user__username"], row["user__favorite_toy"], row["user__profile_image"]
+                ),
+                "created_time": formatter.time(row["created_at"]),
+                "created_date": formatter.date(row["created_at"]),
+                "updated_date": formatter.date(row["updated_at"]),
+                "updated_time": formatter.time(row["updated_at"]),
+                "sniff_count": row["sniff_count"] + pending[row["id"]],
+                # Annotated by handle_barks_list for authenticated viewers
+                "sniffed_by_me": row.get("sniffed_by_me"),
+                "id": row["id"],
+                "message": row["message"],
+            }
+            for row in rows
+        ]
+
+
 class BarkCreateUpdateSchemaIn(ModelSchema):
     """Schema for bark creation requests"""
 
@@ -62,4 +124,11 @@ class BarkCsvExportSchema(Schema):
     message: str
     sniff_count: int
     created_at: str
-    username: str
\ No newline at end of file
+    username: str
+
+
+class BarkExportSchemaIn(Schema):
+    """Query parameters for the full bark history export"""
+
+    format: Literal["csv", "ndjson"] = "csv"
+    gzip: bool = False
@@ -1,7 +1,12 @@
-from ninja import Schema
+from ninja import Schema, Field
 from api.schemas.bark_schemas import BarkSchemaOut
+from common.projection import requires
+from typing import Literal
 from uuid import UUID
 
+# Upper bound on bark_ids accepted by a single bulk sniff request
+MAX_BULK_SNIFFS = 100
+
 
 class SniffCreateSchemaIn(Schema):
     """Schema for creating a sniff"""
@@ -12,4 +17,29 @@ class SniffCreateSchemaIn(Schema):
 class SniffSchemaOut(BarkSchemaOut):
     """Schema for sniff responses"""
 
-    pass
+    sniffed_by_me: bool
+
+    @staticmethod
+    @requires()
+    def resolve_sniffed_by_me(obj):
+        """The caller has just sniffed this bark"""
+        return True
+
+
+class SniffBulkCreateSchemaIn(Schema):
+    """Schema for sniffing several barks at once"""
+
+    bark_ids: list[UUID] = Field(..., min_length=1, max_length=MAX_BULK_SNIFFS)
+
+
+class SniffBulkResultSchemaOut(Schema):
+    """Outcome of one bark in a bulk sniff request"""
+
+    bark_id: UUID
+    status: Literal["sniffed", "already_sniffed", "not_found"]
+
+
+class SniffBulkSchemaOut(Schema):
+    """Schema for bulk sniff responses"""
+
+    results: list[SniffBulkResultSchemaOut]
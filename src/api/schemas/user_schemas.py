@@ -1,8 +1,11 @@
-from ninja import ModelSchema, Schema, File
+from uuid import UUID
+from ninja import Field, ModelSchema, Schema, File
 from core.models import DogUserModel
 from pydantic import field_validator
 from ninja.files import UploadedFile
 from typing import Optional
+from common.columnar import ColumnarSerializer
+from common.projection import requires
 
 
 class DogUserSchemaOut(ModelSchema):
@@ -14,6 +17,7 @@ class DogUserSchemaOut(ModelSchema):
         fields = ["id", "username", "favorite_toy"]
 
     @staticmethod
+    @requires("profile_image")
     def resolve_profile_image_url(obj):
         """Resolve the profile image URL"""
         if obj.profile_image and hasattr(obj.profile_image, 'url'):
@@ -21,6 +25,31 @@ class DogUserSchemaOut(ModelSchema):
         return None
 
 
+class DogUserColumnarSerializer(ColumnarSerializer):
+    """Columnar fast path producing DogUserSchemaOut items"""
+
+    # created_at is not rendered but keyset cursors on the list are built from it
+    columns = ("id", "username", "favorite_toy", "profile_image", "created_at")
+    profile_image_storage = DogUserModel._meta.get_field("profile_image").storage
+
+    @classmethod
+    def item(cls, user_id, username, favorite_toy, profile_image) -> dict:
+        """Build one DogUserSchemaOut dict, in schema field order"""
+        return {
+            "profile_image_url": cls.profile_image_storage.url(profile_image) if profile_image else None,
+            "id": user_id,
+            "username": username,
+            "favorite_toy": favorite_toy,
+        }
+
+    @classmethod
+    def serialize(cls, rows, request):
+        return [
+            cls.item(row["id"], row["username"], row["favorite_toy"], row["profile_image"])
+            for row in rows
+        ]
+
+
 class DogUserCreateSchemaIn(ModelSchema):
     """Schema for dog user creation requests"""
 
@@ -58,3 +87,15 @@ class DogUserWithTokenSchemaOut(Schema):
 class ProfileImageUploadSchemaIn(Schema):
     """Schema for profile image upload"""
     image: UploadedFile = File(...)
+
+
+class DogUserTypeaheadSchemaIn(Schema):
+    """Query parameters for username autocomplete"""
+    q: str = Field(..., min_length=1, max_length=150)
+    limit: int = Field(10, ge=1, le=20)
+
+
+class DogUserTypeaheadSchemaOut(Schema):
+    """Schema for username autocomplete results"""
+    id: UUID
+    username: str
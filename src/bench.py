@@ -0,0 +1,536 @@
+"""
+Benchmarks for the API hot paths.
+
+Each benchmark runs against a throwaway test database, so it is safe to run
+next to a development database.
+
+Usage (from the src directory):
+    python bench.py                 # run every benchmark
+    python bench.py token_auth      # run a single benchmark by name
+"""
+
+import os
+import sys
+import time
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django
+
+django.setup()
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    """Register a benchmark under its name without the bench_ prefix"""
+    BENCHMARKS[func.__name__.removeprefix("bench_")] = func
+    return func
+
+
+def timed(func, iterations: int) -> float:
+    """Run func iterations times and return the calls per second"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return iterations / (time.perf_counter() - start)
+
+
+def report(label: str, value: float, unit: str = "req/s") -> None:
+    print(f"  {label:<40} {value:>12,.1f} {unit}")
+
+
+@benchmark
+def bench_token_auth(iterations: int = 2000):
+    """Authenticated GET /users/me/ throughput with and without the token cache"""
+    from common.auth.token import token_cache
+    from core.models import AuthTokenModel, DogUserModel
+
+    user = DogUserModel.objects.create_user(username="bench_token", password="pw")
+    token = AuthTokenModel.objects.create(user=user)
+    client = Client(headers={"Authorization": f"Bearer {token.key}"})
+
+    def request():
+        assert client.get("/api/users/me/").status_code == 200
+
+    default_ttl = token_cache.ttl
+    token_cache.clear()
+    token_cache.ttl = 0
+    report("without cache", timed(request, iterations))
+
+    token_cache.ttl = default_ttl
+    report("with cache", timed(request, iterations))
+    stats = token_cache.stats()
+    print(f"  cache hits={stats['hits']} misses={stats['misses']}")
+
+
+@benchmark
+def bench_auth_dispatch(iterations: int = 2000):
+    """Per-scheme auth latency: chained [TokenAuth, JWTAuth] vs shape dispatch"""
+    from django.test import RequestFactory
+    from common.auth.dispatch import BearerAuth
+    from common.auth.jwt_auth import JWTAuth, create_jwt
+    from common.auth.token import TokenAuth, token_cache
+    from core.models import AuthTokenModel, DogUserModel
+
+    user = DogUserModel.objects.create_user(username="bench_dispatch", password="pw")
+    tokens = {
+        "opaque": AuthTokenModel.objects.create(user=user).key,
+        "jwt": create_jwt(user.id, "access"),
+    }
+    chained = [TokenAuth(), JWTAuth()]
+    dispatch = BearerAuth()
+    factory = RequestFactory()
+
+    def run_chained(request):
+        for auth in chained:
+            if auth(request):
+                return
+
+    # Measure the uncached path so the comparison is about routing alone
+    default_ttl = token_cache.ttl
+    token_cache.ttl = 0
+    try:
+        for scheme, token in tokens.items():
+            request = factory.get("/", headers={"Authorization": f"Bearer {token}"})
+            for label, func in (("chained", run_chained), ("dispatch", dispatch)):
+                rate = timed(lambda: func(request), iterations)
+                report(f"{scheme} {label}", 1_000_000 / rate, "us/auth")
+    finally:
+        token_cache.ttl = default_ttl
+
+
+@benchmark
+def bench_jwt_cache(iterations: int = 20000):
+    """JWT signature verification vs cached payload lookup under concurrency"""
+    from concurrent.futures import ThreadPoolExecutor
+    import jwt
+    from django.conf import settings
+    from common.auth.jwt_auth import create_jwt, decode_jwt, jwt_cache
+
+    # A pool of tokens, as if many clients were reusing their own access token
+    tokens = [create_jwt(f"user-{i}", "access") for i in range(100)]
+
+    def verify(i):
+        jwt.decode(tokens[i % len(tokens)], settings.JWT_SECRET, algorithms=["HS256"])
+
+    def lookup(i):
+        decode_jwt(tokens[i % len(tokens)])
+
+    jwt_cache.clear()
+    for token in tokens:
+        decode_jwt(token)
+
+    for threads in (1, 4, 8):
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for label, func in (("jwt.decode", verify), ("cache lookup", lookup)):
+                start = time.perf_counter()
+                list(pool.map(func, range(iterations), chunksize=iterations // threads))
+                rate = iterations / (time.perf_counter() - start)
+                report(f"{label} ({threads} threads)", rate, "ops/s")
+
+
+@benchmark
+def bench_login_mixed(duration: float = 3.0, login_threads: int = 4, read_threads: int = 4):
+    """Mixed login + read traffic with inline hashing vs the password pool"""
+    import threading
+    from unittest.mock import patch
+    from common.auth.passwords import password_pool
+    from core.models import BarkModel, DogUserModel
+
+    user = DogUserModel.objects.create_user(username="bench_login", password="woofwoof")
+    BarkModel.objects.bulk_create(BarkModel(user=user, message=f"bark {i}") for i in range(20))
+    credentials = {"username": "bench_login", "password": "woofwoof"}
+
+    def run(workers):
+        counts = {"login": 0, "busy": 0, "read": 0}
+        read_latencies = []
+        lock = threading.Lock()
+        stop = time.perf_counter() + duration
+
+        def login():
+            client = Client()
+            while time.perf_counter() < stop:
+                status = client.post("/api/auth/jwt-token/", credentials, content_type="application/json").status_code
+                with lock:
+                    counts["login" if status == 200 else "busy"] += 1
+
+        def read():
+            client = Client()
+            while time.perf_counter() < stop:
+                start = time.perf_counter()
+                client.get("/api/barks/")
+                with lock:
+                    counts["read"] += 1
+                    read_latencies.append(time.perf_counter() - start)
+
+        with patch.object(password_pool, "workers", workers):
+            threads = [threading.Thread(target=login) for _ in range(login_threads)]
+            threads += [threading.Thread(target=read) for _ in range(read_threads)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        label = f"{workers} workers" if workers else "inline"
+        read_latencies.sort()
+        report(f"{label}: logins", counts["login"] / duration)
+        report(f"{label}: 503 busy", counts["busy"] / duration)
+        report(f"{label}: reads", counts["read"] / duration)
+        report(f"{label}: read p95", read_latencies[int(len(read_latencies) * 0.95)] * 1000, "ms")
+
+    run(0)
+    run(password_pool.workers)
+    password_pool.shutdown()
+
+
+@benchmark
+def bench_revocation_bloom(probes: int = 100_000):
+    """Bloom filter sizing: memory, build time, lookup cost and false positive rate"""
+    from uuid import uuid4
+    from common.auth.revocation import BloomFilter
+
+    for capacity in (10_000, 100_000, 500_000):
+        for error_rate in (0.01, 0.001):
+            bloom = BloomFilter(capacity, error_rate)
+            revoked = [uuid4().hex for _ in range(capacity)]
+            start = time.perf_counter()
+            for jti in revoked:
+                bloom.add(jti)
+            build = time.perf_counter() - start
+
+            candidates = [uuid4().hex for _ in range(probes)]
+            start = time.perf_counter()
+            false_positives = sum(jti in bloom for jti in candidates)
+            lookup = (time.perf_counter() - start) / probes
+
+            print(
+                f"  capacity={capacity:>7,} p={error_rate:<6} k={bloom.hash_count:<2} "
+                f"{bloom.nbytes / 1024:>8,.0f} KiB  build {build:5.2f}s  "
+                f"lookup {lookup * 1_000_000:5.2f} us  "
+                f"fp observed {false_positives / probes:.4f} "
+                f"estimated {bloom.estimated_false_positive_rate():.4f}"
+            )
+
+
+@benchmark
+def bench_sniff_write_behind(sniffs: int = 2000):
+    """Sniff throughput on one hot bark: direct UPDATE vs write-behind buffer"""
+    from django.test import override_settings
+    from api.logic.sniff_logic import handle_create_sniff
+    from common.counters import sniff_count_buffer
+    from core.models import BarkModel, DogUserModel
+
+    users = DogUserModel.objects.bulk_create(
+        DogUserModel(username=f"bench_sniffer_{i}") for i in range(sniffs)
+    )
+
+    for write_behind in (False, True):
+        bark = BarkModel.objects.create(user=users[0], message="viral bark")
+        remaining = iter(users)
+
+        def sniff():
+            handle_create_sniff(bark_id=bark.id, user=next(remaining))
+
+        with override_settings(SNIFF_COUNT_WRITE_BEHIND=write_behind):
+            rate = timed(sniff, sniffs)
+        start = time.perf_counter()
+        sniff_count_buffer.flush()
+        flush = time.perf_counter() - start
+
+        bark.refresh_from_db()
+        label = "write-behind" if write_behind else "direct"
+        report(f"{label}: sniffs", rate, "sniffs/s")
+        print(f"  {label}: final flush {flush * 1000:.1f} ms, sniff_count={bark.sniff_count}")
+
+
+@benchmark
+def bench_deep_pages(rows: int = 20000, per_page: int = 20, iterations: int = 50):
+    """Bark list page latency by depth: SkipPagination offsets vs keyset cursors"""
+    from django.test import RequestFactory
+    from common.filters import BARK_ORDERINGS
+    from common.pagination import KeysetPagination, SkipPagination
+    from core.models import BarkModel, DogUserModel
+
+    user = DogUserModel.objects.create_user(username="bench_pages", password="pw")
+    BarkModel.objects.bulk_create(
+        (BarkModel(user=user, message=f"bark {i}", sniff_count=i % 50) for i in range(rows)),
+        batch_size=1000,
+    )
+    request = RequestFactory().get("/api/barks/")
+    skip_paginator = SkipPagination(count_mode="none")
+    keyset_paginator = KeysetPagination(orderings=BARK_ORDERINGS, default="-created_at")
+
+    for ordering in ("-created_at", "-sniff_count"):
+        queryset = BarkModel.objects.select_related("user").order_by(ordering)
+        keys = BARK_ORDERINGS[ordering]
+        fields = [(term.lstrip("-"), term.startswith("-")) for term in keys]
+        ordered = BarkModel.objects.order_by(*keys)
+        for depth in (0, rows // 10, rows // 2, rows - per_page - 1):
+            skip_input = SkipPagination.Input(skip=depth, per_page=per_page)
+            cursor = None
+            if depth:
+                # The cursor a client would hold after reading depth rows
+                row = ordered[depth - 1]
+                cursor = keyset_paginator.encode_cursor(row, fields, ordering, "next")
+            keyset_input = KeysetPagination.Input(cursor=cursor, limit=per_page)
+
+            offset_rate = timed(lambda: skip_paginator.paginate_queryset(queryset, skip_input, request=request), iterations)
+            keyset_rate = timed(lambda: keyset_paginator.paginate_queryset(queryset, keyset_input, request=request), iterations)
+            report(f"{ordering} row {depth:>6,}: offset", 1000 / offset_rate, "ms/page")
+            report(f"{ordering} row {depth:>6,}: keyset", 1000 / keyset_rate, "ms/page")
+
+
+@benchmark
+def bench_trending(history: int = 50000, recent: int = 2000, iterations: int = 200):
+    """GET /barks/?trending=true: live query vs the in-memory trending index"""
+    from django.test import override_settings
+    from django.utils import timezone
+    from common.trending import trending_index
+    from core.models import BarkModel, DogUserModel
+
+    user = DogUserModel.objects.create_user(username="bench_trending", password="pw")
+    # Older barks have sniffs too, so the live query has to skip past them
+    BarkModel.objects.bulk_create(
+        (BarkModel(user=user, message=f"old {i}", sniff_count=1 + i % 100) for i in range(history)),
+        batch_size=1000,
+    )
+    BarkModel.objects.update(created_at=timezone.now() - timezone.timedelta(days=3))
+    BarkModel.objects.bulk_create(
+        (BarkModel(user=user, message=f"new {i}", sniff_count=i % 20) for i in range(recent)),
+        batch_size=1000,
+    )
+    client = Client()
+
+    def request():
+        assert client.get("/api/barks/?trending=true&limit=20").status_code == 200
+
+    for materialized in (False, True):
+        trending_index.reset()
+        with override_settings(TRENDING_MATERIALIZED=materialized):
+            request()
+            report("materialized" if materialized else "live query", timed(request, iterations))
+
+    start = time.perf_counter()
+    trending_index.refresh()
+    report("full refresh", (time.perf_counter() - start) * 1000, "ms")
+    barks = {bark_id: timezone.now() for bark_id in trending_index.ranked_ids()[:100]}
+    rate = timed(lambda: trending_index.record_sniffs(barks), iterations)
+    report("incremental update (100 barks)", 1_000_000 / rate, "us")
+    print(f"  {trending_index.stats()}")
+
+
+@benchmark
+def bench_search(rows: int = 1_000_000, iterations: int = 20):
+    """Bark message search latency: icontains scan vs the FTS5 index"""
+    import random
+    from django.test import override_settings
+    from core.models import BarkModel, DogUserModel
+
+    rng = random.Random(0)
+    common = ["woof", "ball", "walk", "treat", "park", "nap", "bone", "stick", "good", "dog"]
+    rare = [f"word{i}" for i in range(5000)]
+    user = DogUserModel.objects.create_user(username="bench_search", password="pw")
+    start = time.perf_counter()
+    for offset in range(0, rows, 10000):
+        BarkModel.objects.bulk_create(
+            BarkModel(user=user, message=" ".join(rng.choices(common, k=4) + rng.choices(rare, k=2)))
+            for _ in range(min(10000, rows - offset))
+        )
+    print(f"  inserted {rows:,} barks (with index triggers) in {time.perf_counter() - start:.1f}s")
+    client = Client()
+
+    for label, query in (("rare term", "word4217"), ("common term", "woof"), ("two terms", "woof word4217")):
+        for backend in ("contains", "fts"):
+            with override_settings(SEARCH_BACKEND=backend):
+                def request():
+                    assert client.get("/api/barks/", {"message": query, "limit": 20}).status_code == 200
+
+                rate = timed(request, iterations)
+            report(f"{label} ({backend})", 1000 / rate, "ms")
+
+
+@benchmark
+def bench_typeahead(users: int = 100_000, iterations: int = 2000):
+    """Username autocomplete: icontains query vs the sorted prefix index"""
+    import itertools
+    import random
+    from common.typeahead import typeahead_index
+    from core.models import DogUserModel
+
+    rng = random.Random(0)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    DogUserModel.objects.bulk_create(
+        (DogUserModel(username="".join(rng.choices(letters, k=8)) + str(i)) for i in range(users)),
+        batch_size=5000,
+    )
+    prefixes = ["".join(rng.choices(letters, k=k)) for k in (1, 2, 3) for _ in range(20)]
+
+    start = time.perf_counter()
+    typeahead_index.reload()
+    report(f"index load ({users:,} users)", (time.perf_counter() - start) * 1000, "ms")
+
+    queries = itertools.cycle(prefixes)
+    users_qs = DogUserModel.objects.values_list("id", "username")
+
+    def istartswith():
+        list(users_qs.filter(username__istartswith=next(queries)).order_by("username")[:10])
+
+    def icontains():
+        list(users_qs.filter(username__icontains=next(queries))[:10])
+
+    report("istartswith query", 1_000_000 / timed(istartswith, iterations // 20), "us/lookup")
+    report("icontains query", 1_000_000 / timed(icontains, iterations // 20), "us/lookup")
+    rate = timed(lambda: typeahead_index.search(next(queries), 10), iterations)
+    report("prefix index", 1_000_000 / rate, "us/lookup")
+
+
+@benchmark
+def bench_page_cache(iterations: int = 2000, sniff_every: int = 50):
+    """Anonymous GET /barks/ with and without the page cache, with sniffs mixed in"""
+    from django.test import override_settings
+    from api.logic.sniff_logic import handle_create_sniff
+    from common.page_cache import page_cache
+    from core.models import BarkModel, DogUserModel
+
+    user = DogUserModel.objects.create_user(username="bench_page_cache", password="pw")
+    barks = BarkModel.objects.bulk_create(BarkModel(user=user, message=f"bark {i}") for i in range(200))
+    sniffers = iter(DogUserModel.objects.bulk_create(
+        DogUserModel(username=f"bench_page_sniffer_{i}") for i in range(2 * iterations // sniff_every + 2)
+    ))
+    client = Client()
+    urls = ["/api/barks/", "/api/barks/?limit=20", "/api/barks/?trending=true"]
+
+    for enabled in (False, True):
+        page_cache.reset()
+        count = iter(range(iterations))
+
+        def request():
+            i = next(count)
+            if i % sniff_every == 0:
+                handle_create_sniff(bark_id=barks[i % len(barks)].id, user=next(sniffers))
+            assert client.get(urls[i % len(urls)]).status_code == 200
+
+        with override_settings(PAGE_CACHE_ENABLED=enabled):
+            rate = timed(request, iterations)
+        report("page cache" if enabled else "no cache", rate)
+        if enabled:
+            print(f"  {page_cache.stats()}")
+
+
+@benchmark
+def bench_columnar(rows: int = 2000, iterations: int = 20):
+    """GET /barks/ serialization: per-row schema validation vs the columnar fast path"""
+    from unittest import mock
+    from django.test import override_settings
+    from common.pagination import KeysetPagination
+    from core.models import AuthTokenModel, BarkModel, DogUserModel
+
+    users = DogUserModel.objects.bulk_create(DogUserModel(username=f"bench_columnar_{i}") for i in range(50))
+    BarkModel.objects.bulk_create(
+        BarkModel(user=users[i % len(users)], message=f"bark {i}", sniff_count=i % 7) for i in range(rows)
+    )
+    token = AuthTokenModel.objects.create(user=users[0])
+    clients = {
+        "anonymous": Client(),
+        "authenticated": Client(headers={"Authorization": f"Bearer {token.key}"}),
+    }
+
+    # Pages above the API's limit cap are only reachable here
+    with override_settings(PAGE_CACHE_ENABLED=False), mock.patch.object(KeysetPagination, "MAX_LIMIT", 1000):
+        for per_page in (10, 100, 1000):
+            for viewer, client in clients.items():
+                for columnar in (False, True):
+                    with override_settings(COLUMNAR_RESPONSES=columnar):
+                        rate = timed(lambda: client.get(f"/api/barks/?limit={per_page}"), iterations)
+                    label = f"{per_page} rows, {viewer}, {'columnar' if columnar else 'schema'}"
+                    report(label, rate * per_page, "rows/s")
+
+
+@benchmark
+def bench_bark_detail(iterations: int = 2000, threads: int = 16):
+    """GET /barks/{id}/ on one hot bark with and without the object cache, and a cold stampede"""
+    import threading
+    from django.db import connections
+    from django.test import override_settings
+    from api.logic.bark_logic import handle_get_bark
+    from common.object_cache import bark_cache
+    from core.models import BarkModel, DogUserModel
+
+    user = DogUserModel.objects.create_user(username="bench_bark_detail", password="pw")
+    bark = BarkModel.objects.create(user=user, message="gone viral")
+    client = Client()
+    url = f"/api/barks/{bark.id}/"
+
+    for enabled in (False, True):
+        with override_settings(OBJECT_CACHE_ENABLED=enabled):
+            rate = timed(lambda: client.get(url), iterations)
+        report("object cache" if enabled else "no cache", rate)
+
+    # Every thread misses at once; count how many reach the database
+    bark_cache.delete(bark.id)
+    bark_cache.reset_stats()
+    barrier = threading.Barrier(threads)
+
+    def fetch():
+        barrier.wait()
+        try:
+            handle_get_bark(bark.id)
+        finally:
+            connections.close_all()
+
+    workers = [threading.Thread(target=fetch) for _ in range(threads)]
+    with override_settings(OBJECT_CACHE_ENABLED=True):
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    report(f"loads for {threads} concurrent misses", bark_cache.stats()["loads"], "loads")
+
+
+@benchmark
+def bench_export(sizes: tuple = (10_000, 100_000)):
+    """Streaming bark history export: throughput and peak Python memory by history size"""
+    import tracemalloc
+    from core.models import AuthTokenModel, BarkModel, DogUserModel
+
+    for rows in sizes:
+        user = DogUserModel.objects.create_user(username=f"bench_export_{rows}", password="pw")
+        BarkModel.objects.bulk_create(
+            (BarkModel(user=user, message=f"bark number {i}", sniff_count=i % 50) for i in range(rows)),
+            batch_size=5000,
+        )
+        client = Client(headers={"Authorization": f"Bearer {AuthTokenModel.objects.create(user=user).key}"})
+
+        for params in ("format=csv", "format=ndjson", "format=csv&gzip=true"):
+            tracemalloc.start()
+            start = time.perf_counter()
+            size = sum(len(chunk) for chunk in client.get(f"/api/barks/export/?{params}").streaming_content)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            report(f"{rows:,} rows, {params}", rows / elapsed, "rows/s")
+            report(f"{rows:,} rows, {params} peak memory", peak / 2**20, f"MiB ({size / 2**20:.1f} MiB sent)")
+
+
+def main(names: list[str]) -> None:
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        sys.exit(f"Unknown benchmark(s): {', '.join(unknown)}. Available: {', '.join(BENCHMARKS)}")
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        for name in names or BENCHMARKS:
+            print(f"{name}: {BENCHMARKS[name].__doc__}")
+            BENCHMARKS[name]()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
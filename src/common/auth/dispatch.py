@@ -0,0 +1,54 @@
+import re
+from django.contrib.auth.models import AnonymousUser
+from ninja.security import HttpBearer
+from common.auth.token import TokenAuth
+from common.auth.jwt_auth import JWTAuth
+
+# Opaque keys are 20 random bytes hex-encoded (see AuthTokenModel.generate_key)
+OPAQUE_TOKEN_RE = re.compile(r"[0-9a-f]{40}")
+# A compact JWS is three non-empty base64url segments separated by dots
+JWT_RE = re.compile(r"[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+")
+
+
+class BearerAuth(HttpBearer):
+    """Route a bearer token to TokenAuth or JWTAuth based on its shape.
+
+    Registering both backends in a list makes every JWT request pay for a
+    failing AuthTokenModel lookup first; looking at the token string lets us
+    call the one backend that can possibly accept it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.token_auth = TokenAuth()
+        self.jwt_auth = JWTAuth()
+
+    def authenticate(self, request, token):
+        """Authenticate a request using whichever backend matches the token.
+
+        Args:
+            request: The HTTP request
+            token: The token string from the Authorization header
+
+        Returns:
+            The user if authentication is successful, None otherwise
+        """
+        if OPAQUE_TOKEN_RE.fullmatch(token):
+            return self.token_auth.authenticate(request, token)
+        if JWT_RE.fullmatch(token):
+            return self.jwt_auth.authenticate(request, token)
+        return None
+
+
+class OptionalBearerAuth(BearerAuth):
+    """BearerAuth for public endpoints that personalise their response.
+
+    Requests without an Authorization header get an AnonymousUser as
+    request.auth instead of a 401; a token that is present but invalid is
+    still rejected.
+    """
+
+    def __call__(self, request):
+        if not request.headers.get(self.header):
+            return AnonymousUser()
+        return super().__call__(request)
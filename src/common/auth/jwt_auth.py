@@ -1,23 +1,110 @@
+import hashlib
 import jwt
 from django.conf import settings
+from django.db import router
 import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from uuid import UUID, uuid4
 from ninja.security import HttpBearer
-from core.models import DogUserModel
+from common.auth.revocation import revocation_store
+from common.cache import TTLCache
+from core.models import DogUserModel, LazyDogUserModel
 
-def create_jwt(user_id, token_type):
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Claims copied into access tokens so JWTAuth can build the user without a query
+PRINCIPAL_CLAIMS = ("username", "favorite_toy", "profile_image")
+
+# Cached version of users that are deleted or deactivated
+INACTIVE = -1
+
+# sha256(token) -> verified payload, kept until the token's exp at the latest
+jwt_cache = TTLCache(
+    maxsize=getattr(settings, "JWT_CACHE_SIZE", 10000),
+    ttl=getattr(settings, "JWT_CACHE_TTL", 4 * 60 * 60),
+)
+
+# user_id -> current token version (or INACTIVE), checked against the ver claim
+user_versions = TTLCache(
+    maxsize=getattr(settings, "JWT_USER_VERSION_CACHE_SIZE", 10000),
+    ttl=getattr(settings, "JWT_USER_VERSION_TTL", 30),
+)
+
+
+def token_version(updated_at):
+    """The version of a user's profile: its updated_at in microseconds since the epoch"""
+    return (updated_at - EPOCH) // timedelta(microseconds=1)
+
+
+def user_claims(user):
+    """Build the principal claims for a user's access token.
+
+    The token's version is recorded as the user's current one, so the first
+    request made with the token needs no query to check it.
+
+    Args:
+        user (DogUserModel): The user the token is issued to.
+
+    Returns:
+        dict: The claims, including a version taken from the user's updated_at.
+    """
+    version = token_version(user.updated_at)
+    user_versions.set(user.id, version if user.is_active else INACTIVE)
+    return {
+        "username": user.username,
+        "favorite_toy": user.favorite_toy,
+        "profile_image": user.profile_image.name or "",
+        "ver": version,
+    }
+
+
+def current_token_version(user_id):
+    """Return the token version of an active user, or None if the user is deleted or inactive.
+
+    Versions are cached for JWT_USER_VERSION_TTL seconds; this process drops
+    a user's entry when it changes their profile (invalidate_user_version()),
+    changes made by other processes are picked up when the entry expires.
+
+    Args:
+        user_id (UUID): The ID of the user.
+
+    Returns:
+        int | None: The version, comparable to the ver claim.
+    """
+    version = user_versions.get(user_id)
+    if version is None:
+        updated_at = (
+            DogUserModel.objects.filter(id=user_id, is_active=True)
+            .values_list("updated_at", flat=True)
+            .first()
+        )
+        version = token_version(updated_at) if updated_at else INACTIVE
+        user_versions.set(user_id, version)
+    return None if version == INACTIVE else version
+
+
+def invalidate_user_version(user_id) -> None:
+    """Forget a user's cached token version after their profile or status changed"""
+    user_versions.delete(user_id)
+
+
+def create_jwt(user_id, token_type, claims=None):
     """Create a JWT token for the user.
 
     Args:
         user_id (str): The ID of the user.
         token_type (str): The type of token (e.g., 'access', 'refresh').
+        claims (dict, optional): Extra claims to embed, see user_claims().
 
     Returns:
         str: The encoded JWT token.
     """
     exp_seconds = 4 * 60 * 60 if token_type == 'access' else 7 * 24 * 60 * 60
     payload = {
+        **(claims or {}),
         "user_id": str(user_id),
         "token_type": token_type,
+        "jti": uuid4().hex,
         "iat": int(time.time()),
         "exp": int(time.time()) + exp_seconds,
       }
@@ -25,29 +112,99 @@ def create_jwt(user_id, token_type):
     return jwt.encode(payload, settings.JWT_SECRET, algorithm='HS256')
 
 
+def decode_jwt(token):
+    """Verify and decode a JWT, reusing the result for repeat tokens.
+
+    The cached payload is treated as read-only and its exp is re-checked on
+    every hit, so an expired token is rejected even before it is evicted.
+    Only the signature check is skipped: callers still validate the claims
+    (token type, user) of every payload they get back.
+
+    Args:
+        token (str): The encoded JWT token.
+
+    Returns:
+        dict: The decoded payload.
+
+    Raises:
+        jwt.InvalidTokenError: If the token is invalid or has expired.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    payload = jwt_cache.get(key)
+    if payload is not None:
+        if payload["exp"] > time.time():
+            return payload
+        jwt_cache.delete(key)
+        raise jwt.ExpiredSignatureError("Signature has expired")
+
+    payload = jwt.decode(token, settings.JWT_SECRET, algorithms=['HS256'])
+    if isinstance(payload.get("exp"), (int, float)):
+        jwt_cache.set(key, payload, ttl=payload["exp"] - time.time())
+    return payload
+
+
+def principal_from_claims(payload):
+    """Build a lazily loaded user from the claims of an access token.
+
+    Args:
+        payload (dict): The decoded JWT payload.
+
+    Returns:
+        LazyDogUserModel: A user whose other fields are loaded on first access.
+    """
+    claimed = {claim: payload[claim] for claim in PRINCIPAL_CLAIMS}
+    claimed["id"] = UUID(payload["user_id"])
+    claimed["updated_at"] = EPOCH + timedelta(microseconds=payload["ver"])
+
+    # from_db expects values in concrete field order and defers the rest
+    field_names = [
+        field.attname
+        for field in LazyDogUserModel._meta.concrete_fields
+        if field.attname in claimed
+    ]
+    return LazyDogUserModel.from_db(
+        router.db_for_read(LazyDogUserModel),
+        field_names,
+        [claimed[name] for name in field_names],
+    )
+
 
 class JWTAuth(HttpBearer):
     def authenticate(self, request, token):
         """Authenticate a request using a JWT token.
 
+        Revoked tokens and inactive or deleted users are rejected. When
+        JWT_STATELESS_PRINCIPAL is enabled and the token carries the principal
+        claims, the user is built from the claims without a query, provided
+        their ver still matches the user's current token version; stale
+        claims fall back to loading the user.
+
         Args:
             request: The HTTP request
             token: The JWT token string from the Authorization header
 
         Returns:
-            The user ID if authentication is successful, None otherwise
+            The user if authentication is successful, None otherwise
         """
         try:
-            payload = jwt.decode(token, settings.JWT_SECRET, algorithms=['HS256'])
+            payload = decode_jwt(token)
         except jwt.ExpiredSignatureError:
             return None
         except jwt.InvalidTokenError:
             return None
-        
+
         try:
             assert payload['token_type'] == 'access'
-            user = DogUserModel.objects.get(id=payload['user_id'])
+            if "jti" in payload and revocation_store.is_revoked(payload["jti"]):
+                return None
+            if settings.JWT_STATELESS_PRINCIPAL and "ver" in payload:
+                version = current_token_version(UUID(payload["user_id"]))
+                if version is None:
+                    return None
+                if version == payload["ver"]:
+                    return principal_from_claims(payload)
+            user = DogUserModel.objects.get(id=payload['user_id'], is_active=True)
             return user
-        except (DogUserModel.DoesNotExist, AssertionError, KeyError):
+        except (DogUserModel.DoesNotExist, AssertionError, KeyError, TypeError, ValueError):
             return None
-            
+
@@ -0,0 +1,120 @@
+import asyncio
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PasswordPoolBusyError(Exception):
+    """Raised when the password hashing pool has no free slot"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Too many concurrent logins, please retry shortly")
+        self.retry_after = retry_after
+
+
+def _init_worker():
+    """Configure Django in a freshly spawned worker process"""
+    import django
+
+    django.setup()
+
+
+def _check_password(password: str, encoded: str) -> bool:
+    return hashers.check_password(password, encoded)
+
+
+def _make_password(password: str) -> str:
+    return hashers.make_password(password)
+
+
+class PasswordHasherPool:
+    """
+    Runs password hashing and verification in a bounded process pool.
+
+    PBKDF2 is deliberately slow, and running it on the request thread lets a
+    burst of logins stall every other endpoint on that worker. At most
+    workers + max_pending jobs are accepted at a time; beyond that callers get
+    a PasswordPoolBusyError straight away instead of queueing.
+
+    With workers set to 0 everything runs inline, which is what tests use.
+    """
+
+    def __init__(self, workers: int, max_pending: int, retry_after: int = 1):
+        self.workers = workers
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(max(workers + max_pending, 1))
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: request threads may hold locks or DB connections
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+    def _submit(self, func, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            raise PasswordPoolBusyError(self.retry_after)
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def check_password(self, password: str, encoded: str) -> bool:
+        """Return True if password matches the encoded hash"""
+        if not self.workers:
+            return _check_password(password, encoded)
+        return self._submit(_check_password, password, encoded).result()
+
+    def make_password(self, password: str) -> str:
+        """Hash password with the preferred hasher"""
+        if not self.workers:
+            return _make_password(password)
+        return self._submit(_make_password, password).result()
+
+    async def acheck_password(self, password: str, encoded: str) -> bool:
+        """Async version of check_password that doesn't block the event loop"""
+        if not self.workers:
+            return await asyncio.to_thread(_check_password, password, encoded)
+        return await asyncio.wrap_future(self._submit(_check_password, password, encoded))
+
+    async def amake_password(self, password: str) -> str:
+        """Async version of make_password that doesn't block the event loop"""
+        if not self.workers:
+            return await asyncio.to_thread(_make_password, password)
+        return await asyncio.wrap_future(self._submit(_make_password, password))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+
+password_pool = PasswordHasherPool(
+    workers=getattr(settings, "PASSWORD_HASHING_WORKERS", 2),
+    max_pending=getattr(settings, "PASSWORD_HASHING_MAX_PENDING", 16),
+    retry_after=getattr(settings, "PASSWORD_HASHING_RETRY_AFTER", 1),
+)
+atexit.register(password_pool.shutdown)
+
+
+def password_needs_rehash(encoded: str) -> bool:
+    """Return True if encoded was made with an outdated hasher or work factor"""
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+    preferred = hashers.get_hasher()
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
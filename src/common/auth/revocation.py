@@ -0,0 +1,247 @@
+import atexit
+import hashlib
+import logging
+import math
+import threading
+from datetime import datetime
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+from core.models import RevokedTokenModel
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    Sized from the expected number of items and the target false positive
+    rate; membership tests can return false positives but never false
+    negatives.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+    def estimated_false_positive_rate(self) -> float:
+        """Expected false positive rate at the current fill level"""
+        return (1 - math.exp(-self.hash_count * self.count / self.size)) ** self.hash_count
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+
+class RevocationStore:
+    """
+    JWT denylist backed by RevokedTokenModel with an in-memory Bloom filter.
+
+    A jti that misses the filter is definitely not revoked and costs no query;
+    only filter hits fall through to an exact lookup in the table. The filter
+    is built from the table on first use, and a background thread picks up
+    revocations made by other processes every sync_interval seconds with an
+    incremental read on created_at, so requests never wait on a sync. Set
+    sync_interval to 0 to disable the thread.
+    """
+
+    # Rows committed slightly out of created_at order are still picked up
+    SYNC_OVERLAP = timezone.timedelta(seconds=1)
+
+    def __init__(self, capacity: int, error_rate: float, sync_interval: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop the filter and counters; the next check rebuilds from the table"""
+        with self._lock:
+            self._bloom = None
+            self._watermark = None
+            self._recent = {}
+            # jtis revoked in this process while a rebuild runs
+            self._pending = None
+            self.checks = 0
+            self.bloom_hits = 0
+            self.false_positives = 0
+
+    def load(self) -> None:
+        """Build the filter from the table if it hasn't been built yet"""
+        if self._bloom is not None:
+            return
+        with self._sync_lock:
+            # Another caller may have built it while we waited
+            if self._bloom is None:
+                self._rebuild()
+        self._ensure_scheduler()
+
+    def _rebuild(self) -> None:
+        # Callers hold _sync_lock
+        started = timezone.now()
+        with self._lock:
+            self._pending = []
+        try:
+            rows = list(
+                RevokedTokenModel.objects.filter(expires_at__gt=started).values_list("jti", "created_at")
+            )
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+
+        bloom = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+        for jti, _ in rows:
+            bloom.add(jti)
+        # Seeded with the read time when the table is empty, so the next sync
+        # reads only newer rows instead of the whole table
+        watermark = max((created_at for _, created_at in rows), default=started)
+        recent = {
+            jti: created_at for jti, created_at in rows if created_at >= watermark - self.SYNC_OVERLAP
+        }
+        with self._lock:
+            pending, self._pending = self._pending, None
+            for jti, created_at in pending or ():
+                bloom.add(jti)
+                recent[jti] = created_at
+            self._bloom = bloom
+            self._watermark = watermark
+            self._recent = recent
+
+    def sync(self) -> None:
+        """Add revocations committed since the last sync to the filter"""
+        with self._sync_lock:
+            if self._bloom is None:
+                self._rebuild()
+                return
+
+            rows = list(
+                RevokedTokenModel.objects.filter(
+                    created_at__gte=self._watermark - self.SYNC_OVERLAP
+                ).values_list("jti", "created_at")
+            )
+            with self._lock:
+                for jti, created_at in rows:
+                    if jti not in self._recent:
+                        self._bloom.add(jti)
+                        self._recent[jti] = created_at
+                    self._watermark = max(self._watermark, created_at)
+
+                # Remember rows inside the overlap window so re-reads aren't counted twice
+                horizon = self._watermark - self.SYNC_OVERLAP
+                self._recent = {
+                    jti: created_at for jti, created_at in self._recent.items() if created_at >= horizon
+                }
+                overfull = self._bloom.count > self._bloom.capacity
+
+            # Past capacity the false positive rate climbs; resize and drop expired rows
+            if overfull:
+                self._rebuild()
+
+    def _ensure_scheduler(self) -> None:
+        if self._thread is not None or self.sync_interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="revocation-sync", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.sync_interval):
+            try:
+                self.sync()
+            except Exception:
+                logger.exception("Failed to sync the JWT revocation denylist")
+            finally:
+                connections.close_all()
+
+    def shutdown(self) -> None:
+        """Stop the sync thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def is_revoked(self, jti: str) -> bool:
+        """Return True if the token with this jti has been revoked"""
+        self.load()
+        self.checks += 1
+        if jti not in self._bloom:
+            return False
+
+        self.bloom_hits += 1
+        revoked = RevokedTokenModel.objects.filter(jti=jti).exists()
+        if not revoked:
+            self.false_positives += 1
+        return revoked
+
+    def revoke(self, jti: str, expires_at: datetime) -> bool:
+        """Revoke a token by jti.
+
+        Args:
+            jti: The jti claim of the token
+            expires_at: When the token expires; the row can be purged after that
+
+        Returns:
+            True if this call revoked the token, False if it was already revoked.
+        """
+        self.load()
+        try:
+            with transaction.atomic():
+                row = RevokedTokenModel.objects.create(jti=jti, expires_at=expires_at)
+        except IntegrityError:
+            return False
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((jti, row.created_at))
+            self._bloom.add(jti)
+            self._recent[jti] = row.created_at
+        return True
+
+    def stats(self) -> dict:
+        """Return lookup counters and Bloom filter sizing"""
+        bloom = self._bloom
+        return {
+            "checks": self.checks,
+            "bloom_hits": self.bloom_hits,
+            "false_positives": self.false_positives,
+            "observed_false_positive_rate": self.false_positives / self.checks if self.checks else 0.0,
+            "estimated_false_positive_rate": bloom.estimated_false_positive_rate() if bloom else 0.0,
+            "items": bloom.count if bloom else 0,
+            "capacity": bloom.capacity if bloom else self.capacity,
+            "bytes": bloom.nbytes if bloom else 0,
+        }
+
+
+revocation_store = RevocationStore(
+    capacity=getattr(settings, "JWT_REVOCATION_BLOOM_CAPACITY", 100_000),
+    error_rate=getattr(settings, "JWT_REVOCATION_BLOOM_ERROR_RATE", 0.01),
+    sync_interval=getattr(settings, "JWT_REVOCATION_SYNC_SECONDS", 5),
+)
+atexit.register(revocation_store.shutdown)
@@ -1,6 +1,68 @@
+import copy
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
 from ninja.security import HttpBearer
+from common.cache import TTLCache
 from core.models import AuthTokenModel
 
+# Validated access token key -> (token with its user, user's token version),
+# so repeat requests skip the token query
+token_cache = TTLCache(
+    maxsize=getattr(settings, "TOKEN_AUTH_CACHE_SIZE", 1024),
+    ttl=getattr(settings, "TOKEN_AUTH_CACHE_TTL", 60),
+)
+
+
+def _version_key(user_id) -> str:
+    return f"token-auth:version:{user_id}"
+
+
+def user_tokens_version(user_id) -> int:
+    """Current version of a user's tokens, shared by every worker.
+
+    Cached entries remember the version they were stored under, and a hit
+    with an older one is dropped, so invalidate_user_tokens() in any process
+    reaches every worker's cache.
+    """
+    cache = caches[settings.TOKEN_AUTH_VERSION_ALIAS]
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a version evicted from the cache never
+        # comes back with a number an old entry was stored under
+        cache.add(key, time.time_ns() // 1000, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_user_tokens(user_id) -> int:
+    """Drop every cached access token belonging to the given user, in every worker.
+
+    Args:
+        user_id: The ID of the user whose tokens were deleted or rotated
+
+    Returns:
+        The number of cache entries removed from this process
+    """
+    cache = caches[settings.TOKEN_AUTH_VERSION_ALIAS]
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns() // 1000, timeout=None)
+    return token_cache.delete_matching(lambda key, entry: entry[0].user_id == user_id)
+
+
+def invalidate_on_change(sender, instance, **kwargs) -> None:
+    """post_save/post_delete handler for users and tokens changed outside the API,
+    e.g. a deactivation in the admin or a token deleted from a shell"""
+    user_id = instance.user_id if isinstance(instance, AuthTokenModel) else instance.pk
+    transaction.on_commit(lambda: invalidate_user_tokens(user_id))
+
+
 class TokenAuth(HttpBearer):
     def authenticate(self, request, token):
         """Authenticate a request using a token.
@@ -12,10 +74,28 @@ class TokenAuth(HttpBearer):
         Returns:
             The user if authentication successful, None otherwise
         """
+        entry = token_cache.get(token)
+        if entry is not None:
+            auth_token, version = entry
+            if (
+                auth_token.is_valid()
+                and auth_token.user.is_active
+                and user_tokens_version(auth_token.user_id) == version
+            ):
+                # Hand out a copy so per-request mutations don't leak into the cache
+                return copy.copy(auth_token.user)
+            token_cache.delete(token)
+
         try:
             auth_token = AuthTokenModel.objects.select_related('user').get(key=token, token_type=AuthTokenModel.TOKEN_TYPE_ACCESS)
-            if auth_token.is_valid():
-                return auth_token.user
+            if auth_token.is_valid() and auth_token.user.is_active:
+                entry = (auth_token, user_tokens_version(auth_token.user_id))
+                if auth_token.expires is not None:
+                    ttl = (auth_token.expires - timezone.now()).total_seconds()
+                    token_cache.set(token, entry, ttl=ttl)
+                else:
+                    token_cache.set(token, entry)
+                return copy.copy(auth_token.user)
         except AuthTokenModel.DoesNotExist:
             return None
-        return None
\ No newline at end of file
+        return None
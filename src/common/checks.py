@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+# (enabled setting, alias setting) of caches whose invalidations must reach
+# every worker process
+SHARED_CACHES = [
+    ("PAGE_CACHE_ENABLED", "PAGE_CACHE_ALIAS"),
+    ("OBJECT_CACHE_ENABLED", "OBJECT_CACHE_ALIAS"),
+]
+
+
+def check_shared_caches(app_configs=None, **kwargs):
+    """Refuse to run caches that rely on shared invalidation on a per-process backend"""
+    errors = []
+    for enabled, alias in SHARED_CACHES:
+        if getattr(settings, enabled, False) and isinstance(caches[getattr(settings, alias)], LocMemCache):
+            errors.append(
+                checks.Error(
+                    f"{enabled} is on, but the {getattr(settings, alias)!r} cache is local to each process, "
+                    "so invalidations would only reach the worker that made the write.",
+                    hint=f"Set SHARED_CACHE_URL to a Redis server, point {alias} at another shared cache, or turn {enabled} off.",
+                    id="common.E001",
+                )
+            )
+    return errors
@@ -0,0 +1,114 @@
+import atexit
+import logging
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from common.object_cache import bark_cache
+from core.models import BarkModel
+
+logger = logging.getLogger(__name__)
+
+
+class CounterBuffer:
+    """
+    In-process write-behind buffer for a counter column.
+
+    Increments are summed in memory and written back in periodic bulk
+    UPDATEs (one per distinct delta), so a hot row is locked once per flush
+    instead of once per increment. pending() lets readers overlay deltas
+    that haven't reached the database yet.
+    """
+
+    def __init__(self, model, field: str, flush_interval: float, invalidate=lambda pks: None):
+        self.model = model
+        self.field = field
+        self.flush_interval = flush_interval
+        self.invalidate = invalidate
+        self._pending = defaultdict(int)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, pk, delta: int = 1) -> None:
+        """Record an increment for the row with primary key pk"""
+        with self._lock:
+            self._pending[pk] += delta
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=f"{self.field}-flusher", daemon=True
+                )
+                self._thread.start()
+
+    def pending(self, pk) -> int:
+        """Return the delta for pk that hasn't been committed yet"""
+        with self._lock:
+            return self._pending.get(pk, 0) + self._in_flight.get(pk, 0)
+
+    def pending_many(self, pks) -> dict:
+        """Return {pk: uncommitted delta} for the given pks, under one lock"""
+        with self._lock:
+            return {pk: self._pending.get(pk, 0) + self._in_flight.get(pk, 0) for pk in pks}
+
+    def flush(self) -> int:
+        """Write every buffered delta to the database, returning rows updated"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                self._in_flight, self._pending = dict(self._pending), defaultdict(int)
+
+            by_delta = defaultdict(list)
+            for pk, delta in self._in_flight.items():
+                by_delta[delta].append(pk)
+
+            try:
+                with transaction.atomic():
+                    updated = sum(
+                        self.model.objects.filter(pk__in=pks).update(
+                            **{self.field: F(self.field) + delta}
+                        )
+                        for delta, pks in by_delta.items()
+                    )
+            except Exception:
+                # Put the deltas back so the next flush retries them
+                with self._lock:
+                    for pk, delta in self._in_flight.items():
+                        self._pending[pk] += delta
+                    self._in_flight = {}
+                raise
+
+            with self._lock:
+                flushed, self._in_flight = self._in_flight, {}
+            # Cached objects hold the old count, which no longer adds up
+            # with pending() now that the deltas are in the database
+            self.invalidate(flushed)
+            return updated
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush %s buffer", self.field)
+            finally:
+                connections.close_all()
+
+    def shutdown(self) -> None:
+        """Stop the flusher thread and write out whatever is left"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+
+sniff_count_buffer = CounterBuffer(
+    BarkModel,
+    "sniff_count",
+    flush_interval=getattr(settings, "SNIFF_COUNT_FLUSH_SECONDS", 1.0),
+    invalidate=bark_cache.delete_many,
+)
+atexit.register(sniff_count_buffer.shutdown)
@@ -1,7 +1,9 @@
 from typing import Optional, Any
 from ninja import FilterSchema, Field
+from pydantic import field_validator
+from django.conf import settings
 from django.db.models import Q, QuerySet
-from django.utils import timezone
+from common.trending import trending_cutoff, trending_index
 
 
 class UsersFilter(FilterSchema):
@@ -11,11 +13,18 @@ class UsersFilter(FilterSchema):
 
     favorite_toy: Optional[str] = Field(None, q="favorite_toy__icontains")
     username: Optional[str] = Field(None, q="username__icontains")
-    search: Optional[str] = Field(
-        None, q=["favorite_toy__icontains", "username__icontains"]
-    )
+    search: Optional[str] = None
     order_by: Optional[str] = None
 
+    @field_validator("order_by")
+    @classmethod
+    def check_order_by(cls, value: Optional[str]) -> Optional[str]:
+        return check_ordering(value, USER_ORDERINGS)
+
+    def filter_search(self, value: str) -> Q:
+        """Full-text search is applied by handle_dog_users_list"""
+        return Q()
+
     def filter_order_by(self, value: str) -> str:
         """Filter for ordering users"""
         return Q()
@@ -26,16 +35,35 @@ class BarksFilter(FilterSchema):
     Filter schema for bark endpoints.
     """
 
-    message: Optional[str] = Field(None, q="message__icontains")
-    trending: Optional[bool] = None
+    message: Optional[str] = None
+    trending: Optional[bool] = Field(
+        None,
+        description="Barks sniffed in the trending window. With the materialized ranking only "
+        "the top TRENDING_SIZE are listed; the X-Trending-Limit response header gives the cap.",
+    )
     order_by: Optional[str] = None
 
+    @field_validator("order_by")
+    @classmethod
+    def check_order_by(cls, value: Optional[str]) -> Optional[str]:
+        return check_ordering(value, BARK_ORDERINGS)
+
+    def filter_message(self, value: str) -> Q:
+        """Full-text search is applied by handle_barks_list"""
+        return Q()
+
     def filter_trending(self, value: bool) -> Q:
-        """Filter for trending barks"""
+        """
+        Filter for trending barks, from the precomputed ranking if enabled.
+
+        The ranking only picks the barks, the top trending_index.size of
+        them; the page is still ordered by their sniff_count in the database.
+        """
         if not value:
             return Q()
-        one_day_ago = timezone.now() - timezone.timedelta(days=1)
-        return Q(created_at__gte=one_day_ago) & Q(sniff_count__gte=1)
+        if settings.TRENDING_MATERIALIZED:
+            return Q(id__in=trending_index.ranked_ids())
+        return Q(created_at__gte=trending_cutoff()) & Q(sniff_count__gte=1)
 
     def filter_order_by(self, value: str) -> str:
         """Filter for ordering barks"""
@@ -65,3 +93,38 @@ def apply_ordering(
             return queryset
 
     return queryset.order_by(order_by)
+
+
+def check_ordering(order_by: Optional[str], orderings: dict) -> Optional[str]:
+    """
+    Validate an order_by parameter against an endpoint's keyset orderings.
+
+    Unsupported orderings are rejected (a 422 response) rather than silently
+    replaced by the default one. search_rank is applied by searches, not
+    requested.
+    """
+    if order_by is not None and (order_by not in orderings or order_by == "search_rank"):
+        supported = ", ".join(ordering for ordering in orderings if ordering != "search_rank")
+        raise ValueError(f"Unsupported order_by {order_by!r}, expected one of: {supported}")
+    return order_by
+
+
+# Keyset orderings for KeysetPagination: the ordering an endpoint applies,
+# mapped to the full key its pages are sorted by (ending in a unique field)
+BARK_ORDERINGS = {
+    "search_rank": ("search_rank", "-created_at", "-id"),
+    "-created_at": ("-created_at", "-id"),
+    "created_at": ("created_at", "id"),
+    "-sniff_count": ("-sniff_count", "-created_at", "-id"),
+    "sniff_count": ("sniff_count", "created_at", "id"),
+}
+
+USER_ORDERINGS = {
+    "search_rank": ("search_rank", "id"),
+    "created_at": ("created_at", "id"),
+    "-created_at": ("-created_at", "-id"),
+    "username": ("username", "id"),
+    "-username": ("-username", "-id"),
+    "favorite_toy": ("favorite_toy", "id"),
+    "-favorite_toy": ("-favorite_toy", "-id"),
+}
@@ -0,0 +1,160 @@
+import threading
+import time
+from typing import Any, Callable, Hashable, Iterable
+from django.conf import settings
+from django.core.cache import caches
+
+# Stored in place of an object the loader found missing
+_MISSING = "object-cache:missing"
+
+
+class ObjectCache:
+    """
+    Per-object cache of serialized payloads, keyed by object id.
+
+    Writers keep it current by calling set() with the new payload once
+    their transaction commits, or delete() when there is nothing to write
+    through. Loads go through get_or_load(), which lets a single caller
+    fetch a missing key while concurrent callers wait for its result:
+    per key within a process, and through a short-lived cache.add() lock
+    across processes sharing the cache.
+
+    Entries are stored under a per-object version that delete() bumps, and
+    a load stores its payload under the version it saw before reading the
+    database, so a load that overlaps a delete() can't bring the old
+    payload back. Loaded payloads are also stored with add(), so one that
+    overlaps a set() doesn't replace the written-through payload.
+
+    A loader returns None when the object does not exist; that is cached
+    too, for negative_timeout seconds, so repeated lookups of a missing id
+    don't reach the database either.
+    """
+
+    # Lock stripes for in-process single flight; keys hash onto them
+    STRIPES = 64
+
+    def __init__(self, prefix: str, alias: str, timeout: float, negative_timeout: float, lock_timeout: float):
+        self.prefix = prefix
+        self.alias = alias
+        self.timeout = timeout
+        self.negative_timeout = negative_timeout
+        self.lock_timeout = lock_timeout
+        self._locks = [threading.Lock() for _ in range(self.STRIPES)]
+        self._counter_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _version_key(self, key: Hashable) -> str:
+        return f"object-cache:{self.prefix}:{key}:version"
+
+    def _key(self, key: Hashable) -> str:
+        """The cache key of the current version of key's entry"""
+        version_key = self._version_key(key)
+        version = self.cache.get(version_key)
+        if version is None:
+            # Seed from the clock so a version evicted from the cache never
+            # comes back with a number an old entry was stored under
+            self.cache.add(version_key, time.time_ns() // 1000, self.timeout)
+            version = self.cache.get(version_key)
+        return f"object-cache:{self.prefix}:{key}:{version}"
+
+    def _count(self, counter: str) -> None:
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Return the cached payload for key (None if missing), calling loader (once) on a miss"""
+        if not settings.OBJECT_CACHE_ENABLED:
+            return loader()
+
+        cache_key = self._key(key)
+        value = self.cache.get(cache_key)
+        if value is not None:
+            self._count("hits")
+            return None if value == _MISSING else value
+
+        self._count("misses")
+        with self._locks[hash(key) % self.STRIPES]:
+            # Another thread may have loaded it while we waited
+            value = self.cache.get(cache_key)
+            if value is not None:
+                return None if value == _MISSING else value
+
+            lock_key = f"{cache_key}:lock"
+            if self.cache.add(lock_key, 1, timeout=self.lock_timeout):
+                try:
+                    return self._load(cache_key, loader)
+                finally:
+                    self.cache.delete(lock_key)
+
+            # Another process is loading it; wait for its result, then give up
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.01)
+                value = self.cache.get(cache_key)
+                if value is not None:
+                    return None if value == _MISSING else value
+            return self._load(cache_key, loader)
+
+    def _load(self, cache_key: str, loader: Callable[[], Any]) -> Any:
+        self._count("loads")
+        value = loader()
+        if value is None:
+            self.cache.add(cache_key, _MISSING, self.negative_timeout)
+        else:
+            self.cache.add(cache_key, value, self.timeout)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Write through a payload built from freshly committed data"""
+        if settings.OBJECT_CACHE_ENABLED:
+            self.cache.set(self._key(key), value, self.timeout)
+
+    def delete(self, key: Hashable) -> None:
+        """Invalidate key's entry, including any load still in progress"""
+        version_key = self._version_key(key)
+        try:
+            self.cache.incr(version_key)
+        except ValueError:
+            self.cache.add(version_key, time.time_ns() // 1000, self.timeout)
+
+    def delete_many(self, keys: Iterable[Hashable]) -> None:
+        for key in keys:
+            self.delete(key)
+
+    def reset_stats(self) -> None:
+        with self._counter_lock:
+            self.hits = self.misses = self.loads = 0
+
+    def stats(self) -> dict:
+        """Return hit/miss/load counters for this process and the hit ratio"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Bark detail payloads without the author, which is cached on its own so an
+# author change invalidates one entry instead of every bark they wrote
+bark_cache = ObjectCache(
+    "bark",
+    alias=getattr(settings, "OBJECT_CACHE_ALIAS", "shared"),
+    timeout=getattr(settings, "OBJECT_CACHE_TIMEOUT", 300),
+    negative_timeout=getattr(settings, "OBJECT_CACHE_NEGATIVE_TIMEOUT", 30),
+    lock_timeout=getattr(settings, "OBJECT_CACHE_LOCK_SECONDS", 2),
+)
+author_cache = ObjectCache(
+    "author",
+    alias=getattr(settings, "OBJECT_CACHE_ALIAS", "shared"),
+    timeout=getattr(settings, "OBJECT_CACHE_TIMEOUT", 300),
+    negative_timeout=getattr(settings, "OBJECT_CACHE_NEGATIVE_TIMEOUT", 30),
+    lock_timeout=getattr(settings, "OBJECT_CACHE_LOCK_SECONDS", 2),
+)
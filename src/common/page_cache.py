@@ -0,0 +1,169 @@
+import hashlib
+import time
+from functools import wraps
+from typing import Callable, Optional
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpRequest, HttpResponse
+
+# Version partitions. Bark content (including the nested user) and sniff
+# counts change at very different rates, so they are versioned separately.
+PARTITION_BARKS = "barks"
+PARTITION_SNIFFS = "sniffs"
+
+
+class VersionedPageCache:
+    """
+    Whole-response cache for anonymous GET endpoints.
+
+    Entries are keyed on the path, the normalized query string and the
+    current version of each partition the page depends on. Writes invalidate
+    by bumping a partition version (one cache incr) instead of finding and
+    deleting keys; entries for old versions are never read again and expire
+    after timeout seconds.
+
+    Versions live in the same Django cache as the pages, which must be
+    shared by every process (e.g. Redis) so that every worker sees every
+    bump; the common.E001 check refuses a per-process backend. Hit, miss and
+    bypass counters are kept there too, so stats() (and the page_cache_stats
+    command) report totals across every worker.
+    """
+
+    COUNTERS = ("hits", "misses", "bypassed")
+
+    def __init__(self, alias: str, timeout: float):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def _version_key(partition: str) -> str:
+        return f"page-cache:version:{partition}"
+
+    def versions(self, partitions: tuple[str, ...]) -> list[int]:
+        """Current version of each partition"""
+        keys = [self._version_key(partition) for partition in partitions]
+        found = self.cache.get_many(keys)
+        versions = []
+        for key in keys:
+            if key not in found:
+                # Seed from the clock so a version evicted from the cache never
+                # comes back with a number an old entry was stored under
+                self.cache.add(key, time.time_ns() // 1000, timeout=None)
+                found[key] = self.cache.get(key)
+            versions.append(found[key])
+        return versions
+
+    def bump(self, *partitions: str) -> None:
+        """Invalidate every cached page that depends on these partitions"""
+        for partition in partitions:
+            key = self._version_key(partition)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.add(key, time.time_ns() // 1000, timeout=None)
+
+    def reset(self) -> None:
+        """Invalidate every page and zero the counters"""
+        self.bump(PARTITION_BARKS, PARTITION_SNIFFS)
+        self.reset_stats()
+
+    @staticmethod
+    def _counter_key(counter: str) -> str:
+        return f"page-cache:stats:{counter}"
+
+    def reset_stats(self) -> None:
+        """Zero the counters of every worker"""
+        self.cache.delete_many([self._counter_key(counter) for counter in self.COUNTERS])
+
+    def stats(self) -> dict:
+        """Return hit/miss counters summed over every worker, and the hit ratio"""
+        keys = {counter: self._counter_key(counter) for counter in self.COUNTERS}
+        found = self.cache.get_many(keys.values())
+        stats = {counter: found.get(key, 0) for counter, key in keys.items()}
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _count(self, counter: str) -> None:
+        key = self._counter_key(counter)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # First count since a reset; add() lets racing workers agree on 0
+            self.cache.add(key, 0, timeout=None)
+            self.cache.incr(key)
+
+    @staticmethod
+    def _page_key(request: HttpRequest, versions: list) -> str:
+        # Parameter order and blank values don't change the page
+        params = sorted((key, value) for key, values in request.GET.lists() for value in values if value != "")
+        raw = f"{request.scheme}://{request.get_host()}{request.path}?{urlencode(params)}"
+        digest = hashlib.sha256(raw.encode()).hexdigest()
+        return f"page-cache:page:{'.'.join(map(str, versions))}:{digest}"
+
+    def cache_anonymous_get(
+        self,
+        partitions: tuple[str, ...],
+        bounded_partitions: tuple[str, ...] = (),
+        max_staleness: Optional[Callable[[HttpRequest], float]] = None,
+    ):
+        """
+        Decorator for ninja operations (use with ninja.decorators.decorate_view).
+
+        Caches the serialized 200 responses of GET requests without an
+        Authorization header, since authenticated responses are personalized.
+
+        Args:
+            partitions: Partitions whose writes change the page
+            bounded_partitions: Partitions a request may ignore for a while
+            max_staleness: For a request, how many seconds it may ignore
+                bounded_partitions (0 to never ignore them). Such pages are
+                cached for that many seconds instead of the default timeout.
+        """
+
+        def decorator(run):
+            @wraps(run)
+            def wrapper(request: HttpRequest, *args, **kwargs):
+                if not settings.PAGE_CACHE_ENABLED:
+                    return run(request, *args, **kwargs)
+                if request.method != "GET" or "Authorization" in request.headers:
+                    self._count("bypassed")
+                    return run(request, *args, **kwargs)
+
+                staleness = max_staleness(request) if max_staleness else 0
+                depends_on = partitions
+                timeout = self.timeout
+                if staleness > 0:
+                    depends_on = tuple(p for p in partitions if p not in bounded_partitions)
+                    timeout = staleness
+
+                key = self._page_key(request, self.versions(depends_on))
+                cached = self.cache.get(key)
+                if cached is not None:
+                    self._count("hits")
+                    content, content_type = cached
+                    response = HttpResponse(content, content_type=content_type)
+                    response["X-Cache"] = "HIT"
+                    return response
+
+                self._count("misses")
+                response = run(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming:
+                    self.cache.set(key, (response.content, response["Content-Type"]), timeout)
+                response["X-Cache"] = "MISS"
+                return response
+
+            return wrapper
+
+        return decorator
+
+
+page_cache = VersionedPageCache(
+    alias=getattr(settings, "PAGE_CACHE_ALIAS", "shared"),
+    timeout=getattr(settings, "PAGE_CACHE_TIMEOUT", 300),
+)
@@ -1,6 +1,11 @@
-import base64
 import json
+from datetime import datetime
 from typing import Any, Optional
+from uuid import UUID
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import Q
 from django.http import HttpRequest
 from ninja.pagination import PaginationBase
 from ninja import Schema
@@ -10,7 +15,21 @@ class SkipPagination(PaginationBase):
     """
     Custom pagination class that allows skipping a number of items
     and specifying the number of items per page.
+
+    How the total is computed is chosen per endpoint with count_mode:
+      - "exact": one COUNT(*) per request (the default)
+      - "estimate": the planner's row estimate where the database keeps one
+        (PostgreSQL), otherwise a count capped at count_cap rows; totals past
+        the cap come back as count_cap with total_is_exact false ("1000+")
+      - "none": no count at all; total and pages are null and clients rely
+        on has_more
+
+    e.g. @paginate(SkipPagination, count_mode="estimate", count_cap=1000)
     """
+    COUNT_EXACT = "exact"
+    COUNT_ESTIMATE = "estimate"
+    COUNT_NONE = "none"
+
     class Input(Schema):
         skip: int = 0
         per_page: int = 5
@@ -18,17 +37,32 @@ class SkipPagination(PaginationBase):
 
     class Output(Schema):
         items: list[Any]
-        total: int
-        pages: int
+        total: Optional[int] = None
+        total_is_exact: bool = True
+        pages: Optional[int] = None
         per_page: int
         skip: int
+        has_more: bool
         next: Optional[str] = None
         previous: Optional[str] = None
 
+    def __init__(self, count_mode: str = COUNT_EXACT, count_cap: int = 1000, **kwargs):
+        if count_mode not in (self.COUNT_EXACT, self.COUNT_ESTIMATE, self.COUNT_NONE):
+            raise ValueError(f"Unknown count_mode: {count_mode}")
+        self.count_mode = count_mode
+        self.count_cap = count_cap
+        super().__init__(**kwargs)
+
     def paginate_queryset(self, queryset, pagination: Input, **params):
         skip = pagination.skip
         per_page = pagination.per_page
-        count = queryset.count()
+
+        # Fetch one extra row to learn whether another page exists without a count
+        items = list(queryset[skip : skip + per_page + 1])
+        has_more = len(items) > per_page
+        items = items[:per_page]
+
+        total, total_is_exact = self._count(queryset)
 
         # Build the base URL from the current request
         request: HttpRequest = params.get("request")
@@ -39,7 +73,7 @@ class SkipPagination(PaginationBase):
         previous_link = None
 
         # If there are more items after this page
-        if skip + per_page < count:
+        if has_more:
             next_link = f"{base_url}?skip={skip + per_page}&per_page={per_page}"
 
         # If we're not on the first page
@@ -49,15 +83,47 @@ class SkipPagination(PaginationBase):
             previous_link = f"{base_url}?skip={prev_skip}&per_page={per_page}"
 
         return {
-            "items": queryset[skip : skip + per_page],
-            "total": queryset.count(),
-            "pages": (queryset.count() + per_page - 1) // per_page,
+            "items": items,
+            "total": total,
+            "total_is_exact": total_is_exact,
+            "pages": (total + per_page - 1) // per_page if total is not None else None,
             "per_page": per_page,
             "skip": skip,
+            "has_more": has_more,
             "next": next_link,
             "previous": previous_link,
         }
 
+    def _count(self, queryset) -> tuple[Optional[int], bool]:
+        """Return (total, is_exact) according to count_mode"""
+        if self.count_mode == self.COUNT_NONE:
+            return None, False
+        if self.count_mode == self.COUNT_EXACT:
+            return queryset.count(), True
+
+        estimate = self._planner_estimate(queryset)
+        if estimate is not None and estimate > self.count_cap:
+            return estimate, False
+
+        # Cheap for small results and bounded for large ones
+        capped = queryset[: self.count_cap + 1].count()
+        if capped > self.count_cap:
+            return self.count_cap, False
+        return capped, True
+
+    def _planner_estimate(self, queryset) -> Optional[int]:
+        """Row estimate from the query planner, None where there isn't one"""
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return None
+        sql, query_params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", query_params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
     def _get_base_url(self, request):
         """Build the base URL without query parameters"""
         if not request:
@@ -76,11 +142,27 @@ class SkipPagination(PaginationBase):
         return f"{scheme}://{host}{path}"
 
 
-class TimestampCursorPagination(PaginationBase):
+class KeysetPagination(PaginationBase):
     """
-    Cursor pagination using timestamps.
+    Keyset (seek) pagination over a whitelisted ordering.
+
+    orderings maps the ordering a list endpoint applies (its first order_by
+    term, e.g. "-sniff_count") to the full key the page is sorted and sought
+    by, which must end in a unique field (e.g. ("-sniff_count", "-created_at",
+    "-id")). Key terms may also name annotations such as search_rank. Querysets
+    ordered any other way fall back to the default key.
+
+    Each page is one query whatever its depth: rows after (or before) the
+    cursor row are selected with a row comparison on the key instead of an
+    OFFSET. Cursors are signed, so clients can't forge arbitrary key values,
+    and both cursors are built from the fetched rows.
+
+    e.g. @paginate(KeysetPagination, orderings=BARK_ORDERINGS, default="-created_at")
     """
 
+    MAX_LIMIT = 100
+    SALT = "common.pagination.KeysetPagination"
+
     class Input(Schema):
         cursor: Optional[str] = None
         limit: int = 10
@@ -92,105 +174,134 @@ class TimestampCursorPagination(PaginationBase):
         previous: Optional[str] = None
         previous_cursor: Optional[str] = None
 
-    def paginate_queryset(self, queryset, pagination: Input, **params):
-        limit = min(pagination.limit, 100)
-        cursor = pagination.cursor
+    def __init__(self, orderings: dict[str, tuple[str, ...]], default: str, **kwargs):
+        if default not in orderings:
+            raise ValueError(f"Default ordering {default!r} is not in orderings")
+        self.orderings = orderings
+        self.default = default
+        super().__init__(**kwargs)
 
-        # Build the base URL from the current request
+    def paginate_queryset(self, queryset, pagination: Input, **params):
+        limit = max(1, min(pagination.limit, self.MAX_LIMIT))
         request: HttpRequest = params.get("request")
-        base_url = self._get_base_url(request)
 
-        # Default ordering
-        queryset = queryset.order_by("-created_at")
-
-        # Decode cursor if provided
-        filter_kwargs = {}
-        if cursor:
-            decoded = self.decode_cursor(cursor)
-            if decoded is not None:
-                # Use the timestamp from the cursor to filter results
-                timestamp = decoded.get("timestamp")
-                if timestamp:
-                    filter_kwargs["created_at__lt"] = timestamp
-            else:
-                # If cursor is invalid, ignore it and return the latest items
-                pass
-
-        # Get one more than requested to determine if there's a next page
-        results = list(queryset.filter(**filter_kwargs)[: limit + 1])
-
-        # If we got more results than requested, there's a next page
-        has_next = len(results) > limit
-        if has_next:
-            results = results[:-1]  # Remove the extra item
-
-        # Generate the next cursor
-        next_cursor = None
-        if has_next and results:
-            next_timestamp = results[-1].created_at.isoformat()
-            next_cursor = self.encode_cursor({"timestamp": next_timestamp})
+        ordering = self._get_ordering(queryset)
+        key = self.orderings[ordering]
+        fields = [(term.lstrip("-"), term.startswith("-")) for term in key]
+
+        # An invalid, tampered or stale cursor starts from the first page
+        cursor = self.decode_cursor(pagination.cursor, ordering)
+        backwards = cursor is not None and cursor["direction"] == "previous"
+
+        if backwards:
+            # Walk the reversed key from the cursor row, then flip the page back
+            reverse_key = [term[1:] if term.startswith("-") else f"-{term}" for term in key]
+            queryset = queryset.order_by(*reverse_key)
+            queryset = queryset.filter(self._seek(queryset.model, fields, cursor["values"], True))
+        else:
+            queryset = queryset.order_by(*key)
+            if cursor is not None:
+                queryset = queryset.filter(self._seek(queryset.model, fields, cursor["values"], False))
+
+        # Get one more than requested to determine if there's another page
+        results = list(queryset[: limit + 1])
+        has_more = len(results) > limit
+        results = results[:limit]
+        if backwards:
+            results.reverse()
+
+        # Paging forward from a cursor means the cursor row is behind us, and
+        # paging backwards means it is ahead of us, so only one side needs the
+        # extra row to know whether it continues
+        has_next = has_more if not backwards else True
+        has_previous = has_more if backwards else cursor is not None
 
-        # Generate previous cursor
+        next_cursor = None
         previous_cursor = None
-        if results and cursor:
-            # We need to fetch items AFTER the first item in the current result set
-            first_timestamp = results[0].created_at.isoformat()
-            # We need to get items older than this timestamp but in reverse order
-            prev_items = list(
-                queryset.filter(created_at__gt=first_timestamp).order_by("created_at")[
-                    :limit
-                ]
-            )
-            if prev_items:
-                oldest_prev_item = (
-                    prev_items[-1].created_at.isoformat() if prev_items else None
-                )
-                if oldest_prev_item:
-                    previous_cursor = self.encode_cursor(
-                        {"timestamp": oldest_prev_item}
-                    )
+        if results and has_next:
+            next_cursor = self.encode_cursor(results[-1], fields, ordering, "next")
+        if results and has_previous:
+            previous_cursor = self.encode_cursor(results[0], fields, ordering, "previous")
 
         return {
             "items": results,
-            "next": f"{base_url}?cursor={next_cursor}&limit={limit}"
-            if next_cursor
-            else None,
+            "next": self._build_link(request, next_cursor, limit),
             "next_cursor": next_cursor,
-            "previous": f"{base_url}?cursor={previous_cursor}&limit={limit}"
-            if previous_cursor
-            else None,
+            "previous": self._build_link(request, previous_cursor, limit),
             "previous_cursor": previous_cursor,
         }
 
-    def decode_cursor(self, cursor):
-        """Decode the cursor data from a URL-safe string"""
+    def _get_ordering(self, queryset) -> str:
+        """Return the whitelisted ordering the queryset was sorted by"""
+        order_by = queryset.query.order_by
+        if order_by and isinstance(order_by[0], str) and order_by[0] in self.orderings:
+            return order_by[0]
+        return self.default
+
+    @staticmethod
+    def _seek(model, fields, values, backwards: bool) -> Q:
+        """
+        Build the row comparison (f1, f2, ...) > (v1, v2, ...) for a mixed
+        direction key: OR over each field of "all earlier fields equal and
+        this one strictly past the cursor".
+        """
+        condition = Q()
+        equal = {}
+        bound = Q()
+        for (name, descending), raw in zip(fields, values):
+            value = KeysetPagination._from_cursor(model, name, raw)
+            lookup = "lt" if descending != backwards else "gt"
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            if not equal:
+                # Redundant with the OR, but gives the planner an index range to seek
+                bound = Q(**{f"{name}__{lookup}e": value})
+            equal[name] = value
+        return bound & condition
+
+    def encode_cursor(self, row, fields, ordering: str, direction: str) -> str:
+        """Sign the key values of row into an opaque cursor"""
+        values = [self._to_cursor(row, name) for name, _ in fields]
+        return signing.dumps(
+            {"o": ordering, "d": direction, "v": values}, salt=self.SALT, compress=True
+        )
+
+    @staticmethod
+    def _to_cursor(row, name: str):
+        """JSON-safe key value from a model instance or a .values() row"""
+        value = row[name] if isinstance(row, dict) else getattr(row, name)
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, UUID):
+            return str(value)
+        return value
+
+    @staticmethod
+    def _from_cursor(model, name: str, raw):
+        try:
+            return model._meta.get_field(name).to_python(raw)
+        except FieldDoesNotExist:
+            return raw
+
+    def decode_cursor(self, cursor: Optional[str], ordering: str) -> Optional[dict]:
+        """Return the cursor's direction and key values, or None if it isn't usable"""
         if not cursor:
             return None
         try:
-            decoded = base64.b64decode(cursor.encode()).decode()
-            return json.loads(decoded)
-        except (ValueError, json.JSONDecodeError):
+            data = signing.loads(cursor, salt=self.SALT)
+        except signing.BadSignature:
             return None
+        if data.get("o") != ordering or data.get("d") not in ("next", "previous"):
+            return None
+        if len(data.get("v", ())) != len(self.orderings[ordering]):
+            return None
+        return {"direction": data["d"], "values": data["v"]}
 
-    def encode_cursor(self, data):
-        """Encode the cursor data into a URL-safe string"""
-        json_str = json.dumps(data)
-        encoded = base64.b64encode(json_str.encode()).decode()
-        return encoded
-
-    def _get_base_url(self, request):
-        """Build the base URL without query parameters"""
-        if not request:
-            return ""
-
-        # Get the full path without query parameters
-        path = request.path
-
-        # Get the scheme (http or https)
+    def _build_link(self, request: Optional[HttpRequest], cursor: Optional[str], limit: int):
+        """Link to the page at cursor, keeping the request's filters"""
+        if not cursor or not request:
+            return None
+        query = request.GET.copy()
+        query["cursor"] = cursor
+        query["limit"] = limit
         scheme = "https" if request.is_secure() else "http"
-
-        # Get the host
-        host = request.get_host()
-
-        # Construct the base URL
-        return f"{scheme}://{host}{path}"
+        return f"{scheme}://{request.get_host()}{request.path}?{query.urlencode()}"
@@ -0,0 +1,75 @@
+from functools import lru_cache
+from typing import Iterable
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models import Model, QuerySet
+from ninja import Schema
+
+
+def requires(*fields: str):
+    """
+    Declare the model fields a schema resolver reads, for schema_only_fields().
+
+    Goes under @staticmethod:
+
+        @staticmethod
+        @requires("created_at")
+        def resolve_created_date(obj): ...
+
+    A resolver that reads no model columns (e.g. a prefetched attribute)
+    declares @requires().
+    """
+
+    def decorator(func):
+        func.requires = fields
+        return func
+
+    return decorator
+
+
+@lru_cache(maxsize=None)
+def schema_only_fields(schema: type[Schema], model: type[Model]) -> tuple[str, ...]:
+    """
+    The .only() field names a response schema needs to render instances of model.
+
+    Plain model fields are taken as they are, fields that are nested schemas
+    over a relation are followed (as relation__field), and resolved fields
+    contribute the fields declared with @requires on their resolver.
+    """
+    resolvers = schema._ninja_resolvers
+    names = ["pk"]
+    for name, info in schema.model_fields.items():
+        if name in resolvers:
+            func = resolvers[name]._func
+            if not hasattr(func, "requires"):
+                raise ImproperlyConfigured(f"{schema.__name__}.resolve_{name} must declare its fields with @requires")
+            names.extend(func.requires)
+            continue
+
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise ImproperlyConfigured(f"{schema.__name__}.{name} is not a field of {model.__name__}")
+        nested = info.annotation
+        if field.is_relation and isinstance(nested, type) and issubclass(nested, Schema):
+            names.append(name)
+            names.extend(f"{name}__{related}" for related in schema_only_fields(nested, field.related_model))
+        else:
+            names.append(name)
+
+    return tuple(dict.fromkeys(model._meta.pk.name if name == "pk" else name for name in names))
+
+
+def project(queryset: QuerySet, schema: type[Schema], also: Iterable[str] = ()) -> QuerySet:
+    """
+    Load only the columns schema renders, plus also (e.g. keyset ordering fields).
+
+    Related objects the schema nests must already be select_related.
+    """
+    return queryset.only(*schema_only_fields(schema, queryset.model), *also)
+
+
+def ordering_fields(model: type[Model], orderings: dict[str, tuple[str, ...]]) -> tuple[str, ...]:
+    """Model fields a KeysetPagination whitelist builds cursors from (annotations are skipped)"""
+    concrete = {field.name for field in model._meta.concrete_fields}
+    fields = (key.lstrip("-") for keys in orderings.values() for key in keys)
+    return tuple(dict.fromkeys(field for field in fields if field in concrete))
@@ -0,0 +1,155 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest
+
+logger = logging.getLogger(__name__)
+
+# Literals and placeholder lists that vary between otherwise identical queries
+_IN_LIST = re.compile(r"\bIN \((?:%s, )*%s\)")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+# Not counted: how many of these a request runs depends on the surrounding transaction
+_TRANSACTION_CONTROL = re.compile(r"\s*(?:BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE SAVEPOINT)\b", re.IGNORECASE)
+
+
+def query_shape(sql: str) -> str:
+    """sql with literals and IN lists folded, so repeats of one query compare equal"""
+    return _NUMBER.sub("?", _STRING.sub("?", _IN_LIST.sub("IN (...)", sql)))
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request ran more queries than its budget, or the same query repeatedly"""
+
+
+class QueryRecorder:
+    """
+    Records every SQL statement run on any database connection while active.
+
+    Use as a context manager; queries holds (sql, seconds) tuples in the
+    order they ran. Unlike CaptureQueriesContext this works with DEBUG off,
+    and transaction control statements (savepoints etc.) are left out.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        if _TRANSACTION_CONTROL.match(sql):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    def __len__(self) -> int:
+        return len(self.queries)
+
+    def repeated(self, threshold: int) -> dict[str, int]:
+        """{shape: count} for every query shape run at least threshold times (likely N+1)"""
+        counts = Counter(query_shape(sql) for sql, _ in self.queries)
+        return {shape: count for shape, count in counts.items() if count >= threshold}
+
+    def problems(self, max_queries=None, repeat_threshold=None) -> list[str]:
+        """Human readable budget and N+1 violations, empty when there are none"""
+        problems = []
+        if max_queries is not None and len(self) > max_queries:
+            problems.append(f"{len(self)} queries, budget is {max_queries}")
+        if repeat_threshold:
+            for shape, count in self.repeated(repeat_threshold).items():
+                problems.append(f"same query run {count} times (N+1?): {shape}")
+        return problems
+
+    def report(self) -> str:
+        return "\n".join(f"  {i}. ({seconds * 1000:.1f} ms) {sql}" for i, (sql, seconds) in enumerate(self.queries, 1))
+
+
+@contextmanager
+def assert_query_budget(max_queries=None, repeat_threshold=None):
+    """
+    Test helper: fail if the block runs more than max_queries queries, or any
+    one query shape repeat_threshold times or more.
+
+        with assert_query_budget(2):
+            client.get("/api/barks/")
+    """
+    repeat_threshold = repeat_threshold or settings.QUERY_BUDGET_REPEAT_THRESHOLD
+    with QueryRecorder() as recorder:
+        yield recorder
+    problems = recorder.problems(max_queries, repeat_threshold)
+    if problems:
+        raise QueryBudgetExceeded("; ".join(problems) + "\n" + recorder.report())
+
+
+def query_budget(max_queries: int):
+    """
+    Declare how many queries a ninja operation may run per request (use with
+    ninja.decorators.decorate_view). Authentication queries count too.
+
+    What happens on a violation depends on QUERY_BUDGET_MODE: "raise" fails
+    the request with QueryBudgetExceeded (the setting when running tests),
+    "warn" logs it and "off" skips recording altogether.
+
+    Only queries run by the view itself are counted, so streaming responses,
+    which query while the body is iterated, can't be budgeted this way.
+    """
+
+    def decorator(run):
+        @wraps(run)
+        def wrapper(request: HttpRequest, *args, **kwargs):
+            mode = settings.QUERY_BUDGET_MODE
+            if mode == "off":
+                return run(request, *args, **kwargs)
+
+            with QueryRecorder() as recorder:
+                response = run(request, *args, **kwargs)
+            problems = recorder.problems(max_queries, settings.QUERY_BUDGET_REPEAT_THRESHOLD)
+            if problems:
+                message = f"{request.method} {request.path}: " + "; ".join(problems)
+                if mode == "raise":
+                    raise QueryBudgetExceeded(message + "\n" + recorder.report())
+                logger.warning(message)
+            return response
+
+        wrapper.query_budget = max_queries
+        return wrapper
+
+    return decorator
+
+
+class QueryInspectionMiddleware:
+    """
+    Development middleware: counts the queries of every request into an
+    X-Query-Count header and logs likely N+1 patterns. Does nothing unless
+    DEBUG is on.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest):
+        if not settings.DEBUG:
+            return self.get_response(request)
+
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        response["X-Query-Count"] = str(len(recorder))
+        for problem in recorder.problems(repeat_threshold=settings.QUERY_BUDGET_REPEAT_THRESHOLD):
+            logger.warning("%s %s: %s", request.method, request.path, problem)
+        return response
@@ -0,0 +1,157 @@
+import re
+from abc import ABC, abstractmethod
+from typing import Sequence
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import F, FloatField, Q, QuerySet, Value
+from core.models import BarkModel, DogUserModel
+
+# Columns each searchable model is matched on
+SEARCH_FIELDS = {
+    BarkModel: ("message",),
+    DogUserModel: ("username", "favorite_toy"),
+}
+
+SEARCH_TERM_RE = re.compile(r"\w+")
+
+
+class SearchBackend(ABC):
+    """
+    Interface for full-text search over the models in SEARCH_FIELDS.
+
+    search() narrows a queryset to the rows matching a search string and
+    annotates search_rank on each row, lower being more relevant, so callers
+    can order_by("search_rank").
+    """
+
+    @abstractmethod
+    def search(self, queryset: QuerySet, query: str) -> QuerySet:
+        ...
+
+
+class ContainsSearchBackend(SearchBackend):
+    """Case-insensitive substring search; works anywhere but scans the table"""
+
+    def search(self, queryset: QuerySet, query: str) -> QuerySet:
+        condition = Q()
+        for field in SEARCH_FIELDS[queryset.model]:
+            condition |= Q(**{f"{field}__icontains": query})
+        return queryset.filter(condition).annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+
+
+class SQLiteFTSSearchBackend(SearchBackend):
+    """
+    SQLite FTS5 search over the <table>_fts indexes created by core
+    migration 0015 and kept in sync by triggers (see search_trigger_sql()).
+
+    Each index stores its own copy of the text, with rowids taken from
+    <table>_fts_keys: an INTEGER PRIMARY KEY per UUID primary key of the
+    table. Nothing depends on the source table's implicit rowid, which
+    VACUUM and table remakes renumber.
+
+    The index is joined through unmanaged models over it and its key table
+    (model.search_key.entry), so SQLite runs the MATCH once and looks the
+    matching rows up by key; the bm25 rank becomes search_rank. Every word
+    in the search string must match the start of a (stemmed) word in one of
+    the model's search fields. Search strings without any words fall back
+    to a substring search.
+    """
+
+    fallback = ContainsSearchBackend()
+
+    def search(self, queryset: QuerySet, query: str) -> QuerySet:
+        expression = self.fts_query(query)
+        if expression is None:
+            return self.fallback.search(queryset, query)
+        return queryset.filter(search_key__entry__document__match=expression).annotate(
+            search_rank=F("search_key__entry__rank")
+        )
+
+    @staticmethod
+    def rebuild() -> None:
+        """Re-index every row, e.g. after changing rows with the triggers missing"""
+        with connection.cursor() as cursor:
+            for model in SEARCH_FIELDS:
+                for sql in search_rebuild_sql(model._meta.db_table, SEARCH_FIELDS[model]):
+                    cursor.execute(sql)
+
+    @staticmethod
+    def fts_query(query: str):
+        """Turn free text into an FTS5 prefix query, or None if it has no words"""
+        terms = SEARCH_TERM_RE.findall(query)
+        if not terms:
+            return None
+        # Quoting each term keeps FTS5 operators in user input from being parsed
+        return " ".join(f'"{term}"*' for term in terms)
+
+
+def get_search_backend() -> SearchBackend:
+    """Return the backend for the SEARCH_BACKEND setting ("auto", "fts" or "contains")"""
+    backend = settings.SEARCH_BACKEND
+    if backend == "auto":
+        backend = "fts" if connection.vendor == "sqlite" else "contains"
+    if backend == "fts":
+        return SQLiteFTSSearchBackend()
+    return ContainsSearchBackend()
+
+
+def search_trigger_sql(table: str, columns: Sequence[str]) -> list[str]:
+    """Triggers that keep the <table>_fts index and its key table in sync with table"""
+    fts = f"{table}_fts"
+    keys = f"{fts}_keys"
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    assignments = ", ".join(f"{column} = new.{column}" for column in columns)
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS "{fts}_insert" AFTER INSERT ON "{table}" BEGIN '
+        f'INSERT INTO "{keys}"("id") VALUES (new.id); '
+        f'INSERT INTO "{fts}"(rowid, {column_list}) '
+        f'VALUES ((SELECT "key" FROM "{keys}" WHERE "id" = new.id), {new_values}); END',
+        f'CREATE TRIGGER IF NOT EXISTS "{fts}_delete" AFTER DELETE ON "{table}" BEGIN '
+        f'DELETE FROM "{fts}" WHERE rowid = (SELECT "key" FROM "{keys}" WHERE "id" = old.id); '
+        f'DELETE FROM "{keys}" WHERE "id" = old.id; END',
+        f'CREATE TRIGGER IF NOT EXISTS "{fts}_update" AFTER UPDATE OF {column_list} ON "{table}" BEGIN '
+        f'UPDATE "{fts}" SET {assignments} WHERE rowid = (SELECT "key" FROM "{keys}" WHERE "id" = old.id); END',
+    ]
+
+
+def search_rebuild_sql(table: str, columns: Sequence[str]) -> list[str]:
+    """Statements re-indexing every row of table from scratch"""
+    fts = f"{table}_fts"
+    keys = f"{fts}_keys"
+    column_list = ", ".join(columns)
+    source_columns = ", ".join(f'"{table}"."{column}"' for column in columns)
+    return [
+        f'DELETE FROM "{fts}"',
+        f'DELETE FROM "{keys}"',
+        f'INSERT INTO "{keys}"("id") SELECT "id" FROM "{table}"',
+        f'INSERT INTO "{fts}"(rowid, {column_list}) '
+        f'SELECT "{keys}"."key", {source_columns} '
+        f'FROM "{table}" JOIN "{keys}" ON "{keys}"."id" = "{table}"."id"',
+    ]
+
+
+def restore_search_triggers(using: str = "default", **kwargs) -> None:
+    """
+    post_migrate handler: SQLite drops a table's triggers when a migration
+    remakes it (e.g. AlterField), so put back any that are missing and
+    re-index the rows changed while they were gone.
+    """
+    db = connections[using]
+    if db.vendor != "sqlite":
+        return
+    with db.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = {row[0] for row in cursor.fetchall()}
+        for model, columns in SEARCH_FIELDS.items():
+            table = model._meta.db_table
+            fts = f"{table}_fts"
+            if fts not in existing:
+                # The search migration hasn't run yet
+                continue
+            if all(f"{fts}_{trigger}" in existing for trigger in ("insert", "delete", "update")):
+                continue
+            for sql in search_trigger_sql(table, columns) + search_rebuild_sql(table, columns):
+                cursor.execute(sql)
@@ -0,0 +1,44 @@
+import csv
+import zlib
+from io import StringIO
+from itertools import islice
+from typing import Iterable, Iterator, Sequence
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+def _batches(rows: Iterable, size: int) -> Iterator[list]:
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def csv_chunks(header: Sequence[str], rows: Iterable[Sequence], rows_per_chunk: int) -> Iterator[bytes]:
+    """Encode rows as CSV, rows_per_chunk rows per yielded chunk"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for batch in _batches(rows, rows_per_chunk):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Header only: no rows
+        yield buffer.getvalue().encode()
+
+
+def ndjson_chunks(fields: Sequence[str], rows: Iterable[Sequence], rows_per_chunk: int) -> Iterator[bytes]:
+    """Encode rows as one JSON object per line, keyed by fields"""
+    encoder = DjangoJSONEncoder()
+    for batch in _batches(rows, rows_per_chunk):
+        yield "".join(encoder.encode(dict(zip(fields, row))) + "\n" for row in batch).encode()
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip a stream of chunks on the fly, without holding the whole payload"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,207 @@
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from core.models import BarkModel
+
+logger = logging.getLogger(__name__)
+
+
+class TrendingIndex:
+    """
+    In-memory ranking of trending barks.
+
+    Candidates are barks created inside the trending window with at least one
+    sniff, ranked by (sniff_count, created_at, id). Sniffs made in this
+    process update the ranking incrementally, barks age out of the window
+    when it is read, and a background thread reloads the candidates from the
+    database every refresh_interval seconds to pick up other processes'
+    writes. A read never serves a ranking older than max_staleness seconds;
+    if the scheduler has fallen behind, the read refreshes it first, and
+    concurrent stale reads wait for that one refresh instead of each
+    running their own. Sniffs and deletes recorded while a refresh reads the
+    database are replayed on top of what it read, so they aren't lost until
+    the next one.
+
+    The ranking only selects which barks are trending. The list endpoint
+    orders them by their sniff_count in the database, because its keyset
+    cursors page on the stored (sniff_count, created_at, id) values.
+    """
+
+    def __init__(self, window: timezone.timedelta, size: int, refresh_interval: float, max_staleness: float):
+        self.window = window
+        self.size = size
+        self.refresh_interval = refresh_interval
+        self.max_staleness = max_staleness
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop the ranking; the next read reloads it from the database"""
+        with self._lock:
+            self._candidates = {}
+            self._ranked = None
+            self._refreshed_at = None
+            # (apply, *args) changes recorded while a refresh runs
+            self._pending = None
+            self.reads = 0
+            self.refreshes = 0
+            self.stale_refreshes = 0
+
+    def refresh(self) -> None:
+        """Reload every candidate from the database"""
+        with self._refresh_lock:
+            self._refresh()
+
+    def _refresh(self) -> None:
+        # Callers hold _refresh_lock
+        started = time.monotonic()
+        with self._lock:
+            self._pending = []
+        try:
+            candidates = self._load()
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            self._candidates = candidates
+            pending, self._pending = self._pending, None
+            # A sniff committed just before the read can be counted twice
+            # until the next refresh; dropping the rest would lose them
+            for apply, *args in pending or ():
+                apply(*args)
+            self._ranked = None
+            self._refreshed_at = started
+            self.refreshes += 1
+
+    def _load(self) -> dict:
+        rows = BarkModel.objects.filter(
+            created_at__gte=timezone.now() - self.window, sniff_count__gte=1
+        ).values_list("id", "sniff_count", "created_at")
+        return {bark_id: [count, created_at] for bark_id, count, created_at in rows}
+
+    def record_sniffs(self, barks: dict, delta: int = 1) -> None:
+        """Add delta sniffs to each bark, given as {bark_id: created_at}"""
+        with self._lock:
+            self._apply_sniffs(barks, delta)
+
+    def _apply_sniffs(self, barks: dict, delta: int) -> None:
+        # Callers hold _lock
+        if self._pending is not None:
+            self._pending.append((self._apply_sniffs, barks, delta))
+        cutoff = timezone.now() - self.window
+        for bark_id, created_at in barks.items():
+            if created_at < cutoff:
+                continue
+            entry = self._candidates.setdefault(bark_id, [0, created_at])
+            entry[0] += delta
+            if entry[0] < 1:
+                del self._candidates[bark_id]
+        self._ranked = None
+
+    def invalidate(self) -> None:
+        """Mark the ranking stale, so the next read reloads it from the database"""
+        with self._lock:
+            self._refreshed_at = None
+
+    def discard(self, bark_id) -> None:
+        """Remove a deleted bark from the ranking"""
+        with self._lock:
+            self._apply_discard(bark_id)
+
+    def _apply_discard(self, bark_id) -> None:
+        # Callers hold _lock
+        if self._pending is not None:
+            self._pending.append((self._apply_discard, bark_id))
+        if self._candidates.pop(bark_id, None) is not None:
+            self._ranked = None
+
+    def _is_stale(self) -> bool:
+        refreshed_at = self._refreshed_at
+        return refreshed_at is None or time.monotonic() - refreshed_at > self.max_staleness
+
+    def ranked_ids(self) -> list:
+        """Return the ids of the top trending barks, highest ranked first"""
+        self._ensure_scheduler()
+        if self._is_stale():
+            with self._refresh_lock:
+                # Another reader may have refreshed it while we waited
+                if self._is_stale():
+                    with self._lock:
+                        self.stale_refreshes += 1
+                    self._refresh()
+
+        cutoff = timezone.now() - self.window
+        with self._lock:
+            self.reads += 1
+            expired = [
+                bark_id
+                for bark_id, (_, created_at) in self._candidates.items()
+                if created_at < cutoff
+            ]
+            for bark_id in expired:
+                del self._candidates[bark_id]
+            if self._ranked is None or expired:
+                ranking = sorted(
+                    self._candidates.items(),
+                    key=lambda item: (item[1][0], item[1][1], item[0]),
+                    reverse=True,
+                )
+                self._ranked = [bark_id for bark_id, _ in ranking[: self.size]]
+            return self._ranked
+
+    def _ensure_scheduler(self) -> None:
+        if self._thread is not None or self.refresh_interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trending-refresh", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Failed to refresh the trending index")
+            finally:
+                connections.close_all()
+
+    def shutdown(self) -> None:
+        """Stop the refresh thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self) -> dict:
+        """Return read/refresh counters and the current ranking size"""
+        refreshed_at = self._refreshed_at
+        return {
+            "reads": self.reads,
+            "refreshes": self.refreshes,
+            "stale_refreshes": self.stale_refreshes,
+            "candidates": len(self._candidates),
+            "age": time.monotonic() - refreshed_at if refreshed_at is not None else None,
+        }
+
+
+def trending_cutoff() -> datetime:
+    """Oldest created_at that still counts as trending"""
+    return timezone.now() - trending_index.window
+
+
+trending_index = TrendingIndex(
+    window=timezone.timedelta(hours=getattr(settings, "TRENDING_WINDOW_HOURS", 24)),
+    size=getattr(settings, "TRENDING_SIZE", 200),
+    refresh_interval=getattr(settings, "TRENDING_REFRESH_SECONDS", 10),
+    max_staleness=getattr(settings, "TRENDING_MAX_STALENESS_SECONDS", 30),
+)
+atexit.register(trending_index.shutdown)
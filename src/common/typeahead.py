@@ -0,0 +1,119 @@
+import bisect
+import threading
+import time
+from django.conf import settings
+from core.models import DogUserModel
+
+
+class TypeaheadIndex:
+    """
+    Case-folded, sorted in-memory index of usernames for prefix lookups.
+
+    Keys are (folded username, user id) tuples kept in order with bisect, so
+    a lookup is a binary search to the first key with the prefix followed by
+    a walk over at most limit entries. Users created or renamed through this
+    process are applied incrementally; the index is reloaded from the
+    database on read once it is older than refresh_interval seconds, to pick
+    up changes made elsewhere. Concurrent stale reads wait for one reload,
+    and changes applied while it reads the database are replayed on top of
+    the rebuilt index, so they aren't lost to the older snapshot.
+    """
+
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop the index; the next lookup reloads it from the database"""
+        with self._lock:
+            self._keys = []
+            self._usernames = {}
+            self._loaded_at = None
+            # (user_id, username or None) changes made while a reload runs
+            self._pending = None
+            self.reloads = 0
+
+    def reload(self) -> None:
+        """Rebuild the index from every user in the database"""
+        with self._reload_lock:
+            self._reload()
+
+    def _reload(self) -> None:
+        # Callers hold _reload_lock
+        started = time.monotonic()
+        with self._lock:
+            self._pending = []
+        try:
+            usernames = self._load()
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        keys = sorted((username.casefold(), user_id) for user_id, username in usernames.items())
+        with self._lock:
+            self._keys = keys
+            self._usernames = usernames
+            pending, self._pending = self._pending, None
+            # The snapshot may predate these; applying them again is harmless
+            for user_id, username in pending or ():
+                self._apply(user_id, username)
+            self._loaded_at = started
+            self.reloads += 1
+
+    def _load(self) -> dict:
+        return dict(DogUserModel.objects.values_list("id", "username"))
+
+    def _is_stale(self) -> bool:
+        loaded_at = self._loaded_at
+        return loaded_at is None or time.monotonic() - loaded_at > self.refresh_interval
+
+    def add(self, user_id, username: str) -> None:
+        """Index a new user, or move an existing one to its new username"""
+        with self._lock:
+            self._apply(user_id, username)
+
+    def remove(self, user_id) -> None:
+        with self._lock:
+            self._apply(user_id, None)
+
+    def _apply(self, user_id, username: str | None) -> None:
+        # Callers hold _lock
+        if self._pending is not None:
+            self._pending.append((user_id, username))
+        self._discard(user_id)
+        if username is not None:
+            bisect.insort(self._keys, (username.casefold(), user_id))
+            self._usernames[user_id] = username
+
+    def _discard(self, user_id) -> None:
+        old = self._usernames.pop(user_id, None)
+        if old is None:
+            return
+        position = bisect.bisect_left(self._keys, (old.casefold(), user_id))
+        if position < len(self._keys) and self._keys[position][1] == user_id:
+            del self._keys[position]
+
+    def search(self, prefix: str, limit: int) -> list[dict]:
+        """Return up to limit {"id", "username"} dicts whose username starts with prefix"""
+        if self._is_stale():
+            with self._reload_lock:
+                # Another reader may have reloaded it while we waited
+                if self._is_stale():
+                    self._reload()
+
+        folded = prefix.casefold()
+        matches = []
+        with self._lock:
+            position = bisect.bisect_left(self._keys, (folded,))
+            for key, user_id in self._keys[position : position + limit]:
+                if not key.startswith(folded):
+                    break
+                matches.append({"id": user_id, "username": self._usernames[user_id]})
+        return matches
+
+
+typeahead_index = TypeaheadIndex(
+    refresh_interval=getattr(settings, "TYPEAHEAD_REFRESH_SECONDS", 300),
+)
@@ -4,10 +4,9 @@ from api.endpoints.users import router as users_router
 from api.endpoints.auth import router as auth_router
 from api.endpoints.sniffs import router as sniffs_router
 
-from common.auth.token import TokenAuth
-from common.auth.jwt_auth import JWTAuth
+from common.auth.dispatch import BearerAuth
 
-api = NinjaAPI(auth=[TokenAuth(), JWTAuth()], title="Social Dog API")
+api = NinjaAPI(auth=BearerAuth(), title="Social Dog API")
 
 
 api.add_router("/users", users_router, tags=["users"])
@@ -52,6 +52,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    # Only active with DEBUG: X-Query-Count header and N+1 warnings
+    "common.query_budget.QueryInspectionMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -129,4 +131,131 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 JWT_SECRET = "supersecretkey"
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# In-process cache of validated opaque access tokens (see common/auth/token.py).
+# Entries never outlive the token's own expiry; set the TTL to 0 to disable.
+# Logouts, rotations and deactivations bump a per-user version in the
+# TOKEN_AUTH_VERSION_ALIAS cache that every hit is checked against. Without a
+# shared cache (SHARED_CACHE_URL below) other workers only notice when their
+# entries expire, so the TTL is kept short.
+TOKEN_AUTH_CACHE_TTL = 60 if os.environ.get("SHARED_CACHE_URL") else 5
+TOKEN_AUTH_CACHE_SIZE = 1024
+TOKEN_AUTH_VERSION_ALIAS = "shared"
+
+# Build the JWT user from the claims in the access token instead of querying
+# DogUserModel on every request. Claims are a snapshot taken when the token was
+# issued; their version is checked against the user's current one, cached for
+# JWT_USER_VERSION_TTL seconds, and stale claims fall back to a query. Profile
+# edits, deactivations and deletions made by another process can take up to
+# that long to be noticed.
+JWT_STATELESS_PRINCIPAL = False
+JWT_USER_VERSION_TTL = 30
+JWT_USER_VERSION_CACHE_SIZE = 10000
+
+# In-process cache of verified JWT payloads keyed by a digest of the token.
+# Entries are evicted at the token's exp or when the cache is full.
+JWT_CACHE_TTL = 4 * 60 * 60
+JWT_CACHE_SIZE = 10000
+
+# Password hashing runs in a bounded process pool (see common/auth/passwords.py).
+# Logins beyond workers + max pending get a 503 with Retry-After instead of
+# queueing. Set the worker count to 0 to hash on the request thread
+# (config/test_settings.py does, rather than spawning worker processes).
+PASSWORD_HASHING_WORKERS = 2
+PASSWORD_HASHING_MAX_PENDING = 16
+PASSWORD_HASHING_RETRY_AFTER = 1
+
+# JWT revocation denylist (see common/auth/revocation.py). The Bloom filter is
+# sized for CAPACITY revocations at ERROR_RATE false positives and a background
+# thread picks up revocations made by other processes every SYNC_SECONDS; 0
+# turns the thread off.
+JWT_REVOCATION_BLOOM_CAPACITY = 100_000
+JWT_REVOCATION_BLOOM_ERROR_RATE = 0.01
+JWT_REVOCATION_SYNC_SECONDS = 5
+
+# Buffer sniff_count increments in memory and write them to BarkModel in bulk
+# every SNIFF_COUNT_FLUSH_SECONDS (see common/counters.py). Responses overlay
+# unflushed increments, so counts still look immediate.
+SNIFF_COUNT_WRITE_BEHIND = False
+SNIFF_COUNT_FLUSH_SECONDS = 1.0
+
+# Serve ?trending=true from an in-memory ranking (see common/trending.py)
+# instead of querying every recently sniffed bark. It is reloaded every
+# TRENDING_REFRESH_SECONDS and never read when older than
+# TRENDING_MAX_STALENESS_SECONDS; only the top TRENDING_SIZE barks are listed.
+# The ranking picks which barks trend; pages still order them by the stored
+# sniff_count. Unlike the live query, the list stops after TRENDING_SIZE barks;
+# responses give the cap in an X-Trending-Limit header. A refresh interval of 0
+# turns the refresh thread off; reads then refresh the ranking when stale.
+TRENDING_MATERIALIZED = True
+TRENDING_WINDOW_HOURS = 24
+TRENDING_SIZE = 200
+TRENDING_REFRESH_SECONDS = 10
+TRENDING_MAX_STALENESS_SECONDS = 30
+
+# Full-text search for ?message= on barks and ?search= on users (see
+# common/search.py): "fts" uses the SQLite FTS5 indexes, "contains" falls back
+# to icontains, and "auto" picks fts on SQLite.
+SEARCH_BACKEND = "auto"
+
+# Username autocomplete index (see common/typeahead.py). Changes made through
+# this process apply immediately; the index is reloaded from the database once
+# it is older than TYPEAHEAD_REFRESH_SECONDS.
+TYPEAHEAD_REFRESH_SECONDS = 300
+
+# Cache shared by every worker, for caches whose invalidations must reach all
+# of them (the page and object caches). Set SHARED_CACHE_URL to a Redis URL such as
+# redis://localhost:6379/0; without it "shared" is local to each process and
+# those caches stay off (enabling them anyway fails the common.E001 check).
+SHARED_CACHE_URL = os.environ.get("SHARED_CACHE_URL")
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": SHARED_CACHE_URL,
+    }
+    if SHARED_CACHE_URL
+    else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "shared",
+    },
+}
+
+# Cache anonymous GET /barks/ responses (see common/page_cache.py). Writes to
+# barks, users and sniffs bump a version instead of deleting keys. Trending
+# pages may ignore new sniffs for up to PAGE_CACHE_TRENDING_STALENESS_SECONDS
+# (0 invalidates them on every sniff like the other pages). Hit and miss counts
+# are kept in the shared cache; read them with manage.py page_cache_stats.
+PAGE_CACHE_ENABLED = SHARED_CACHE_URL is not None
+PAGE_CACHE_ALIAS = "shared"
+PAGE_CACHE_TIMEOUT = 300
+PAGE_CACHE_TRENDING_STALENESS_SECONDS = 10
+
+# Render the bark and user list pages from .values() rows with plain dict
+# building (see common/columnar.py) instead of model instances and per-row
+# schema validation. The JSON is the same either way.
+COLUMNAR_RESPONSES = True
+
+# Per-endpoint query budgets (see common/query_budget.py). "warn" logs
+# requests over budget or repeating one query QUERY_BUDGET_REPEAT_THRESHOLD
+# times (likely N+1), "raise" fails them, "off" skips recording. The test
+# settings raise, so a regression fails the suite.
+QUERY_BUDGET_MODE = "warn" if DEBUG else "off"
+QUERY_BUDGET_REPEAT_THRESHOLD = 3
+
+# Cache GET /barks/{id}/ payloads per bark, with the author cached separately
+# (see common/object_cache.py). Writes update entries or bump their version once they
+# commit; a miss is loaded by one caller while the others wait for up to
+# OBJECT_CACHE_LOCK_SECONDS. Like the page cache it needs the shared cache.
+# Missing barks are remembered for OBJECT_CACHE_NEGATIVE_TIMEOUT seconds.
+OBJECT_CACHE_ENABLED = SHARED_CACHE_URL is not None
+OBJECT_CACHE_ALIAS = "shared"
+OBJECT_CACHE_TIMEOUT = 300
+OBJECT_CACHE_NEGATIVE_TIMEOUT = 30
+OBJECT_CACHE_LOCK_SECONDS = 2
+
+# Rows read per database round trip, and encoded per streamed chunk, by the
+# bark history export (GET /barks/export/)
+BARK_EXPORT_CHUNK_SIZE = 2000
@@ -0,0 +1,19 @@
+"""
+Settings for the test suite.
+
+manage.py test uses these by default; other runners should set
+DJANGO_SETTINGS_MODULE=config.test_settings.
+"""
+
+from config.settings import *  # noqa: F401,F403
+
+# Hash passwords on the request thread instead of spawning worker processes
+PASSWORD_HASHING_WORKERS = 0
+
+# No background threads querying the database while tests run; tests sync
+# and refresh explicitly, or reads refresh when stale
+JWT_REVOCATION_SYNC_SECONDS = 0
+TRENDING_REFRESH_SECONDS = 0
+
+# Fail any request over its query budget, so a regression fails the suite
+QUERY_BUDGET_MODE = "raise"
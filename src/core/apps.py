@@ -0,0 +1,21 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    name = "core"
+
+    def ready(self):
+        from django.core import checks
+        from django.db.models.signals import post_delete, post_migrate, post_save
+        from common.auth.token import invalidate_on_change
+        from common.checks import check_shared_caches
+        from common.search import restore_search_triggers
+        from core.models import AuthTokenModel, DogUserModel, LazyDogUserModel
+
+        checks.register(check_shared_caches, checks.Tags.caches)
+        post_migrate.connect(restore_search_triggers, sender=self)
+        # Cached token lookups must notice deactivations and deletions made
+        # outside the API, in any worker
+        for model in (DogUserModel, LazyDogUserModel, AuthTokenModel):
+            post_save.connect(invalidate_on_change, sender=model)
+            post_delete.connect(invalidate_on_change, sender=model)
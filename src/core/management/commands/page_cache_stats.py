@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from common.page_cache import page_cache
+
+
+class Command(BaseCommand):
+    """
+    Print the page cache's hit ratio, summed over every worker.
+
+    The counters live in the shared cache next to the pages, so this can run
+    from any host that reaches it, e.g. from cron to feed a dashboard:
+
+        python manage.py page_cache_stats --reset
+    """
+
+    help = "Show page cache hits, misses and hit ratio across every worker"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Zero the counters after printing them, to measure the next interval",
+        )
+
+    def handle(self, *args, **options):
+        stats = page_cache.stats()
+        if options["reset"]:
+            page_cache.reset_stats()
+        self.stdout.write(
+            f"hits={stats['hits']} misses={stats['misses']} bypassed={stats['bypassed']} "
+            f"hit_ratio={stats['hit_ratio']:.3f}"
+        )
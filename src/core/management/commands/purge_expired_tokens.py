@@ -0,0 +1,78 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from core.models import AuthTokenModel, RevokedTokenModel
+
+
+class Command(BaseCommand):
+    """
+    Delete expired or inactive auth tokens in bounded batches.
+
+    Tokens are otherwise only removed when the same user logs in again, so
+    churned users leave rows behind in the key index that TokenAuth probes on
+    every request. JWT revocations are dropped once the token they revoke has
+    expired. Meant to run periodically, e.g. from cron:
+
+        python manage.py purge_expired_tokens --batch-size 1000
+    """
+
+    help = "Delete expired or inactive auth tokens in small batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of rows deleted per transaction (default: 500)",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.05,
+            help="Seconds to sleep between batches so other writers get the lock (default: 0.05)",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        batch_size = options["batch_size"]
+        pause = options["pause"]
+        now = timezone.now()
+
+        start = time.perf_counter()
+        # Expired first, which walks the expires index, then the rare inactive rows
+        deleted = self.purge(AuthTokenModel, Q(expires__lte=now), batch_size, pause)
+        deleted += self.purge(AuthTokenModel, Q(is_active=False), batch_size, pause)
+        deleted += self.purge(RevokedTokenModel, Q(expires_at__lte=now), batch_size, pause)
+        elapsed = time.perf_counter() - start
+
+        rate = deleted / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {deleted} tokens in {elapsed:.2f}s ({rate:,.0f} rows/sec)"
+            )
+        )
+
+    def purge(self, model, condition: Q, batch_size: int, pause: float) -> int:
+        """Delete rows matching condition batch by batch, returning the total"""
+        total = 0
+        while True:
+            ids = list(
+                model.objects.filter(condition).values_list("id", flat=True)[
+                    :batch_size
+                ]
+            )
+            if not ids:
+                return total
+
+            # One short transaction per batch keeps SQLite's write lock brief
+            with transaction.atomic():
+                deleted, _ = model.objects.filter(id__in=ids).delete()
+            total += deleted
+            if self.verbosity > 1:
+                self.stdout.write(f"Deleted batch of {deleted}")
+
+            if len(ids) < batch_size:
+                return total
+            time.sleep(pause)
@@ -0,0 +1,163 @@
+import json
+import os
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from common.object_cache import bark_cache
+from common.page_cache import PARTITION_SNIFFS, page_cache
+from common.trending import trending_index
+from core.models import BarkModel, UserSniffModel
+
+
+class Command(BaseCommand):
+    """
+    Repair drift between BarkModel.sniff_count and the UserSniffModel rows.
+
+    Barks are walked in primary key order, one keyset chunk at a time. Each
+    chunk costs one read of the stored counts and one grouped COUNT over
+    the sniffs, plus one UPDATE if any rows drifted. The UPDATE recomputes
+    the count in the statement itself, so sniffs committed in the meantime
+    are not overwritten. Progress is saved to a checkpoint file after every
+    chunk so an interrupted run can resume:
+
+        python manage.py reconcile_sniff_counts --checkpoint /tmp/sniffs.json
+
+    Run it with the write-behind sniff buffer disabled or flushed, since
+    unflushed increments would be applied on top of the repaired counts.
+
+    Repaired chunks invalidate their cached bark payloads and the cached
+    pages that depend on sniff counts. The trending ranking of this process
+    is reloaded on its next read; the ones held by the web processes pick up
+    the repaired counts at their next scheduled refresh
+    (TRENDING_REFRESH_SECONDS).
+    """
+
+    help = "Recompute drifted bark sniff counts in resumable chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of barks checked per chunk (default: 1000)",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="File used to save progress and resume an interrupted run",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.0,
+            help="Seconds to sleep between chunks (default: 0)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drift without updating any rows",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        checkpoint = options["checkpoint"]
+        dry_run = options["dry_run"]
+
+        state = self.load_checkpoint(checkpoint)
+        stats = state["stats"]
+        last_id = state["last_id"]
+        if last_id:
+            self.stdout.write(f"Resuming after bark {last_id}")
+
+        start = time.perf_counter()
+        while True:
+            barks = BarkModel.objects.order_by("id")
+            if last_id:
+                barks = barks.filter(id__gt=last_id)
+            chunk = list(barks.values_list("id", "sniff_count")[:chunk_size])
+            if not chunk:
+                break
+
+            ids = [bark_id for bark_id, _ in chunk]
+            true_counts = dict(
+                UserSniffModel.objects.filter(bark_id__in=ids)
+                .values("bark_id")
+                .annotate(count=Count("id"))
+                .values_list("bark_id", "count")
+            )
+            drifted = []
+            for bark_id, stored in chunk:
+                drift = stored - true_counts.get(bark_id, 0)
+                if drift:
+                    drifted.append(bark_id)
+                    stats["total_drift"] += abs(drift)
+                    stats["max_drift"] = max(stats["max_drift"], abs(drift))
+                    stats["overcounted" if drift > 0 else "undercounted"] += 1
+
+            if drifted and not dry_run:
+                with transaction.atomic():
+                    BarkModel.objects.filter(id__in=drifted).update(
+                        sniff_count=Coalesce(Subquery(self.sniff_count_subquery()), 0)
+                    )
+                bark_cache.delete_many(drifted)
+                page_cache.bump(PARTITION_SNIFFS)
+                trending_index.invalidate()
+
+            stats["checked"] += len(chunk)
+            stats["drifted"] += len(drifted)
+            last_id = str(ids[-1])
+            self.save_checkpoint(checkpoint, last_id, stats)
+            if options["pause"]:
+                time.sleep(options["pause"])
+
+        elapsed = time.perf_counter() - start
+        self.clear_checkpoint(checkpoint)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{'Found' if dry_run else 'Repaired'} {stats['drifted']} drifted of "
+                f"{stats['checked']} barks in {elapsed:.2f}s "
+                f"(over: {stats['overcounted']}, under: {stats['undercounted']}, "
+                f"total drift: {stats['total_drift']}, max drift: {stats['max_drift']})"
+            )
+        )
+
+    @staticmethod
+    def sniff_count_subquery():
+        return (
+            UserSniffModel.objects.filter(bark=OuterRef("pk"))
+            .values("bark")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+
+    @staticmethod
+    def load_checkpoint(path):
+        empty_stats = {
+            "checked": 0,
+            "drifted": 0,
+            "overcounted": 0,
+            "undercounted": 0,
+            "total_drift": 0,
+            "max_drift": 0,
+        }
+        if not path or not os.path.exists(path):
+            return {"last_id": None, "stats": empty_stats}
+        with open(path) as f:
+            state = json.load(f)
+        return {"last_id": state["last_id"], "stats": {**empty_stats, **state["stats"]}}
+
+    @staticmethod
+    def save_checkpoint(path, last_id, stats):
+        if not path:
+            return
+        # Write then rename so a crash never leaves a half-written checkpoint
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"last_id": last_id, "stats": stats}, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def clear_checkpoint(path):
+        if path and os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-17 20:42
+
+import django.contrib.auth.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_dogusermodel_profile_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LazyDogUserModel',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('core.dogusermodel',),
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 20:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_lazydogusermodel'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='authtokenmodel',
+            name='expires',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
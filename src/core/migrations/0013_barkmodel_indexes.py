@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-17 20:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_revokedtokenmodel'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='barkmodel',
+            index=models.Index(fields=['created_at', 'id'], name='bark_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='barkmodel',
+            index=models.Index(fields=['sniff_count', 'created_at', 'id'], name='bark_sniffs_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='barkmodel',
+            index=models.Index(fields=['user', 'sniff_count'], name='bark_user_sniffs_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations
+
+# FTS5 external-content indexes over the searchable columns (see
+# common/search.py). The indexes only store the tokens; rows are tied to the
+# source table by its implicit rowid, and triggers keep them in sync.
+SEARCH_TABLES = {
+    "core_barkmodel": ("message",),
+    "core_dogusermodel": ("username", "favorite_toy"),
+}
+
+
+def create_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for table, columns in SEARCH_TABLES.items():
+        fts = f"{table}_fts"
+        column_list = ", ".join(columns)
+        new_values = ", ".join(f"new.{column}" for column in columns)
+        old_values = ", ".join(f"old.{column}" for column in columns)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {fts} USING fts5("
+            f"{column_list}, content='{table}', content_rowid='rowid', tokenize='porter unicode61', prefix='2 3')"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {fts}_insert AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.rowid, {new_values}); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {fts}_delete AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.rowid, {old_values}); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {fts}_update AFTER UPDATE OF {column_list} ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.rowid, {old_values}); "
+            f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.rowid, {new_values}); END"
+        )
+        # Index the rows that already exist
+        schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def drop_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for table in SEARCH_TABLES:
+        fts = f"{table}_fts"
+        for trigger in ("insert", "delete", "update"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {fts}_{trigger}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {fts}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_barkmodel_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
@@ -0,0 +1,136 @@
+import importlib
+import core.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Re-key the FTS5 indexes from 0014: they were external-content tables tied
+# to the implicit rowid of the (UUID primary key) source tables, which
+# VACUUM and table remakes renumber. Each index now stores its own copy of
+# the text, with rowids taken from <table>_fts_keys: an INTEGER PRIMARY KEY
+# per UUID primary key. The SQL is spelled out here rather than taken from
+# common/search.py, so later changes there don't change this migration.
+# The unmanaged models let querysets join the indexes through relations.
+SEARCH_TABLES = {
+    "core_barkmodel": ("message",),
+    "core_dogusermodel": ("username", "favorite_toy"),
+}
+
+
+def drop_search_tables(schema_editor, keys=False):
+    for table in SEARCH_TABLES:
+        fts = f"{table}_fts"
+        for trigger in ("insert", "delete", "update"):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS "{fts}_{trigger}"')
+        schema_editor.execute(f'DROP TABLE IF EXISTS "{fts}"')
+        if keys:
+            schema_editor.execute(f'DROP TABLE IF EXISTS "{fts}_keys"')
+
+
+def create_keyed_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    drop_search_tables(schema_editor)
+    for table, columns in SEARCH_TABLES.items():
+        fts = f"{table}_fts"
+        keys = f"{fts}_keys"
+        column_list = ", ".join(columns)
+        new_values = ", ".join(f"new.{column}" for column in columns)
+        assignments = ", ".join(f"{column} = new.{column}" for column in columns)
+        source_columns = ", ".join(f'"{table}"."{column}"' for column in columns)
+        schema_editor.execute(
+            f'CREATE TABLE IF NOT EXISTS "{keys}" ("key" integer NOT NULL PRIMARY KEY, "id" char(32) NOT NULL UNIQUE)'
+        )
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS "{fts}" USING fts5('
+            f"{column_list}, tokenize='porter unicode61', prefix='2 3')"
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER IF NOT EXISTS "{fts}_insert" AFTER INSERT ON "{table}" BEGIN '
+            f'INSERT INTO "{keys}"("id") VALUES (new.id); '
+            f'INSERT INTO "{fts}"(rowid, {column_list}) '
+            f'VALUES ((SELECT "key" FROM "{keys}" WHERE "id" = new.id), {new_values}); END'
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER IF NOT EXISTS "{fts}_delete" AFTER DELETE ON "{table}" BEGIN '
+            f'DELETE FROM "{fts}" WHERE rowid = (SELECT "key" FROM "{keys}" WHERE "id" = old.id); '
+            f'DELETE FROM "{keys}" WHERE "id" = old.id; END'
+        )
+        schema_editor.execute(
+            f'CREATE TRIGGER IF NOT EXISTS "{fts}_update" AFTER UPDATE OF {column_list} ON "{table}" BEGIN '
+            f'UPDATE "{fts}" SET {assignments} WHERE rowid = (SELECT "key" FROM "{keys}" WHERE "id" = old.id); END'
+        )
+        # Index the rows that already exist
+        schema_editor.execute(f'DELETE FROM "{fts}"')
+        schema_editor.execute(f'DELETE FROM "{keys}"')
+        schema_editor.execute(f'INSERT INTO "{keys}"("id") SELECT "id" FROM "{table}"')
+        schema_editor.execute(
+            f'INSERT INTO "{fts}"(rowid, {column_list}) '
+            f'SELECT "{keys}"."key", {source_columns} '
+            f'FROM "{table}" JOIN "{keys}" ON "{keys}"."id" = "{table}"."id"'
+        )
+
+
+def restore_rowid_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    drop_search_tables(schema_editor, keys=True)
+    importlib.import_module("core.migrations.0014_search_fts").create_search_tables(apps, schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_search_fts'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_keyed_search_tables, restore_rowid_search_tables),
+        migrations.CreateModel(
+            name='BarkSearchKeyModel',
+            fields=[
+                ('key', models.IntegerField(primary_key=True, serialize=False)),
+            ],
+            options={
+                'db_table': 'core_barkmodel_fts_keys',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DogUserSearchKeyModel',
+            fields=[
+                ('key', models.IntegerField(primary_key=True, serialize=False)),
+            ],
+            options={
+                'db_table': 'core_dogusermodel_fts_keys',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='BarkSearchModel',
+            fields=[
+                ('rank', models.FloatField()),
+                ('key', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='entry', serialize=False, to='core.barksearchkeymodel')),
+                ('document', core.models.SearchDocumentField(db_column='core_barkmodel_fts')),
+            ],
+            options={
+                'db_table': 'core_barkmodel_fts',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DogUserSearchModel',
+            fields=[
+                ('rank', models.FloatField()),
+                ('key', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='entry', serialize=False, to='core.dogusersearchkeymodel')),
+                ('document', core.models.SearchDocumentField(db_column='core_dogusermodel_fts')),
+            ],
+            options={
+                'db_table': 'core_dogusermodel_fts',
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+    ]
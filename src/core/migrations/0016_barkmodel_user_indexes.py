@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-17 23:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_search_fts_keys'),
+    ]
+
+    operations = [
+        # Add the composite index first so user lookups stay indexed throughout
+        migrations.AddIndex(
+            model_name='barkmodel',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='bark_user_created_idx'),
+        ),
+        migrations.AlterField(
+            model_name='barkmodel',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='barks', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
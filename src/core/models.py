@@ -31,12 +31,33 @@ class DogUserModel(AbstractUser, BaseModel):
         return self.username
 
 
+class LazyDogUserModel(DogUserModel):
+    """
+    Dog user rebuilt from JWT claims without a query.
+
+    Fields missing from the claims are deferred; touching any of them loads
+    all of the remaining columns in a single query.
+    """
+
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = deferred
+        return super().refresh_from_db(
+            using=using, fields=fields, from_queryset=from_queryset
+        )
+
 
 class BarkModel(BaseModel):
     """Model representing a bark made by a dog."""
 
+    # Lookups by user are served by the composite indexes below, which lead
+    # with user_id, so the FK doesn't need an index of its own
     user = models.ForeignKey(
-        DogUserModel, on_delete=models.CASCADE, related_name="barks"
+        DogUserModel, on_delete=models.CASCADE, related_name="barks", db_index=False
     )
     message = models.CharField(max_length=200)
     sniff_count = models.PositiveIntegerField(default=0)
@@ -44,6 +65,16 @@ class BarkModel(BaseModel):
     class Meta:
         verbose_name = "Bark"
         verbose_name_plural = "Barks"
+        indexes = [
+            # Newest/oldest feeds, paged on (created_at, id)
+            models.Index(fields=["created_at", "id"], name="bark_created_idx"),
+            # Trending and order_by=sniff_count, paged on (sniff_count, created_at, id)
+            models.Index(fields=["sniff_count", "created_at", "id"], name="bark_sniffs_created_idx"),
+            # A user's most sniffed barks (top barks export)
+            models.Index(fields=["user", "sniff_count"], name="bark_user_sniffs_idx"),
+            # A user's barks oldest first (full history export), paged on (created_at, id)
+            models.Index(fields=["user", "created_at", "id"], name="bark_user_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.message[:20]}..."
@@ -66,7 +97,7 @@ class AuthTokenModel(BaseModel):
     token_type = models.CharField(
         max_length=10, choices=TOKEN_TYPE_CHOICES, default=TOKEN_TYPE_ACCESS
     )
-    expires = models.DateTimeField(null=True, blank=True)
+    expires = models.DateTimeField(null=True, blank=True, db_index=True)
     is_active = models.BooleanField(default=True)
 
     class Meta:
@@ -79,14 +110,18 @@ class AuthTokenModel(BaseModel):
             self.key = self.generate_key()
 
         if self.expires is None:
-            if self.token_type == self.TOKEN_TYPE_ACCESS:
-                self.expires = timezone.now() + timezone.timedelta(hours=4)
-            else:
-                self.expires = timezone.now() + timezone.timedelta(days=7)
+            self.expires = self.default_expires(self.token_type)
 
         return super().save(*args, **kwargs)
 
-    def generate_key(self):
+    @classmethod
+    def default_expires(cls, token_type):
+        if token_type == cls.TOKEN_TYPE_ACCESS:
+            return timezone.now() + timezone.timedelta(hours=4)
+        return timezone.now() + timezone.timedelta(days=7)
+
+    @staticmethod
+    def generate_key():
         return binascii.hexlify(os.urandom(20)).decode()
 
     def is_expired(self):
@@ -119,3 +154,101 @@ class UserSniffModel(BaseModel):
 
     def __str__(self):
         return f"{self.user.username} sniffed {self.bark.message[:15]}..."
+
+
+class RevokedTokenModel(BaseModel):
+    """Records a revoked JWT by its jti claim until the token would have expired."""
+
+    jti = models.CharField(max_length=32, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Revoked Token"
+        verbose_name_plural = "Revoked Tokens"
+
+    def __str__(self):
+        return f"Revoked token {self.jti[:6]}..."
+
+
+class SearchMatch(models.Lookup):
+    """document__match="..." runs an FTS5 full-text query"""
+
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", (*lhs_params, *rhs_params)
+
+
+class SearchDocumentField(models.TextField):
+    """The hidden column of an FTS5 table, named after the table, that MATCH searches"""
+
+
+SearchDocumentField.register_lookup(SearchMatch)
+
+
+class SearchKeyModel(models.Model):
+    """
+    Base of the unmanaged models over <table>_fts_keys, which gives every
+    indexed row a stable integer key that its FTS5 index row uses as rowid
+    (see common/search.py). The tables are created by migration 0015.
+    """
+
+    key = models.IntegerField(primary_key=True)
+
+    class Meta:
+        abstract = True
+        managed = False
+
+
+class SearchIndexModel(models.Model):
+    """Base of the unmanaged models over the <table>_fts FTS5 indexes"""
+
+    rank = models.FloatField()
+
+    class Meta:
+        abstract = True
+        managed = False
+
+
+class BarkSearchKeyModel(SearchKeyModel):
+    bark = models.OneToOneField(
+        BarkModel, db_column="id", db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name="search_key",
+    )
+
+    class Meta(SearchKeyModel.Meta):
+        db_table = "core_barkmodel_fts_keys"
+
+
+class BarkSearchModel(SearchIndexModel):
+    key = models.OneToOneField(
+        BarkSearchKeyModel, primary_key=True, db_column="rowid", db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name="entry",
+    )
+    document = SearchDocumentField(db_column="core_barkmodel_fts")
+
+    class Meta(SearchIndexModel.Meta):
+        db_table = "core_barkmodel_fts"
+
+
+class DogUserSearchKeyModel(SearchKeyModel):
+    user = models.OneToOneField(
+        DogUserModel, db_column="id", db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name="search_key",
+    )
+
+    class Meta(SearchKeyModel.Meta):
+        db_table = "core_dogusermodel_fts_keys"
+
+
+class DogUserSearchModel(SearchIndexModel):
+    key = models.OneToOneField(
+        DogUserSearchKeyModel, primary_key=True, db_column="rowid", db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name="entry",
+    )
+    document = SearchDocumentField(db_column="core_dogusermodel_fts")
+
+    class Meta(SearchIndexModel.Meta):
+        db_table = "core_dogusermodel_fts"
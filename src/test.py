@@ -1,4 +1,9 @@
-from django.test import TestCase
+from unittest import skipUnless
+from unittest.mock import patch
+from django.db import connection
+from django.core.signing import TimestampSigner
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from ninja.testing import TestClient
 from api.endpoints.barks import router as barks_router
 
@@ -23,3 +28,1515 @@ class TestBarking(TestCase):
                 "[{'id':1, 'message': 'bark one!'}, {'id':2, 'message': 'bark two!'}, {'id':3, 'message': 'bark three!'}]"
             ),
         )
+
+
+class TestTokenAuthCache(TestCase):
+    def setUp(self):
+        from common.auth.token import token_cache
+        from core.models import DogUserModel
+
+        token_cache.clear()
+        DogUserModel.objects.create_user(username="rex", password="woofwoof")
+
+    def login(self):
+        response = self.client.post(
+            "/api/auth/token/",
+            {"username": "rex", "password": "woofwoof"},
+            content_type="application/json",
+        )
+        return response.json()["access_token"]
+
+    def test_cached_token_is_invalidated_on_login(self):
+        from common.auth.token import token_cache
+
+        old_token = self.login()
+        headers = {"Authorization": f"Bearer {old_token}"}
+        self.assertEqual(self.client.get("/api/users/me/", headers=headers).status_code, 200)
+        self.assertEqual(self.client.get("/api/users/me/", headers=headers).status_code, 200)
+        self.assertEqual(token_cache.stats()["hits"], 1)
+
+        self.login()
+        self.assertEqual(self.client.get("/api/users/me/", headers=headers).status_code, 401)
+
+    def test_profile_edits_are_not_reverted_by_the_cached_user(self):
+        from core.models import DogUserModel
+
+        headers = {"Authorization": f"Bearer {self.login()}"}
+        self.client.get("/api/users/me/", headers=headers)  # cache the token
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch("/api/users/me/", {"username": "max2"}, content_type="application/json", headers=headers)
+        self.assertEqual(self.client.get("/api/users/me/", headers=headers).json()["username"], "max2")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch("/api/users/me/", {"favorite_toy": "stick"}, content_type="application/json", headers=headers)
+        user = DogUserModel.objects.get()
+        self.assertEqual((user.username, user.favorite_toy), ("max2", "stick"))
+
+    def test_other_workers_invalidations_reach_the_cache(self):
+        from django.core.cache import caches
+        from common.auth.token import _version_key
+        from core.models import DogUserModel
+
+        headers = {"Authorization": f"Bearer {self.login()}"}
+        self.assertEqual(self.client.get("/api/users/me/", headers=headers).status_code, 200)
+        user = DogUserModel.objects.get()
+        # Another worker deactivates the user and bumps the shared version
+        DogUserModel.objects.filter(id=user.id).update(is_active=False)
+        caches["shared"].incr(_version_key(user.id))
+
+        self.assertEqual(self.client.get("/api/users/me/", headers=headers).status_code, 401)
+
+    def test_deactivation_and_token_deletion_outside_the_api(self):
+        from core.models import AuthTokenModel, DogUserModel
+
+        headers = {"Authorization": f"Bearer {self.login()}"}
+        self.client.get("/api/users/me/", headers=headers)  # cache the token
+        with self.captureOnCommitCallbacks(execute=True):
+            AuthTokenModel.objects.get(token_type=AuthTokenModel.TOKEN_TYPE_ACCESS).delete()
+        self.assertEqual(self.client.get("/api/users/me/", headers=headers).status_code, 401)
+
+        headers = {"Authorization": f"Bearer {self.login()}"}
+        self.client.get("/api/users/me/", headers=headers)
+        user = DogUserModel.objects.get()
+        user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertEqual(self.client.get("/api/users/me/", headers=headers).status_code, 401)
+
+
+class TestBearerAuthDispatch(TestCase):
+    def setUp(self):
+        from common.auth.token import token_cache
+        from core.models import AuthTokenModel, DogUserModel
+
+        token_cache.clear()
+        self.user = DogUserModel.objects.create_user(username="fido", password="woofwoof")
+        self.opaque_token = AuthTokenModel.objects.create(user=self.user).key
+
+    def test_jwt_skips_token_table(self):
+        from common.auth.jwt_auth import create_jwt
+
+        token = create_jwt(self.user.id, "access")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/users/me/", headers={"Authorization": f"Bearer {token}"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any("core_authtokenmodel" in q["sql"] for q in queries.captured_queries))
+
+    def test_opaque_token_skips_jwt_decode(self):
+        with patch("common.auth.jwt_auth.JWTAuth.authenticate") as jwt_authenticate:
+            response = self.client.get(
+                "/api/users/me/", headers={"Authorization": f"Bearer {self.opaque_token}"}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        jwt_authenticate.assert_not_called()
+
+    def test_malformed_token_runs_no_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/users/me/", headers={"Authorization": "Bearer not-a-token"})
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(len(queries), 0)
+
+
+@override_settings(JWT_STATELESS_PRINCIPAL=True)
+class TestStatelessJWTPrincipal(TestCase):
+    def setUp(self):
+        from common.auth.revocation import revocation_store
+        from core.models import DogUserModel
+
+        # Build the denylist up front so it isn't counted as a request query
+        revocation_store.load()
+        DogUserModel.objects.create_user(username="lassie", password="woofwoof", favorite_toy="ball")
+        response = self.client.post(
+            "/api/auth/jwt-token/",
+            {"username": "lassie", "password": "woofwoof"},
+            content_type="application/json",
+        )
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def test_me_runs_no_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/users/me/", headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["favorite_toy"], "ball")
+        self.assertEqual(len(queries), 0)
+
+    def test_unclaimed_field_loads_rest_of_row_once(self):
+        from common.auth.jwt_auth import JWTAuth
+
+        user = JWTAuth().authenticate(None, self.headers["Authorization"].split()[1])
+        with CaptureQueriesContext(connection) as queries:
+            user.email, user.date_joined, user.is_active
+
+        self.assertEqual(len(queries), 1)
+
+    def test_update_me_saves_principal(self):
+        response = self.client.patch(
+            "/api/users/me/", {"favorite_toy": "stick"}, content_type="application/json", headers=self.headers
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["favorite_toy"], "stick")
+        self.assertEqual(
+            self.client.post("/api/barks/", {"message": "woof"}, content_type="application/json", headers=self.headers).status_code,
+            201,
+        )
+
+    def test_stale_claims_are_not_served(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(
+                "/api/users/me/", {"favorite_toy": "stick"}, content_type="application/json", headers=self.headers
+            )
+
+        response = self.client.get("/api/users/me/", headers=self.headers)
+        self.assertEqual(response.json()["favorite_toy"], "stick")
+
+    def test_inactive_and_deleted_users_are_rejected(self):
+        from common.auth.jwt_auth import invalidate_user_version
+        from core.models import DogUserModel
+
+        user = DogUserModel.objects.get(username="lassie")
+        DogUserModel.objects.filter(id=user.id).update(is_active=False)
+        # Another process deactivated the user; this one notices once the cached version expires
+        self.assertEqual(self.client.get("/api/users/me/", headers=self.headers).status_code, 200)
+        invalidate_user_version(user.id)
+        self.assertEqual(self.client.get("/api/users/me/", headers=self.headers).status_code, 401)
+
+        DogUserModel.objects.filter(id=user.id).update(is_active=True)
+        invalidate_user_version(user.id)
+        self.assertEqual(self.client.get("/api/users/me/", headers=self.headers).status_code, 200)
+        DogUserModel.objects.filter(id=user.id).delete()
+        invalidate_user_version(user.id)
+        self.assertEqual(self.client.get("/api/users/me/", headers=self.headers).status_code, 401)
+
+
+class TestJWTCache(TestCase):
+    def setUp(self):
+        from common.auth.jwt_auth import jwt_cache
+
+        jwt_cache.clear()
+
+    def test_repeat_token_skips_signature_check(self):
+        from common.auth.jwt_auth import create_jwt, decode_jwt, jwt_cache
+
+        token = create_jwt("user-id", "access")
+        decode_jwt(token)
+        with patch("jwt.decode") as jwt_decode:
+            self.assertEqual(decode_jwt(token)["user_id"], "user-id")
+
+        jwt_decode.assert_not_called()
+        self.assertEqual(jwt_cache.stats()["hits"], 1)
+
+    def test_cached_token_rejected_after_expiry(self):
+        import time
+        import jwt
+        from common.auth.jwt_auth import create_jwt, decode_jwt
+
+        token = create_jwt("user-id", "access")
+        decode_jwt(token)
+        with patch("time.time", return_value=time.time() + 5 * 60 * 60):
+            with self.assertRaises(jwt.ExpiredSignatureError):
+                decode_jwt(token)
+
+
+class TestTokenRotation(TestCase):
+    def setUp(self):
+        from core.models import DogUserModel
+
+        DogUserModel.objects.create_user(username="spot", password="woofwoof")
+
+    def login(self):
+        return self.client.post(
+            "/api/auth/token/",
+            {"username": "spot", "password": "woofwoof"},
+            content_type="application/json",
+        ).json()
+
+    def test_login_rotates_tokens_in_three_queries(self):
+        from core.models import AuthTokenModel
+
+        first = self.login()
+        with CaptureQueriesContext(connection) as queries:
+            second = self.login()
+
+        statements = [q["sql"] for q in queries.captured_queries if "SAVEPOINT" not in q["sql"]]
+        self.assertLessEqual(len(statements), 3)
+        self.assertEqual(
+            set(AuthTokenModel.objects.values_list("key", flat=True)),
+            {second["access_token"], second["refresh_token"]},
+        )
+        self.assertNotEqual(first["access_token"], second["access_token"])
+
+    def test_rotated_tokens_have_their_rows_ids(self):
+        from api.logic.auth_logic import rotate_auth_tokens
+        from core.models import AuthTokenModel, DogUserModel
+
+        self.login()
+        access, refresh = rotate_auth_tokens(DogUserModel.objects.get(username="spot"))
+
+        self.assertEqual(AuthTokenModel.objects.get(id=access.id).key, access.key)
+        self.assertEqual(AuthTokenModel.objects.get(id=refresh.id).key, refresh.key)
+
+    def test_refresh_rotates_tokens(self):
+        tokens = self.login()
+        response = self.client.post(
+            "/api/auth/token/refresh/", {"refresh_token": tokens["refresh_token"]}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post(
+            "/api/auth/token/refresh/", {"refresh_token": tokens["refresh_token"]}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 401)
+
+
+class TestPasswordPoolBackpressure(TestCase):
+    def test_saturated_pool_returns_503(self):
+        import threading
+        from common.auth.passwords import password_pool
+
+        full = threading.BoundedSemaphore(1)
+        full.acquire()
+        with patch.object(password_pool, "workers", 1), patch.object(password_pool, "_slots", full):
+            response = self.client.post(
+                "/api/users/", {"username": "busy", "password": "woofwoof"}, content_type="application/json"
+            )
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], str(password_pool.retry_after))
+
+    def test_tests_hash_inline(self):
+        from common.auth.passwords import password_pool
+
+        self.client.post("/api/users/", {"username": "inline", "password": "woofwoof"}, content_type="application/json")
+        self.assertEqual(password_pool.workers, 0)
+        self.assertIsNone(password_pool._executor)
+
+
+class TestPurgeExpiredTokens(TestCase):
+    def test_purges_only_expired_and_inactive_tokens(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from core.models import AuthTokenModel, DogUserModel
+
+        past = timezone.now() - timezone.timedelta(minutes=1)
+        users = [DogUserModel.objects.create_user(username=f"dog{i}") for i in range(5)]
+        AuthTokenModel.objects.create(user=users[0], expires=past)
+        AuthTokenModel.objects.create(user=users[1], token_type=AuthTokenModel.TOKEN_TYPE_REFRESH, expires=past)
+        AuthTokenModel.objects.create(user=users[2], is_active=False)
+        live = AuthTokenModel.objects.create(user=users[3])
+
+        out = StringIO()
+        call_command("purge_expired_tokens", batch_size=1, pause=0, stdout=out)
+
+        self.assertEqual(list(AuthTokenModel.objects.values_list("id", flat=True)), [live.id])
+        self.assertIn("Deleted 3 tokens", out.getvalue())
+
+
+class TestJWTRevocation(TestCase):
+    def setUp(self):
+        from common.auth.revocation import revocation_store
+        from core.models import DogUserModel
+
+        revocation_store.reset()
+        DogUserModel.objects.create_user(username="benji", password="woofwoof")
+        self.tokens = self.client.post(
+            "/api/auth/jwt-token/", {"username": "benji", "password": "woofwoof"}, content_type="application/json"
+        ).json()
+
+    def refresh(self):
+        return self.client.post(
+            "/api/auth/jwt-token/refresh/", {"refresh_token": self.tokens["refresh_token"]}, content_type="application/json"
+        )
+
+    def test_refresh_token_is_single_use(self):
+        self.assertEqual(self.refresh().status_code, 200)
+        self.assertEqual(self.refresh().status_code, 401)
+
+    def test_revoked_access_token_is_rejected(self):
+        import jwt
+        from django.utils import timezone
+        from common.auth.revocation import revocation_store
+
+        headers = {"Authorization": f"Bearer {self.tokens['access_token']}"}
+        self.assertEqual(self.client.get("/api/users/me/", headers=headers).status_code, 200)
+
+        payload = jwt.decode(self.tokens["access_token"], options={"verify_signature": False})
+        revocation_store.revoke(payload["jti"], expires_at=timezone.now() + timezone.timedelta(hours=4))
+        self.assertEqual(self.client.get("/api/users/me/", headers=headers).status_code, 401)
+
+    def test_unrevoked_check_runs_no_queries(self):
+        from common.auth.revocation import revocation_store
+
+        revocation_store.is_revoked("warm-up")
+        with CaptureQueriesContext(connection) as queries:
+            for i in range(100):
+                revocation_store.is_revoked(f"never-revoked-{i}")
+
+        self.assertEqual(len(queries), 0)
+
+    def test_sync_picks_up_other_processes_revocations(self):
+        from django.utils import timezone
+        from common.auth.revocation import revocation_store
+        from core.models import RevokedTokenModel
+
+        revocation_store.load()
+        RevokedTokenModel.objects.create(jti="elsewhere", expires_at=timezone.now() + timezone.timedelta(hours=4))
+        self.assertFalse(revocation_store.is_revoked("elsewhere"))
+
+        with CaptureQueriesContext(connection) as queries:
+            revocation_store.sync()
+
+        self.assertEqual(len(queries), 1)
+        self.assertIn('"created_at" >=', queries[0]["sql"])
+        self.assertTrue(revocation_store.is_revoked("elsewhere"))
+
+
+class TestConcurrentSniffs(TransactionTestCase):
+    def sniff_concurrently(self, bark, users):
+        import threading
+        from django.db import OperationalError, connections
+        from api.logic.exceptions import DuplicateResourceError
+        from api.logic.sniff_logic import handle_create_sniff
+
+        results = []
+        start = threading.Barrier(len(users))
+
+        def sniff(user):
+            start.wait()
+            try:
+                while True:
+                    try:
+                        handle_create_sniff(bark_id=bark.id, user=user)
+                        results.append("sniffed")
+                        return
+                    except DuplicateResourceError:
+                        results.append("duplicate")
+                        return
+                    except OperationalError:
+                        # SQLite reports lock contention instead of waiting; try again
+                        continue
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=sniff, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_no_lost_increments(self):
+        from core.models import BarkModel, DogUserModel, UserSniffModel
+
+        users = [DogUserModel.objects.create_user(username=f"pup{i}") for i in range(20)]
+        bark = BarkModel.objects.create(user=users[0], message="viral")
+
+        results = self.sniff_concurrently(bark, users)
+
+        # A retry after a lock error may land as "duplicate" if the first try committed
+        bark.refresh_from_db()
+        self.assertEqual(len(results), 20)
+        self.assertEqual(UserSniffModel.objects.filter(bark=bark).count(), 20)
+        self.assertEqual(bark.sniff_count, 20)
+
+    def test_duplicate_sniffs_count_once(self):
+        from core.models import BarkModel, DogUserModel
+
+        user = DogUserModel.objects.create_user(username="eager")
+        bark = BarkModel.objects.create(user=user, message="sniff me")
+
+        results = self.sniff_concurrently(bark, [user] * 5)
+
+        bark.refresh_from_db()
+        self.assertLessEqual(results.count("sniffed"), 1)
+        self.assertEqual(bark.sniff_count, 1)
+
+    def test_edit_keeps_increments_made_after_its_read(self):
+        from django.db.models import F
+        from api.logic.bark_logic import handle_update_bark
+        from core.models import BarkModel, DogUserModel
+
+        user = DogUserModel.objects.create_user(username="editor")
+        bark = BarkModel.objects.create(user=user, message="typo")
+        save = BarkModel.save
+
+        def sniffed_before_save(instance, *args, **kwargs):
+            BarkModel.objects.filter(id=instance.id).update(sniff_count=F("sniff_count") + 1)
+            save(instance, *args, **kwargs)
+
+        with patch.object(BarkModel, "save", autospec=True, side_effect=sniffed_before_save):
+            handle_update_bark(bark.id, user, {"message": "fixed"})
+
+        bark.refresh_from_db()
+        self.assertEqual((bark.message, bark.sniff_count), ("fixed", 1))
+
+
+@override_settings(SNIFF_COUNT_WRITE_BEHIND=True)
+class TestSniffCountWriteBehind(TestCase):
+    def setUp(self):
+        from common.auth.token import token_cache
+        from core.models import AuthTokenModel, BarkModel, DogUserModel
+
+        token_cache.clear()
+        user = DogUserModel.objects.create_user(username="buddy")
+        self.bark = BarkModel.objects.create(user=user, message="hot bark")
+        self.headers = {"Authorization": f"Bearer {AuthTokenModel.objects.create(user=user).key}"}
+
+    def test_counts_overlay_until_flushed(self):
+        from common.counters import sniff_count_buffer
+
+        self.addCleanup(sniff_count_buffer.flush)
+        with patch.object(sniff_count_buffer, "flush_interval", 3600), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/sniffs/", {"bark_id": str(self.bark.id)}, content_type="application/json", headers=self.headers
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.bark.refresh_from_db()
+        self.assertEqual(self.bark.sniff_count, 0)
+        self.assertEqual(self.client.get(f"/api/barks/{self.bark.id}/").json()["sniff_count"], 1)
+
+        sniff_count_buffer.flush()
+        self.bark.refresh_from_db()
+        self.assertEqual(self.bark.sniff_count, 1)
+        self.assertEqual(self.client.get(f"/api/barks/{self.bark.id}/").json()["sniff_count"], 1)
+
+
+class TestBulkSniffs(TestCase):
+    def setUp(self):
+        from common.auth.token import token_cache
+        from core.models import AuthTokenModel, BarkModel, DogUserModel
+
+        token_cache.clear()
+        self.user = DogUserModel.objects.create_user(username="scout")
+        self.barks = BarkModel.objects.bulk_create(BarkModel(user=self.user, message=f"bark {i}") for i in range(100))
+        self.headers = {"Authorization": f"Bearer {AuthTokenModel.objects.create(user=self.user).key}"}
+
+    def bulk_sniff(self, bark_ids):
+        return self.client.post(
+            "/api/sniffs/bulk/",
+            {"bark_ids": [str(bark_id) for bark_id in bark_ids]},
+            content_type="application/json",
+            headers=self.headers,
+        )
+
+    def test_batch_of_100_uses_constant_queries(self):
+        import uuid
+        from core.models import BarkModel
+
+        self.bulk_sniff([bark.id for bark in self.barks[:10]])
+        missing = uuid.uuid4()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.bulk_sniff([bark.id for bark in self.barks[:99]] + [missing])
+
+        statements = [q["sql"] for q in queries.captured_queries if "SAVEPOINT" not in q["sql"]]
+        self.assertLessEqual(len(statements), 5)
+        statuses = [result["status"] for result in response.json()["results"]]
+        self.assertEqual(statuses, ["already_sniffed"] * 10 + ["sniffed"] * 89 + ["not_found"])
+        self.assertEqual(BarkModel.objects.filter(sniff_count=1).count(), 99)
+
+    def test_rejects_oversized_batch(self):
+        import uuid
+
+        response = self.bulk_sniff([uuid.uuid4() for _ in range(101)])
+        self.assertEqual(response.status_code, 422)
+
+
+class TestReconcileSniffCounts(TestCase):
+    def test_repairs_only_drifted_barks(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from common.page_cache import PARTITION_SNIFFS
+        from common.trending import trending_index
+        from core.models import BarkModel, DogUserModel, UserSniffModel
+
+        trending_index.reset()
+        self.addCleanup(trending_index.reset)
+        users = [DogUserModel.objects.create_user(username=f"hound{i}") for i in range(3)]
+        barks = [BarkModel.objects.create(user=users[0], message=f"bark {i}") for i in range(5)]
+        for user in users:
+            UserSniffModel.objects.create(user=user, bark=barks[0])
+        UserSniffModel.objects.create(user=users[0], bark=barks[1])
+        BarkModel.objects.filter(id=barks[0].id).update(sniff_count=1)
+        BarkModel.objects.filter(id=barks[1].id).update(sniff_count=1)
+        BarkModel.objects.filter(id=barks[2].id).update(sniff_count=4)
+
+        trending_index.refresh()
+        self.assertFalse(trending_index._is_stale())
+        out = StringIO()
+        with patch("core.management.commands.reconcile_sniff_counts.page_cache.bump") as bump:
+            call_command("reconcile_sniff_counts", chunk_size=2, stdout=out)
+
+        counts = dict(BarkModel.objects.values_list("id", "sniff_count"))
+        self.assertEqual([counts[bark.id] for bark in barks], [3, 1, 0, 0, 0])
+        # Cached pages and the trending ranking are invalidated along with the repair
+        self.assertTrue(bump.called)
+        self.assertEqual({call.args for call in bump.call_args_list}, {(PARTITION_SNIFFS,)})
+        self.assertTrue(trending_index._is_stale())
+        self.assertIn("Repaired 2 drifted of 5 barks", out.getvalue())
+        self.assertIn("max drift: 4", out.getvalue())
+
+
+@override_settings(PAGE_CACHE_ENABLED=False)
+class TestSniffedByMe(TestCase):
+    def setUp(self):
+        from common.auth.token import token_cache
+        from core.models import AuthTokenModel, BarkModel, DogUserModel, UserSniffModel
+
+        token_cache.clear()
+        self.user = DogUserModel.objects.create_user(username="max")
+        barks = BarkModel.objects.bulk_create(BarkModel(user=self.user, message=f"bark {i}") for i in range(40))
+        UserSniffModel.objects.bulk_create(UserSniffModel(user=self.user, bark=bark) for bark in barks[::2])
+        self.headers = {"Authorization": f"Bearer {AuthTokenModel.objects.create(user=self.user).key}"}
+
+    def list_barks(self, limit, headers=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/api/barks/?limit={limit}", headers=headers or {})
+        return response, len(queries)
+
+    def test_flag_uses_constant_queries(self):
+        from core.models import UserSniffModel
+
+        self.list_barks(1, self.headers)  # warm the token cache
+        small, small_queries = self.list_barks(5, self.headers)
+        large, large_queries = self.list_barks(40, self.headers)
+
+        self.assertEqual(small_queries, large_queries)
+        sniffed = set(map(str, UserSniffModel.objects.values_list("bark_id", flat=True)))
+        for bark in large.json()["items"]:
+            self.assertEqual(bark["sniffed_by_me"], bark["id"] in sniffed)
+
+    def test_anonymous_gets_no_flag(self):
+        response, _ = self.list_barks(5)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()["items"][0]["sniffed_by_me"])
+
+    def test_sniff_response_is_flagged(self):
+        from core.models import BarkModel
+
+        bark = BarkModel.objects.create(user=self.user, message="fresh")
+        response = self.client.post("/api/sniffs/", {"bark_id": str(bark.id)}, content_type="application/json", headers=self.headers)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertIs(response.json()["sniffed_by_me"], True)
+
+
+class TestSkipPaginationCountModes(TestCase):
+    def setUp(self):
+        from core.models import BarkModel, DogUserModel
+
+        user = DogUserModel.objects.create_user(username="rex")
+        BarkModel.objects.bulk_create(BarkModel(user=user, message=f"bark {i}") for i in range(12))
+        self.queryset = BarkModel.objects.order_by("id")
+
+    def paginate(self, skip=0, per_page=5, **kwargs):
+        from common.pagination import SkipPagination
+
+        paginator = SkipPagination(**kwargs)
+        pagination = SkipPagination.Input(skip=skip, per_page=per_page)
+        with CaptureQueriesContext(connection) as queries:
+            page = paginator.paginate_queryset(self.queryset, pagination)
+        return page, len(queries)
+
+    def test_exact_counts_once(self):
+        page, queries = self.paginate(skip=10)
+
+        self.assertEqual(queries, 2)
+        self.assertEqual((page["total"], page["pages"], page["total_is_exact"]), (12, 3, True))
+        self.assertEqual(len(page["items"]), 2)
+        self.assertFalse(page["has_more"])
+
+    def test_estimate_caps_the_count(self):
+        page, _ = self.paginate(count_mode="estimate", count_cap=10)
+        self.assertEqual((page["total"], page["total_is_exact"]), (10, False))
+        self.assertTrue(page["has_more"])
+
+        page, _ = self.paginate(count_mode="estimate", count_cap=50)
+        self.assertEqual((page["total"], page["total_is_exact"]), (12, True))
+
+    def test_none_skips_the_count(self):
+        page, queries = self.paginate(skip=5, count_mode="none")
+
+        self.assertEqual(queries, 1)
+        self.assertIsNone(page["total"])
+        self.assertIsNone(page["pages"])
+        self.assertTrue(page["has_more"])
+        self.assertIsNotNone(page["previous"])
+
+
+@override_settings(PAGE_CACHE_ENABLED=False)
+class TestKeysetPagination(TestCase):
+    def setUp(self):
+        from django.utils import timezone
+        from core.models import BarkModel, DogUserModel
+
+        user = DogUserModel.objects.create_user(username="buddy")
+        barks = BarkModel.objects.bulk_create(BarkModel(user=user, message=f"bark {i}") for i in range(25))
+        # Plenty of ties on every key column except the id tiebreaker
+        BarkModel.objects.update(created_at=timezone.now())
+        for i, bark in enumerate(barks):
+            BarkModel.objects.filter(id=bark.id).update(sniff_count=i % 3)
+
+    def walk(self, url, direction="next"):
+        pages = []
+        while url:
+            response = self.client.get(url).json()
+            pages.append([bark["id"] for bark in response["items"]])
+            url = response[direction]
+        return pages
+
+    def test_pages_cover_every_bark_once_in_both_directions(self):
+        from core.models import BarkModel
+
+        orderings = (
+            ("", ("-created_at", "-id")),
+            ("order_by=sniff_count", ("sniff_count", "created_at", "id")),
+        )
+        for query, ordering in orderings:
+            forward = self.walk(f"/api/barks/?limit=4&{query}")
+            expected = [str(pk) for pk in BarkModel.objects.order_by(*ordering).values_list("id", flat=True)]
+            self.assertEqual([pk for page in forward for pk in page], expected)
+
+            last = self.client.get(f"/api/barks/?limit=4&{query}").json()
+            while last["next"]:
+                last = self.client.get(last["next"]).json()
+            backward = self.walk(last["previous"], "previous")
+            self.assertEqual(backward, forward[-2::-1])
+
+    def test_page_is_one_query_at_any_depth(self):
+        url = "/api/barks/?limit=4"
+        counts = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                url = self.client.get(url).json()["next"]
+            counts.append(len(queries))
+        self.assertEqual(set(counts), {1})
+
+    def test_unsupported_ordering_is_rejected(self):
+        from core.models import AuthTokenModel, DogUserModel
+
+        user = DogUserModel.objects.get(username="buddy")
+        DogUserModel.objects.create_user(username="rex", favorite_toy="ball")
+        headers = {"Authorization": f"Bearer {AuthTokenModel.objects.create(user=user).key}"}
+
+        self.assertEqual(self.client.get("/api/barks/?order_by=message").status_code, 422)
+        self.assertEqual(self.client.get("/api/users/?order_by=email", headers=headers).status_code, 422)
+        users = self.client.get("/api/users/?order_by=-favorite_toy", headers=headers).json()["items"]
+        self.assertEqual([user["username"] for user in users], ["rex", "buddy"])
+
+    def test_tampered_cursor_restarts(self):
+        first = self.client.get("/api/barks/?limit=4").json()
+        cursor = first["next_cursor"]
+        tampered = self.client.get(f"/api/barks/?limit=4&cursor={cursor[:-2]}xx").json()
+
+        self.assertEqual(tampered["items"], first["items"])
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN output is SQLite specific")
+@override_settings(PAGE_CACHE_ENABLED=False)
+class TestBarkQueryPlans(TestCase):
+    """
+    Every bark list filter/ordering (first and later pages) and the top barks
+    export must be served from an index: no full table scan of
+    core_barkmodel and no temp B-tree sort. A sort is only allowed over barks
+    looked up by key from a smaller driving set: the trending id list
+    (bounded by TRENDING_SIZE) or full-text search matches ranked by
+    relevance.
+    """
+
+    LIST_QUERIES = (
+        "",
+        "order_by=-created_at",
+        "order_by=created_at",
+        "order_by=sniff_count",
+        "order_by=-sniff_count",
+        "trending=true",
+        "message=woof",
+        "message=woof&order_by=sniff_count",
+    )
+
+    def setUp(self):
+        from common.trending import trending_index
+        from core.models import AuthTokenModel, BarkModel, DogUserModel
+
+        trending_index.reset()
+        self.addCleanup(trending_index.reset)
+        user = DogUserModel.objects.create_user(username="fido")
+        BarkModel.objects.bulk_create(
+            BarkModel(user=user, message=f"woof {i}", sniff_count=i % 4) for i in range(30)
+        )
+        self.headers = {"Authorization": f"Bearer {AuthTokenModel.objects.create(user=user).key}"}
+
+    def bark_queries(self, url, headers=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, headers=headers or {})
+        self.assertEqual(response.status_code, 200)
+        sql = [query["sql"] for query in queries if 'FROM "core_barkmodel"' in query["sql"]]
+        self.assertTrue(sql, f"No bark query captured for {url}")
+        return response, sql
+
+    def query_plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndex(self, url, sql, index):
+        plan = self.query_plan(sql)
+        self.assertTrue(any(f"INDEX {index}" in step for step in plan), f"{url} doesn't use {index}: {plan}\n{sql}")
+        self.assertIndexed(url, sql)
+
+    def assertIndexed(self, url, sql):
+        plan = self.query_plan(sql)
+        # The only sorts allowed: the trending id list, and full-text matches
+        trending_ids = "trending=true" in url and '"core_barkmodel"."id" IN (' in sql
+        fts_matches = any(step.startswith("SCAN core_barkmodel_fts VIRTUAL TABLE") for step in plan)
+        for step in plan:
+            if not (trending_ids or fts_matches):
+                self.assertNotIn("USE TEMP B-TREE", step, f"{url} sorts in a temp B-tree: {plan}\n{sql}")
+            self.assertFalse(
+                step.startswith("SCAN core_barkmodel") and "INDEX" not in step,
+                f"{url} scans core_barkmodel: {plan}\n{sql}",
+            )
+
+    def test_list_queries_use_indexes(self):
+        for query in self.LIST_QUERIES:
+            url = f"/api/barks/?limit=5&{query}"
+            response, sql = self.bark_queries(url)
+            for statement in sql:
+                self.assertIndexed(url, statement)
+
+            next_url = response.json()["next"]
+            self.assertIsNotNone(next_url, url)
+            _, sql = self.bark_queries(next_url)
+            for statement in sql:
+                self.assertIndexed(f"{url} (page 2)", statement)
+
+    @override_settings(TRENDING_MATERIALIZED=False)
+    def test_live_trending_uses_the_sniff_count_index(self):
+        url = "/api/barks/?limit=5&trending=true"
+        response, sql = self.bark_queries(url)
+        for statement in sql:
+            self.assertUsesIndex(url, statement, "bark_sniffs_created_idx")
+
+        _, sql = self.bark_queries(response.json()["next"])
+        for statement in sql:
+            self.assertUsesIndex(f"{url} (page 2)", statement, "bark_sniffs_created_idx")
+
+    def test_top_barks_export_uses_index(self):
+        _, sql = self.bark_queries("/api/barks/top-export/", self.headers)
+        for statement in sql:
+            self.assertUsesIndex("/api/barks/top-export/", statement, "bark_user_sniffs_idx")
+
+    def test_full_export_uses_index(self):
+        url = "/api/barks/export/"
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, headers=self.headers)
+            b"".join(response.streaming_content)
+        sql = [query["sql"] for query in queries if 'FROM "core_barkmodel"' in query["sql"]]
+        self.assertTrue(sql, f"No bark query captured for {url}")
+        for statement in sql:
+            self.assertUsesIndex(url, statement, "bark_user_created_idx")
+
+
+@override_settings(TRENDING_MATERIALIZED=True, PAGE_CACHE_ENABLED=False)
+class TestTrendingIndex(TestCase):
+    def setUp(self):
+        from django.utils import timezone
+        from common.trending import trending_index
+        from core.models import AuthTokenModel, BarkModel, DogUserModel
+
+        trending_index.reset()
+        self.addCleanup(trending_index.reset)
+        self.user = DogUserModel.objects.create_user(username="lassie")
+        self.barks = BarkModel.objects.bulk_create(
+            BarkModel(user=self.user, message=f"bark {i}", sniff_count=i) for i in range(4)
+        )
+        old = BarkModel.objects.create(user=self.user, message="old news", sniff_count=50)
+        BarkModel.objects.filter(id=old.id).update(created_at=timezone.now() - timezone.timedelta(days=2))
+        self.headers = {"Authorization": f"Bearer {AuthTokenModel.objects.create(user=self.user).key}"}
+
+    def trending(self):
+        return [bark["message"] for bark in self.client.get("/api/barks/?trending=true").json()["items"]]
+
+    def test_matches_the_live_query(self):
+        materialized = self.trending()
+        with override_settings(TRENDING_MATERIALIZED=False):
+            live = self.trending()
+
+        self.assertEqual(materialized, ["bark 3", "bark 2", "bark 1"])
+        self.assertEqual(materialized, live)
+
+    def test_list_is_capped_and_reports_the_cap(self):
+        from common.trending import trending_index
+
+        with patch.object(trending_index, "size", 2):
+            response = self.client.get("/api/barks/?trending=true")
+
+        self.assertEqual([bark["message"] for bark in response.json()["items"]], ["bark 3", "bark 2"])
+        self.assertEqual(response["X-Trending-Limit"], "2")
+        with override_settings(TRENDING_MATERIALIZED=False):
+            self.assertNotIn("X-Trending-Limit", self.client.get("/api/barks/?trending=true"))
+
+    def test_sniffs_update_the_ranking_without_a_refresh(self):
+        from api.logic.sniff_logic import handle_create_sniff
+        from common.trending import trending_index
+        from core.models import DogUserModel
+
+        self.trending()
+        refreshes = trending_index.stats()["refreshes"]
+        for i, bark in enumerate((self.barks[0], self.barks[1], self.barks[1])):
+            user = DogUserModel.objects.create_user(username=f"sniffer_{i}")
+            with self.captureOnCommitCallbacks(execute=True):
+                handle_create_sniff(bark_id=bark.id, user=user)
+
+        self.assertEqual(self.trending(), ["bark 3", "bark 1", "bark 2", "bark 0"])
+        self.assertEqual(trending_index.stats()["refreshes"], refreshes)
+
+    def test_barks_age_out_on_read(self):
+        from django.utils import timezone
+        from common.trending import trending_index
+
+        self.trending()
+        later = timezone.now() + timezone.timedelta(hours=25)
+        with patch("common.trending.timezone.now", return_value=later):
+            self.assertEqual(trending_index.ranked_ids(), [])
+
+    def test_stale_ranking_is_refreshed_on_read(self):
+        from core.models import BarkModel
+        from common.trending import trending_index
+
+        self.trending()
+        # A sniff recorded by another process only reaches the database
+        BarkModel.objects.filter(id=self.barks[0].id).update(sniff_count=10)
+        self.assertEqual(self.trending()[0], "bark 3")
+
+        with patch.object(trending_index, "max_staleness", 0):
+            self.assertEqual(self.trending()[0], "bark 0")
+
+    def test_sniffs_recorded_during_a_refresh_are_kept(self):
+        from common.trending import trending_index
+
+        snapshot = trending_index._load()
+        bark_0, _, bark_2, bark_3 = (bark.id for bark in self.barks)
+
+        def load_while_sniffing():
+            # The sniff and the delete commit after the snapshot was read
+            trending_index.record_sniffs({bark_0: self.barks[0].created_at}, delta=10)
+            trending_index.discard(bark_3)
+            return snapshot
+
+        with patch.object(trending_index, "_load", side_effect=load_while_sniffing):
+            trending_index.refresh()
+
+        self.assertEqual(trending_index.ranked_ids()[:2], [bark_0, bark_2])
+        self.assertNotIn(bark_3, trending_index.ranked_ids())
+
+    def test_concurrent_stale_reads_refresh_once(self):
+        import threading
+        import time
+        from common.trending import trending_index
+
+        def slow_refresh():
+            # Stands in for the database reload, which other threads can't see here
+            time.sleep(0.05)
+            with trending_index._lock:
+                trending_index._refreshed_at = time.monotonic()
+                trending_index.refreshes += 1
+
+        barrier = threading.Barrier(8)
+
+        def read():
+            barrier.wait()
+            trending_index.ranked_ids()
+
+        readers = [threading.Thread(target=read) for _ in range(8)]
+        with patch.object(trending_index, "_refresh", side_effect=slow_refresh):
+            for reader in readers:
+                reader.start()
+            for reader in readers:
+                reader.join()
+
+        stats = trending_index.stats()
+        self.assertEqual((stats["refreshes"], stats["stale_refreshes"], stats["reads"]), (1, 1, 8))
+
+
+@skipUnless(connection.vendor == "sqlite", "The FTS5 backend is SQLite only")
+@override_settings(PAGE_CACHE_ENABLED=False)
+class TestFullTextSearch(TestCase):
+    def setUp(self):
+        from core.models import BarkModel, DogUserModel
+
+        self.user = DogUserModel.objects.create_user(username="snoopy", favorite_toy="red ball")
+        DogUserModel.objects.create_user(username="ballerina", favorite_toy="rope")
+        DogUserModel.objects.create_user(username="spot", favorite_toy="squeaky bone")
+        self.barks = {
+            message: BarkModel.objects.create(user=self.user, message=message)
+            for message in (
+                "squirrel squirrel squirrel!",
+                "I saw a squirrel",
+                "the mailman is back",
+                "squirrels everywhere, then a nap",
+            )
+        }
+
+    def search_barks(self, query, **params):
+        response = self.client.get("/api/barks/", {"message": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_matches_word_prefixes_ordered_by_relevance(self):
+        messages = [bark["message"] for bark in self.search_barks("squirrel")["items"]]
+
+        self.assertEqual(set(messages), {"squirrel squirrel squirrel!", "I saw a squirrel", "squirrels everywhere, then a nap"})
+        self.assertEqual(messages[0], "squirrel squirrel squirrel!")
+        self.assertEqual([bark["message"] for bark in self.search_barks("squirrel nap")["items"]], ["squirrels everywhere, then a nap"])
+
+    def test_index_follows_updates_and_deletes(self):
+        from core.models import BarkModel
+
+        bark = self.barks["the mailman is back"]
+        bark.message = "the mailman brought a squirrel"
+        bark.save()
+        BarkModel.objects.filter(id=self.barks["I saw a squirrel"].id).delete()
+
+        messages = {bark["message"] for bark in self.search_barks("squirrel")["items"]}
+        self.assertIn("the mailman brought a squirrel", messages)
+        self.assertNotIn("I saw a squirrel", messages)
+        self.assertEqual(self.search_barks("mailman back")["items"], [])
+
+    def test_index_survives_renumbered_rowids_and_lost_triggers(self):
+        from common.search import restore_search_triggers
+        from core.models import BarkModel
+
+        with connection.cursor() as cursor:
+            # What VACUUM may do to a table without an INTEGER PRIMARY KEY
+            cursor.execute("UPDATE core_barkmodel SET rowid = rowid + 1000")
+            # What a migration that remakes the table does to its triggers
+            for trigger in ("insert", "delete", "update"):
+                cursor.execute(f"DROP TRIGGER core_barkmodel_fts_{trigger}")
+        self.assertEqual(len(self.search_barks("squirrel")["items"]), 3)
+
+        BarkModel.objects.filter(id=self.barks["the mailman is back"].id).update(message="the mailman saw a squirrel")
+        restore_search_triggers()
+        BarkModel.objects.create(user=self.user, message="another squirrel")
+
+        self.assertEqual(len(self.search_barks("squirrel")["items"]), 5)
+
+    def test_ranked_results_page_with_cursors(self):
+        first = self.search_barks("squirrel", limit=2)
+        second = self.client.get(first["next"]).json()
+
+        messages = [bark["message"] for bark in first["items"] + second["items"]]
+        self.assertEqual(messages, [bark["message"] for bark in self.search_barks("squirrel")["items"]])
+        self.assertIsNone(second["next"])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(len(self.search_barks('squirrel OR "mailman')["items"]), 0)
+        self.assertEqual(len(self.search_barks("***")["items"]), 0)
+        self.assertEqual(len(self.search_barks("!")["items"]), 1)
+
+    def test_user_search(self):
+        headers = {"Authorization": f"Bearer {self.login()}"}
+        response = self.client.get("/api/users/", {"search": "ball"}, headers=headers).json()
+
+        self.assertEqual({user["username"] for user in response["items"]}, {"snoopy", "ballerina"})
+
+    def test_contains_fallback_matches_substrings(self):
+        with override_settings(SEARCH_BACKEND="contains"):
+            messages = {bark["message"] for bark in self.search_barks("quirrel")["items"]}
+        self.assertEqual(len(messages), 3)
+
+    def login(self):
+        from core.models import AuthTokenModel
+
+        return AuthTokenModel.objects.create(user=self.user).key
+
+
+class TestUserTypeahead(TestCase):
+    def setUp(self):
+        from common.typeahead import typeahead_index
+        from core.models import AuthTokenModel, DogUserModel
+
+        typeahead_index.reset()
+        self.addCleanup(typeahead_index.reset)
+        self.user = DogUserModel.objects.create_user(username="Rex")
+        for username in ("rexy", "Rexford", "rover", "max"):
+            DogUserModel.objects.create_user(username=username)
+        self.headers = {"Authorization": f"Bearer {AuthTokenModel.objects.create(user=self.user).key}"}
+
+    def typeahead(self, q, limit=10):
+        response = self.client.get("/api/users/typeahead/", {"q": q, "limit": limit}, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return [user["username"] for user in response.json()]
+
+    def test_prefix_matches_ignore_case(self):
+        self.assertEqual(self.typeahead("REX"), ["Rex", "Rexford", "rexy"])
+        self.assertEqual(self.typeahead("r", limit=2), ["Rex", "Rexford"])
+        self.assertEqual(self.typeahead("zed"), [])
+
+    def test_creates_and_renames_apply_without_a_reload(self):
+        from common.typeahead import typeahead_index
+
+        self.typeahead("rex")
+        with patch.object(typeahead_index, "_load") as reload:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post("/api/users/", {"username": "Rexanne", "password": "woofwoof"}, content_type="application/json")
+                self.client.patch("/api/users/me/", {"username": "Tyrannosaurus"}, content_type="application/json", headers=self.headers)
+
+            self.assertEqual(self.typeahead("rex"), ["Rexanne", "Rexford", "rexy"])
+            self.assertEqual(self.typeahead("tyr"), ["Tyrannosaurus"])
+        reload.assert_not_called()
+
+    def test_changes_made_during_a_reload_are_kept(self):
+        import uuid
+        from common.typeahead import typeahead_index
+
+        snapshot = typeahead_index._load()
+        new_id = uuid.uuid4()
+
+        def load_while_renaming():
+            # The rename and signup commit after the snapshot was read
+            typeahead_index.add(self.user.id, "Tyrannosaurus")
+            typeahead_index.add(new_id, "Rexanne")
+            return snapshot
+
+        with patch.object(typeahead_index, "_load", side_effect=load_while_renaming):
+            typeahead_index.reload()
+
+        self.assertEqual(self.typeahead("rex"), ["Rexanne", "Rexford", "rexy"])
+        self.assertEqual(self.typeahead("tyr"), ["Tyrannosaurus"])
+        response = self.client.get("/api/users/typeahead/", {"q": "rexa"}, headers=self.headers)
+        self.assertEqual(response.json(), [{"id": str(new_id), "username": "Rexanne"}])
+
+    def test_concurrent_stale_reads_reload_once(self):
+        import threading
+        import time
+        from common.typeahead import typeahead_index
+
+        snapshot = typeahead_index._load()
+
+        def slow_load():
+            time.sleep(0.05)
+            return dict(snapshot)
+
+        barrier = threading.Barrier(8)
+        results = []
+
+        def read():
+            barrier.wait()
+            results.append(typeahead_index.search("rex", 10))
+
+        readers = [threading.Thread(target=read) for _ in range(8)]
+        with patch.object(typeahead_index, "_load", side_effect=slow_load) as load:
+            for reader in readers:
+                reader.start()
+            for reader in readers:
+                reader.join()
+
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(typeahead_index.reloads, 1)
+        self.assertEqual([len(result) for result in results], [3] * 8)
+
+    def test_empty_query_is_rejected(self):
+        response = self.client.get("/api/users/typeahead/", {"q": ""}, headers=self.headers)
+        self.assertEqual(response.status_code, 422)
+
+
+@override_settings(PAGE_CACHE_ENABLED=True)
+class TestBarksPageCache(TestCase):
+    def setUp(self):
+        from common.page_cache import page_cache
+        from core.models import AuthTokenModel, BarkModel, DogUserModel
+
+        page_cache.reset()
+        self.user = DogUserModel.objects.create_user(username="benji")
+        self.bark = BarkModel.objects.create(user=self.user, message="first bark", sniff_count=1)
+        self.headers = {"Authorization": f"Bearer {AuthTokenModel.objects.create(user=self.user).key}"}
+
+    def get(self, url="/api/barks/?limit=5&message=", **kwargs):
+        response = self.client.get(url, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_repeat_requests_are_served_from_cache(self):
+        from common.page_cache import page_cache
+
+        miss = self.get()
+        with CaptureQueriesContext(connection) as queries:
+            hit = self.get("/api/barks/?message=&limit=5")
+
+        self.assertEqual((miss["X-Cache"], hit["X-Cache"]), ("MISS", "HIT"))
+        self.assertEqual(hit.content, miss.content)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(page_cache.stats()["hit_ratio"], 0.5)
+
+    def test_stats_are_shared_by_every_worker(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from common.page_cache import VersionedPageCache, page_cache
+
+        self.get()
+        # Another worker's instance counts into the same shared totals
+        other_worker = VersionedPageCache(alias=page_cache.alias, timeout=page_cache.timeout)
+        other_worker._count("hits")
+        self.get(headers=self.headers)
+
+        out = StringIO()
+        call_command("page_cache_stats", reset=True, stdout=out)
+        self.assertEqual(out.getvalue().strip(), "hits=1 misses=1 bypassed=1 hit_ratio=0.500")
+        self.assertEqual(page_cache.stats()["hits"], 0)
+
+    def test_writes_bump_the_version(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/barks/", {"message": "second bark"}, content_type="application/json", headers=self.headers)
+
+        response = self.get()
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.json()["items"]), 2)
+
+    def test_authenticated_requests_bypass_the_cache(self):
+        self.get()
+        response = self.get(headers=self.headers)
+
+        self.assertNotIn("X-Cache", response)
+        self.assertFalse(response.json()["items"][0]["sniffed_by_me"])
+
+    def test_trending_ignores_sniffs_within_the_staleness_bound(self):
+        from api.logic.sniff_logic import handle_create_sniff
+        from core.models import DogUserModel
+
+        url = "/api/barks/?trending=true"
+        self.get(url)
+        self.get("/api/barks/")
+        with self.captureOnCommitCallbacks(execute=True):
+            handle_create_sniff(bark_id=self.bark.id, user=DogUserModel.objects.create_user(username="sniffer"))
+
+        self.assertEqual(self.get(url)["X-Cache"], "HIT")
+        self.assertEqual(self.get("/api/barks/")["X-Cache"], "MISS")
+        with override_settings(PAGE_CACHE_TRENDING_STALENESS_SECONDS=0):
+            self.assertEqual(self.get(url)["X-Cache"], "MISS")
+
+    def test_process_local_backend_is_refused(self):
+        from common.checks import check_shared_caches
+
+        self.assertEqual([error.id for error in check_shared_caches()], ["common.E001"])
+        with override_settings(PAGE_CACHE_ENABLED=False):
+            self.assertEqual(check_shared_caches(), [])
+
+
+@override_settings(PAGE_CACHE_ENABLED=False)
+class TestColumnarResponses(TestCase):
+    def setUp(self):
+        from core.models import AuthTokenModel, BarkModel, DogUserModel, UserSniffModel
+
+        self.user = DogUserModel.objects.create_user(username="rex", favorite_toy="frisbee")
+        other = DogUserModel.objects.create_user(username="luna")
+        DogUserModel.objects.filter(id=other.id).update(profile_image="profile_images/luna.png")
+        barks = BarkModel.objects.bulk_create(
+            BarkModel(user=(self.user, other)[i % 2], message=f"bark {i}", sniff_count=i % 3) for i in range(12)
+        )
+        UserSniffModel.objects.bulk_create(UserSniffModel(user=self.user, bark=bark) for bark in barks[::3])
+        self.headers = {"Authorization": f"Bearer {AuthTokenModel.objects.create(user=self.user).key}"}
+
+    def pages(self, url, headers=None):
+        """The raw bodies of the first two pages of url"""
+        first = self.client.get(url, headers=headers or {})
+        self.assertEqual(first.status_code, 200)
+        second = self.client.get(first.json()["next"], headers=headers or {})
+        return first["Content-Type"], first.content, second.content
+
+    def test_output_matches_the_schema_path(self):
+        requests = [
+            (url, headers)
+            for url in ("/api/barks/?limit=5", "/api/barks/?limit=5&order_by=-sniff_count", "/api/barks/?limit=5&message=bark")
+            for headers in (None, self.headers)
+        ]
+        requests.append(("/api/users/?limit=1", self.headers))
+        # Cursors embed the signing time; pin it so both paths sign alike
+        self.enterContext(patch.object(TimestampSigner, "timestamp", return_value="1"))
+        for url, headers in requests:
+            with self.subTest(url=url, authenticated=headers is not None):
+                with override_settings(COLUMNAR_RESPONSES=False):
+                    expected = self.pages(url, headers)
+                self.assertEqual(self.pages(url, headers), expected)
+
+    def test_sniffed_by_me_uses_one_query(self):
+        self.client.get("/api/barks/?limit=1", headers=self.headers)  # warm the token cache
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/barks/?limit=12", headers=self.headers)
+
+        self.assertEqual(sum(bark["sniffed_by_me"] for bark in response.json()["items"]), 4)
+        self.assertEqual(len([query for query in queries if "core_usersniffmodel" in query["sql"]]), 1)
+
+
+@override_settings(PAGE_CACHE_ENABLED=False, COLUMNAR_RESPONSES=False)
+class TestSchemaProjection(TestCase):
+    def setUp(self):
+        from core.models import AuthTokenModel, BarkModel, DogUserModel
+
+        self.user = DogUserModel.objects.create_user(username="bolt", password="pw")
+        BarkModel.objects.bulk_create(BarkModel(user=self.user, message=f"bark {i}") for i in range(3))
+        self.headers = {"Authorization": f"Bearer {AuthTokenModel.objects.create(user=self.user).key}"}
+
+    def list_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return [query["sql"] for query in queries if "core_dogusermodel" in query["sql"].split("FROM")[-1]]
+
+    def test_fields_follow_the_schema(self):
+        from api.schemas.bark_schemas import BarkSchemaOut
+        from common.projection import schema_only_fields
+        from core.models import BarkModel
+
+        self.assertEqual(
+            set(schema_only_fields(BarkSchemaOut, BarkModel)),
+            {
+                "id", "message", "sniff_count", "created_at", "updated_at",
+                "user", "user__id", "user__username", "user__favorite_toy", "user__profile_image",
+            },
+        )
+
+    def test_lists_skip_unrendered_user_columns(self):
+        for url in ("/api/barks/?order_by=-sniff_count", "/api/users/?order_by=username&limit=1"):
+            with self.subTest(url=url):
+                listed = self.list_queries(url)[-1]
+                self.assertIn('"favorite_toy"', listed)
+                self.assertNotIn('"password"', listed)
+                self.assertNotIn('"last_login"', listed)
+
+    def test_resolvers_must_declare_their_fields(self):
+        from django.core.exceptions import ImproperlyConfigured
+        from ninja import ModelSchema
+        from common.projection import schema_only_fields
+        from core.models import DogUserModel
+
+        class UndeclaredSchemaOut(ModelSchema):
+            greeting: str
+
+            class Meta:
+                model = DogUserModel
+                fields = ["id"]
+
+            @staticmethod
+            def resolve_greeting(obj):
+                return f"Woof, {obj.username}"
+
+        with self.assertRaises(ImproperlyConfigured):
+            schema_only_fields(UndeclaredSchemaOut, DogUserModel)
+
+
+@override_settings(PAGE_CACHE_ENABLED=False, QUERY_BUDGET_MODE="raise")
+class TestQueryBudgets(TestCase):
+    def setUp(self):
+        from core.models import AuthTokenModel, BarkModel, DogUserModel
+
+        self.user = DogUserModel.objects.create_user(username="scout")
+        self.barks = BarkModel.objects.bulk_create(BarkModel(user=self.user, message=f"bark {i}") for i in range(3))
+        self.headers = {"Authorization": f"Bearer {AuthTokenModel.objects.create(user=self.user).key}"}
+
+    def test_bark_detail_loads_its_user_in_the_same_query(self):
+        from common.query_budget import assert_query_budget
+
+        with assert_query_budget(1):
+            response = self.client.get(f"/api/barks/{self.barks[0].id}/")
+        self.assertEqual(response.json()["user"]["username"], "scout")
+
+    def test_endpoints_stay_within_their_budgets(self):
+        from django.conf import settings
+
+        # However the suite is started, a request over budget fails it
+        self.assertEqual(settings.QUERY_BUDGET_MODE, "raise")
+        bark = self.barks[0]
+        responses = [
+            self.client.get("/api/barks/", headers=self.headers),
+            self.client.put(f"/api/barks/{bark.id}/", {"message": "edited"}, content_type="application/json", headers=self.headers),
+            self.client.post("/api/sniffs/", {"bark_id": str(bark.id)}, content_type="application/json", headers=self.headers),
+            self.client.delete(f"/api/barks/{bark.id}/", headers=self.headers),
+            self.client.get("/api/users/", headers=self.headers),
+        ]
+        self.assertEqual([response.status_code for response in responses], [200, 200, 201, 204, 200])
+
+    def test_repeated_queries_are_reported(self):
+        from common.query_budget import QueryBudgetExceeded, assert_query_budget
+        from core.models import BarkModel
+
+        with self.assertRaisesRegex(QueryBudgetExceeded, "run 3 times"):
+            with assert_query_budget():
+                [bark.user.username for bark in BarkModel.objects.all()]
+
+    def test_query_shape_folds_literals(self):
+        from common.query_budget import query_shape
+
+        self.assertEqual(
+            query_shape("SELECT * FROM t WHERE a IN (%s, %s, %s) AND b = 'x' LIMIT 21"),
+            query_shape("SELECT * FROM t WHERE a IN (%s) AND b = 'y' LIMIT 1"),
+        )
+
+    @override_settings(DEBUG=True)
+    def test_debug_middleware_counts_queries(self):
+        response = self.client.get(f"/api/barks/{self.barks[0].id}/")
+
+        self.assertEqual(response["X-Query-Count"], "1")
+
+
+@override_settings(PAGE_CACHE_ENABLED=False, OBJECT_CACHE_ENABLED=True)
+class TestBarkObjectCache(TestCase):
+    def setUp(self):
+        from core.models import AuthTokenModel, BarkModel, DogUserModel
+
+        self.user = DogUserModel.objects.create_user(username="biscuit", favorite_toy="stick")
+        self.bark = BarkModel.objects.create(user=self.user, message="shared everywhere")
+        self.url = f"/api/barks/{self.bark.id}/"
+        self.headers = {"Authorization": f"Bearer {AuthTokenModel.objects.create(user=self.user).key}"}
+
+    def get(self, max_queries):
+        from common.query_budget import assert_query_budget
+
+        with assert_query_budget(max_queries):
+            response = self.client.get(self.url)
+        return response
+
+    def test_repeat_requests_skip_the_database(self):
+        first = self.get(1)
+        second = self.get(0)
+
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(first.json(), self.client.get("/api/barks/").json()["items"][0])
+
+    def test_update_and_sniff_invalidate(self):
+        from api.logic.sniff_logic import handle_create_sniff
+        from core.models import DogUserModel
+
+        self.get(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(self.url, {"message": "edited"}, content_type="application/json", headers=self.headers)
+            handle_create_sniff(bark_id=self.bark.id, user=DogUserModel.objects.create_user(username="sniffer"))
+
+        bark = self.get(1).json()
+        self.assertEqual((bark["message"], bark["sniff_count"]), ("edited", 1))
+        self.assertEqual(self.get(0).json(), bark)
+
+    def test_delete_evicts(self):
+        self.get(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(self.url, headers=self.headers)
+
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_load_overlapping_a_delete_is_not_cached(self):
+        from common.object_cache import bark_cache
+
+        def load_then_delete():
+            # The bark is deleted after the loader read it
+            bark_cache.delete(self.bark.id)
+            return "stale"
+
+        self.assertEqual(bark_cache.get_or_load(self.bark.id, load_then_delete), "stale")
+        self.assertEqual(bark_cache.get_or_load(self.bark.id, lambda: None), None)
+
+    def test_missing_barks_are_cached(self):
+        from common.query_budget import assert_query_budget
+
+        url = "/api/barks/00000000-0000-0000-0000-000000000000/"
+        with assert_query_budget(1):
+            self.assertEqual(self.client.get(url).status_code, 404)
+        with assert_query_budget(0):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_author_changes_only_reload_the_author(self):
+        self.get(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch("/api/users/me/", {"username": "biscuit2"}, content_type="application/json", headers=self.headers)
+
+        self.assertEqual(self.get(1).json()["user"]["username"], "biscuit2")
+
+    def test_concurrent_misses_load_once(self):
+        import threading
+        import time
+        import uuid
+        from common.object_cache import bark_cache
+
+        key, calls, results = uuid.uuid4(), [], []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.05)
+            return "payload"
+
+        threads = [threading.Thread(target=lambda: results.append(bark_cache.get_or_load(key, loader))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual((len(calls), results), (1, ["payload"] * 8))
+
+
+class TestBarkExport(TestCase):
+    def setUp(self):
+        from core.models import AuthTokenModel, BarkModel, DogUserModel
+
+        self.user = DogUserModel.objects.create_user(username="archie")
+        other = DogUserModel.objects.create_user(username="other")
+        BarkModel.objects.bulk_create(BarkModel(user=self.user, message=f"bark, {i}") for i in range(25))
+        BarkModel.objects.create(user=other, message="not mine")
+        self.headers = {"Authorization": f"Bearer {AuthTokenModel.objects.create(user=self.user).key}"}
+
+    def export(self, **params):
+        response = self.client.get("/api/barks/export/", params, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content)
+
+    @override_settings(BARK_EXPORT_CHUNK_SIZE=10)
+    def test_csv_contains_every_bark_of_the_user(self):
+        import csv
+
+        response, content = self.export()
+        rows = list(csv.reader(content.decode().splitlines()))
+
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(rows[0], ["ID", "Message", "Sniff Count", "Created At", "Updated At"])
+        self.assertEqual(sorted(row[1] for row in rows[1:]), sorted(f"bark, {i}" for i in range(25)))
+
+    def test_ndjson_lines(self):
+        import json
+
+        _, content = self.export(format="ndjson")
+        barks = [json.loads(line) for line in content.decode().splitlines()]
+
+        self.assertEqual(len(barks), 25)
+        self.assertEqual(set(barks[0]), {"id", "message", "sniff_count", "created_at", "updated_at"})
+
+    def test_gzip_matches_uncompressed(self):
+        import gzip
+
+        _, plain = self.export(format="ndjson")
+        response, compressed = self.export(format="ndjson", gzip=True)
+
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="barks.ndjson.gz"')
+        self.assertEqual(gzip.decompress(compressed), plain)
+
+    @override_settings(BARK_EXPORT_CHUNK_SIZE=10)
+    def test_streaming_runs_a_fixed_number_of_queries(self):
+        from common.query_budget import assert_query_budget
+
+        # The rows are queried while the body streams, after the view returned
+        with assert_query_budget(2):
+            _, content = self.export()
+        self.assertEqual(len(content.decode().splitlines()), 26)
+
+    def test_empty_export_has_a_header(self):
+        from core.models import BarkModel
+
+        BarkModel.objects.filter(user=self.user).delete()
+        _, content = self.export()
+        self.assertEqual(content.decode().splitlines(), ["ID,Message,Sniff Count,Created At,Updated At"])